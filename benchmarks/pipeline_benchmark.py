@@ -0,0 +1,483 @@
+#!/usr/bin/env python
+"""
+End-to-end pyrf pipeline benchmarks.
+
+Runs block captures and sweeps against the simulated RTSA in
+:mod:`pyrf.sim` (or a device given with ``--host``) and reports
+packets/s, samples/s, VRT parse and FFT time per packet, sweep latency
+and memory per sweep, across a grid of SPP/PPB values, RFE modes and
+connectors.  Results are written as JSON for regression tracking::
+
+    python benchmarks/pipeline_benchmark.py --output results.json
+    python benchmarks/pipeline_benchmark.py --connectors blocking,playback \\
+        --modes SH,ZIF --spp 1024,16384 --ppb 1,8
+
+The playback connector replays the data received by the blocking
+connector from memory, so it measures pyrf without any socket overhead.
+The blocking-reader connector repeats the blocking sweeps with the
+background VRT reader thread started, and the blocking-psd8 connector
+repeats them with the device sending PSD8 spectra instead of samples,
+which only the simulator supports for now.
+A VRT recording made with :meth:`pyrf.devices.thinkrf.WSA.set_recording_output`
+can be benchmarked instead with ``--recording``; only reading, parsing
+and FFT are measured in that case.
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import io
+import json
+import platform
+import struct
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import numpy as np
+
+from pyrf.connectors.blocking import PlainSocketConnector
+from pyrf.devices.thinkrf import WSA
+from pyrf.devices.playback import open_recording
+from pyrf import fft_backend
+from pyrf.numpy_util import compute_fft
+from pyrf.sim import SimulatedRTSA
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+from pyrf.version import __version__
+from pyrf.vrt import generate_speca_packet, vrt_packet_reader
+
+timer = getattr(time, 'perf_counter', time.time)
+
+CONNECTORS = ['blocking', 'blocking-reader', 'blocking-psd8', 'twisted',
+    'playback']
+MODES = ['SH', 'SHN', 'ZIF', 'DD']
+
+# block capture center frequency and (sweep mode, fstart, fstop) for
+# each benchmarked mode, DD is measured with a sweep below the SH range
+BLOCK_FREQ = 2450 * M
+SWEEP_RANGES = {
+    'SH': ('SH', 2300 * M, 2600 * M),
+    'SHN': ('SHN', 2300 * M, 2600 * M),
+    'ZIF': ('ZIF', 2300 * M, 2600 * M),
+    'DD': ('SH', 0, 40 * M),
+    }
+SWEEP_RBW = 100e3
+TONES = [(2450 * M, -30), (20 * M, -40)]
+
+
+class RecordingConnector(PlainSocketConnector):
+    """
+    A blocking connector that keeps a copy of the VRT data it reads so
+    that it can be replayed by the playback connector.
+    """
+    def __init__(self):
+        super(RecordingConnector, self).__init__()
+        self.chunks = []
+
+    def raw_read(self, num):
+        data = super(RecordingConnector, self).raw_read(num)
+        self.chunks.append(data)
+        return data
+
+    def recording(self, device_id):
+        """
+        Return the data read since the last call as a recording that
+        :func:`pyrf.devices.playback.open_recording` accepts
+        """
+        state, _count = generate_speca_packet({
+            'device_class': 'thinkrf.WSA',
+            'device_identifier': device_id})
+        data = b''.join([state] + self.chunks)
+        self.chunks = []
+        return data
+
+
+def grid(args):
+    for mode in args.modes:
+        for spp in args.spp:
+            for ppb in args.ppb:
+                yield mode, spp, ppb
+
+
+def setup_block(dut, mode):
+    dut.rfe_mode(mode)
+    if mode != 'DD':
+        dut.freq(BLOCK_FREQ)
+
+
+def rate_result(benchmark, connector, mode, spp, ppb, packets, seconds):
+    return {
+        'benchmark': benchmark,
+        'connector': connector,
+        'mode': mode,
+        'spp': spp,
+        'ppb': ppb,
+        'packets': packets,
+        'seconds': seconds,
+        'packets_per_s': packets / seconds,
+        'samples_per_s': packets * spp / seconds,
+        }
+
+
+def sweep_result(connector, mode, latencies, points, memory_kb):
+    return {
+        'benchmark': 'sweep',
+        'connector': connector,
+        'mode': mode,
+        'rbw': SWEEP_RBW,
+        'sweeps': len(latencies),
+        'points': points,
+        'latency_s': {
+            'mean': float(np.mean(latencies)),
+            'min': float(np.min(latencies)),
+            'max': float(np.max(latencies)),
+            },
+        'memory_kb': memory_kb,
+        }
+
+
+def measure_memory(fn):
+    """
+    Call *fn* and return (result, memory in kB); the traced peak when
+    tracemalloc is available, otherwise the growth of the max RSS.
+    """
+    if tracemalloc is not None:
+        tracemalloc.start()
+        result = fn()
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, peak / 1024.0
+    if resource is not None:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result = fn()
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return result, float(after - before)
+    return fn(), None
+
+
+def read_block(dut, ppb):
+    """
+    Read the packets of one block capture, return the data packets
+    """
+    packets = []
+    while len(packets) < ppb:
+        packet = dut.read()
+        if packet is None:
+            break
+        if packet.is_data_packet():
+            packets.append(packet)
+    return packets
+
+
+def bench_blocking_capture(dut, mode, spp, ppb, captures):
+    setup_block(dut, mode)
+    start = timer()
+    for i in range(captures):
+        dut.capture(spp, ppb)
+        read_block(dut, ppb)
+    return rate_result('block', 'blocking', mode, spp, ppb,
+        captures * ppb, timer() - start)
+
+
+def bench_playback_read(recording, mode, spp, ppb):
+    dut = open_recording(io.BytesIO(recording))
+    packets = 0
+    start = timer()
+    while True:
+        packet = dut.read()
+        if packet is None:
+            break
+        if packet.is_data_packet():
+            packets += 1
+    return rate_result('block', 'playback', mode, spp, ppb,
+        packets, timer() - start)
+
+
+def bench_parse_fft(recording, mode, spp, ppb):
+    """
+    Return the parse and FFT results for the packets of a recording
+    """
+    playback = open_recording(io.BytesIO(recording))
+    data = io.BytesIO(recording)
+
+    packets = []
+    start = timer()
+    while True:
+        reader = vrt_packet_reader(data.read)
+        packet = None
+        try:
+            while True:
+                packet = reader.send(packet)
+        except StopIteration:
+            pass
+        except struct.error:
+            # end of the recording
+            break
+        if not packet:
+            break
+        packets.append(packet)
+    parse_seconds = timer() - start
+
+    context = {}
+    data_packets = 0
+    start = timer()
+    for packet in packets:
+        if packet.is_context_packet():
+            context.update(packet.fields)
+            continue
+        compute_fft(playback, packet, context)
+        data_packets += 1
+    fft_seconds = timer() - start
+
+    results = [{
+        'benchmark': 'parse',
+        'mode': mode,
+        'spp': spp,
+        'ppb': ppb,
+        'packets': len(packets),
+        'us_per_packet': 1e6 * parse_seconds / max(1, len(packets)),
+        }]
+    if data_packets:
+        results.append({
+            'benchmark': 'fft',
+            'mode': mode,
+            'spp': spp,
+            'ppb': ppb,
+            'packets': data_packets,
+            'us_per_packet': 1e6 * fft_seconds / data_packets,
+            })
+    return results
+
+
+def bench_sweeps(dut, connector, mode, sweeps, psd8=False):
+    sweep_mode, fstart, fstop = SWEEP_RANGES[mode]
+    sd = SweepDevice(dut)
+    settings = {'attenuator': 0}
+    latencies = []
+    for i in range(sweeps):
+        start = timer()
+        result = sd.capture_power_spectrum(fstart, fstop, SWEEP_RBW,
+            settings, mode=sweep_mode, psd8=psd8)
+        latencies.append(timer() - start)
+    (_fstart, _fstop, pow_data), memory_kb = measure_memory(
+        lambda: sd.capture_power_spectrum(fstart, fstop, SWEEP_RBW,
+            settings, mode=sweep_mode, psd8=psd8))
+    return sweep_result(connector, mode, latencies, len(pow_data), memory_kb)
+
+
+def run_blocking(args, host, results):
+    connector = RecordingConnector()
+    dut = WSA(connector=connector)
+    dut.connect(host)
+    dut.reset()
+    dut.request_read_perm()
+    results['device_id'] = dut.device_id.strip()
+
+    for mode, spp, ppb in grid(args):
+        captures = max(1, args.packets // ppb)
+        result = bench_blocking_capture(dut, mode, spp, ppb, captures)
+        if 'blocking' in args.connectors:
+            results['results'].append(result)
+        recording = connector.recording(dut.device_id)
+        if 'playback' in args.connectors:
+            results['results'].append(
+                bench_playback_read(recording, mode, spp, ppb))
+        results['results'].extend(bench_parse_fft(recording, mode, spp, ppb))
+
+    for mode in args.modes:
+        result = bench_sweeps(dut, 'blocking', mode, args.sweeps)
+        if 'blocking' in args.connectors:
+            results['results'].append(result)
+        recording = connector.recording(dut.device_id)
+        if 'playback' in args.connectors:
+            playback = open_recording(io.BytesIO(recording), loop=True)
+            results['results'].append(
+                bench_sweeps(playback, 'playback', mode, args.sweeps))
+
+    if 'blocking-reader' in args.connectors:
+        dut.start_vrt_reader()
+        for mode in args.modes:
+            results['results'].append(
+                bench_sweeps(dut, 'blocking-reader', mode, args.sweeps))
+        dut.stop_vrt_reader()
+
+    if 'blocking-psd8' in args.connectors and dut.properties.PSD8_TRACE:
+        for mode in args.modes:
+            results['results'].append(
+                bench_sweeps(dut, 'blocking-psd8', mode, args.sweeps, True))
+        dut.trace_format('SAMPLES')
+    dut.disconnect()
+
+
+def run_twisted(args, host, results):
+    """
+    Run the twisted connector benchmarks in a single reactor run
+    """
+    from twisted.internet import reactor, defer
+    from twisted.python.failure import Failure
+    from pyrf.connectors.twisted_async import TwistedConnector
+
+    def capture(dut, spp, ppb, captures):
+        d = defer.Deferred()
+        state = {'packets': 0, 'captures': 0}
+
+        def receive(packet):
+            if not packet.is_data_packet():
+                return
+            state['packets'] += 1
+            if state['packets'] < ppb * (state['captures'] + 1):
+                return
+            state['captures'] += 1
+            if state['captures'] < captures:
+                dut.capture(spp, ppb)
+            else:
+                dut.set_async_callback(None)
+                d.callback(None)
+
+        dut.set_async_callback(receive)
+        dut.capture(spp, ppb)
+        return d
+
+    def sweep(sd, fstart, fstop, mode):
+        d = defer.Deferred()
+        sd.async_callback = lambda fstart, fstop, data: d.callback(data)
+        sd.capture_power_spectrum(fstart, fstop, SWEEP_RBW,
+            {'attenuator': 0}, mode=mode)
+        return d
+
+    @defer.inlineCallbacks
+    def run():
+        dut = WSA(connector=TwistedConnector(reactor))
+        yield dut.connect(host)
+        yield dut.reset()
+        yield dut.request_read_perm()
+
+        for mode, spp, ppb in grid(args):
+            captures = max(1, args.packets // ppb)
+            yield dut.rfe_mode(mode)
+            if mode != 'DD':
+                yield dut.freq(BLOCK_FREQ)
+            start = timer()
+            yield capture(dut, spp, ppb, captures)
+            results['results'].append(rate_result('block', 'twisted',
+                mode, spp, ppb, captures * ppb, timer() - start))
+
+        for mode in args.modes:
+            sweep_mode, fstart, fstop = SWEEP_RANGES[mode]
+            sd = SweepDevice(dut, lambda *a: None)
+            latencies = []
+            for i in range(args.sweeps):
+                start = timer()
+                pow_data = yield sweep(sd, fstart, fstop, sweep_mode)
+                latencies.append(timer() - start)
+            results['results'].append(sweep_result('twisted', mode,
+                latencies, len(pow_data), None))
+        dut.disconnect()
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    d = run()
+    d.addBoth(done)
+    reactor.run()
+    if d.called and isinstance(d.result, Failure):
+        failure = d.result
+        # handled here, don't log it as an unhandled error
+        d.addErrback(lambda f: None)
+        failure.raiseException()
+
+
+def run_recording(args, results):
+    with open(args.recording, 'rb') as f:
+        recording = f.read()
+    results['device_id'] = open_recording(io.BytesIO(recording)).device_id
+    results['results'].append(
+        bench_playback_read(recording, 'recording', None, None))
+    results['results'].extend(
+        bench_parse_fft(recording, 'recording', None, None))
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=None,
+        help='benchmark a device instead of the simulator')
+    parser.add_argument('--recording', default=None,
+        help='benchmark reading a VRT recording instead of a device')
+    parser.add_argument('--connectors', default=','.join(CONNECTORS),
+        type=lambda v: v.split(','))
+    parser.add_argument('--modes', default=','.join(MODES),
+        type=lambda v: v.split(','))
+    parser.add_argument('--spp', default=[1024, 8192, 32768], type=int_list,
+        help='comma separated samples per packet values')
+    parser.add_argument('--ppb', default=[1, 8], type=int_list,
+        help='comma separated packets per block values')
+    parser.add_argument('--packets', type=int, default=256,
+        help='data packets captured for each SPP/PPB combination')
+    parser.add_argument('--sweeps', type=int, default=10,
+        help='sweeps measured for each mode')
+    parser.add_argument('--fft-backend', default='numpy',
+        choices=sorted(fft_backend.BACKENDS),
+        help='FFT implementation, see pyrf.fft_backend')
+    parser.add_argument('--fft-workers', type=int, default=-1,
+        help='FFT threads for the scipy and fftw backends, -1 for all cores')
+    parser.add_argument('--output', default=None,
+        help='JSON output file, default stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = fft_backend.set_backend(args.fft_backend, args.fft_workers)
+    results = {
+        'pyrf_version': __version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'fft_backend': backend.name,
+        'fft_workers': backend.workers,
+        'platform': platform.platform(),
+        'time': time.time(),
+        'device_id': None,
+        'results': [],
+        }
+
+    if args.recording:
+        run_recording(args, results)
+    else:
+        sim = None
+        host = args.host
+        if host is None:
+            sim = SimulatedRTSA(tones=TONES, seed=0)
+            sim.start()
+            host = '127.0.0.1'
+        try:
+            if set(args.connectors) & set(['blocking', 'blocking-reader',
+                    'blocking-psd8', 'playback']):
+                run_blocking(args, host, results)
+            if 'twisted' in args.connectors:
+                run_twisted(args, host, results)
+        finally:
+            if sim is not None:
+                sim.stop()
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
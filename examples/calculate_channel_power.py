@@ -13,7 +13,9 @@ import numpy as np
 
 def smooth(list,degree=1):
     new_list = []
-    list_average = np.mean(sorted(list)[int(0.995 * len(list)):-1]) + 5
+    # mean of the highest 0.5% of the points, except the maximum
+    top = int(0.995 * len(list))
+    list_average = np.mean(np.partition(list, [top, len(list) - 1])[top:-1]) + 5
     for n, i in enumerate(list):
 
         start = max(0, n - degree)
@@ -22,7 +22,8 @@ from pyrf.connectors.twisted_async import TwistedConnector
 from pyrf.devices.thinkrf import WSA
 from pyrf.capture_device import CaptureDevice
 
-from pyrf.numpy_util import compute_fft, _decode_data_pkts
+from pyrf.numpy_util import compute_fft, _decode_data_pkts, frequency_axis
+from pyrf.traces import TraceAccumulator, MAX_HOLD
 from pyrf.vrt import (I_ONLY, VRT_IFDATA_I14Q14, VRT_IFDATA_I14,
     VRT_IFDATA_I24, VRT_IFDATA_PSD8)
 SAMPLE_VALUES = [128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768]
@@ -116,7 +117,7 @@ class MainPanel(QtGui.QWidget):
         self.bandwidth = self.dut_prop.FULL_BW[self.dev_set['rfe_mode']]
         self.rbw = 125000000 / SAMPLE_VALUES[3]
         self.enable_mhold = False
-        self.mhold = []
+        self.mhold = TraceAccumulator(MAX_HOLD)
         self.cap_dut = CaptureDevice(dut, async_callback=self.receive_capture,
             device_settings=self.dev_set)
         self.initUI()
@@ -288,18 +289,15 @@ class MainPanel(QtGui.QWidget):
             return grid, widget
 
     def update_trace(self):
-        freq_range = np.linspace(self.freq_range[0], self.freq_range[1], len(self.pow_data))
+        freq_range = frequency_axis(self.freq_range[0], self.freq_range[1], len(self.pow_data))
         self.fft_curve.clear()
         self.fft_curve.setData(freq_range, self.pow_data)
         if self.enable_mhold:
-            if len(self.mhold) != len(self.pow_data):
-                self.mhold = self.pow_data
-            else:
-                self.mhold = np.maximum(self.mhold, self.pow_data)
-            self.mhold_curve.setData(freq_range, self.mhold)
+            self.mhold_curve.setData(freq_range,
+                self.mhold.update(self.pow_data))
         else:
             self.mhold_curve.setData([], [])
-            self.mhold = []
+            self.mhold.reset()
 
         i_data, q_data, stream_id, spec_inv = _decode_data_pkts(self.raw_data)
         self.i_curve.clear()
@@ -15,6 +15,7 @@ import sys
 import numpy as np
 from pyrf.devices.thinkrf import WSA
 from pyrf.sweep_device import SweepDevice
+from pyrf.numpy_util import frequency_axis
 
 # Constants for configuration
 RFE_MODE = 'SH'
@@ -86,7 +87,7 @@ def update():
                                 RBW,
                                 {'attenuator':ATTENUATION},
                                 mode = RFE_MODE)
-    freq_range = np.linspace(fstart , fstop, len(spectra_data))
+    freq_range = frequency_axis(fstart, fstop, len(spectra_data))
     curve.setData(freq_range, spectra_data, pen='g')
 
 timer = QtCore.QTimer()
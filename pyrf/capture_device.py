@@ -1,8 +1,11 @@
 import math
 
 from pyrf.util import compute_usable_bins, compute_spp_ppb, adjust_usable_fstart_fstop, compute_spp_ppb
+from pyrf.util import trim_to_usable_fstart_fstop, BlockAssembler
+from pyrf.numpy_util import compute_fft, WelchEstimator, IQCorrectionState
 from pyrf.vrt import I_ONLY
 from pyrf.vrt import DataPacket
+from pyrf.metrics import metrics
 import numpy as np
 
 class CaptureDeviceError(Exception):
@@ -42,6 +45,10 @@ class CaptureDevice(object):
         self.packets_per_block = 1
         self.packets_read = 0
         self.points = 0
+        self._spectrum = False
+        self._trace = None
+        self._welch = None
+        self._iq_corrections = IQCorrectionState()
 
     def configure_device(self, device_settings, force_change = False):
         """
@@ -72,7 +79,76 @@ class CaptureDevice(object):
         :param bool force_change: force the configuration to apply device_settings changes or not
         :returns: (fstart, fstop, data) where fstart & fstop are frequencies in Hz & data is a list
         """
+        self._spectrum = False
+        self._trace = None
+        self._welch = None
+        return self._capture(rfe_mode, freq, rbw, device_settings,
+            min_points, force_change)
 
+    def capture_power_spectrum(self, rfe_mode, freq, rbw, device_settings=None,
+            min_points=256, force_change=False, trace=None):
+        """
+        Initiate a capture and compute the power spectrum of its usable
+        bins, optionally combining several captures into one trace
+
+        :param str rfe_mode: radio front end mode, e.g. 'ZIF', 'SH', ...
+        :param int freq: center frequency in Hz to set
+        :param float rbw: the resolution bandwidth (RBW) in Hz of the data to be captured
+                    (output RBW may be smaller than requested)
+        :param device_settings: rfe_mode, freq, decimation, fshift and other device settings
+        :type device_settings: dict or None
+        :param int min_points: smallest number of data points per capture from the device
+        :param bool force_change: force the configuration to apply device_settings changes or not
+        :param trace: a :class:`pyrf.traces.TraceAccumulator` to combine
+                      captures with.  Captures are repeated until it emits
+                      a trace, which is returned as the power data.
+        :returns: (fstart, fstop, pow_data) where fstart & fstop are frequencies in Hz & pow_data is a numpy array in dBm
+        """
+        self._spectrum = True
+        self._trace = trace
+        self._welch = None
+        return self._capture(rfe_mode, freq, rbw, device_settings,
+            min_points, force_change)
+
+    def capture_welch_spectrum(self, rfe_mode, freq, rbw, device_settings=None,
+            segments=8, overlap=0.5, min_points=256, force_change=False):
+        """
+        Initiate a capture long enough for *segments* FFT segments at
+        the requested RBW and return their averaged power spectrum
+        (Welch's method).  Each packet is transformed as it arrives, so
+        the packets are never joined into one block and the result has
+        a lower variance than a single FFT of the same capture.
+
+        :param str rfe_mode: radio front end mode, e.g. 'ZIF', 'SH', ...
+        :param int freq: center frequency in Hz to set
+        :param float rbw: the resolution bandwidth (RBW) in Hz of each segment
+        :param device_settings: rfe_mode, freq, decimation, fshift and other device settings
+        :type device_settings: dict or None
+        :param int segments: number of segments to average; fewer are
+                             used if the capture would exceed the
+                             device's largest block
+        :param float overlap: fraction of each segment shared with the next
+        :param int min_points: smallest number of data points per segment
+        :param bool force_change: force the configuration to apply device_settings changes or not
+        :returns: (fstart, fstop, pow_data) where fstart & fstop are frequencies in Hz & pow_data is a numpy array in dBm
+        """
+        self._spectrum = True
+        self._trace = None
+        self._welch = (segments, overlap)
+        return self._capture(rfe_mode, freq, rbw, device_settings,
+            min_points, force_change)
+
+    def _welch_spp_ppb(self, segment, step, segments):
+        prop = self.real_device.properties
+        samples = segment + step * (segments - 1)
+        spp = min(prop.MAX_SPP, samples)
+        spp = max(prop.MIN_SPP,
+            -(-spp // prop.SPP_MULTIPLE) * prop.SPP_MULTIPLE)
+        ppb = min(prop.MAX_PPB, -(-samples // spp))
+        return spp, ppb
+
+    def _capture(self, rfe_mode, freq, rbw, device_settings, min_points,
+            force_change):
         prop = self.real_device.properties
         self.real_device.abort()
         self.real_device.flush()
@@ -86,7 +162,6 @@ class CaptureDevice(object):
         full_bw = prop.FULL_BW[rfe_mode]
 
         self._vrt_context = {}
-        self._data_packets = []
 
         self.points = round(full_bw / rbw)
 
@@ -95,19 +170,29 @@ class CaptureDevice(object):
 
         self.points = round(max(min_points, self.points))
 
-        self.points, self.packets_per_block = compute_spp_ppb(self.points, prop)
+        if self._welch is None:
+            self.points, self.packets_per_block = compute_spp_ppb(self.points, prop)
+            self._fft_points = self.points * self.packets_per_block
+        else:
+            segments, overlap = self._welch
+            self._welch = WelchEstimator(self.points, overlap)
+            self.points, self.packets_per_block = self._welch_spp_ppb(
+                self._welch.segment, self._welch.step, segments)
+            self._fft_points = self._welch.segment
 
         fshift = self._device_set.get('fshift', 0)
         decimation = self._device_set.get('decimation', 1)
-        self.usable_bins = compute_usable_bins(prop, rfe_mode, (self.points * self.packets_per_block),
+        self.usable_bins = compute_usable_bins(prop, rfe_mode, self._fft_points,
             decimation, fshift)
+        self._capture_usable_bins = self.usable_bins
+        self._assembler = BlockAssembler(self.points, self.packets_per_block)
         if self.async_callback:
             self.real_device.set_async_callback(self.read_data)
             self.real_device.capture(self.points, self.packets_per_block)
 
             return
 
-        self.real_device.capture(self.points, self._data_packets)
+        self.real_device.capture(self.points, self.packets_per_block)
 
         result = None
         while result is None:
@@ -120,21 +205,31 @@ class CaptureDevice(object):
             return
         self.packets_read += 1
 
-        if self.packets_read == 1:
+        assembler = self._assembler
+        if self._welch is not None:
             self.data_packet = packet
+            lost = assembler.lost
+            slot = assembler.place(packet)
+            if assembler.lost != lost:
+                # no segment spans the samples of lost packets
+                self._welch.skip()
+            if slot is not None:
+                self._welch.add_packet(packet)
+            if not assembler.complete():
+                return
         else:
-            # if packet type changes, skip packet with a different size
-            try:
-                self.data_packet.data.np_array = np.concatenate([self.data_packet.data.np_array, packet.data.np_array])
-            except ValueError:
-                x = 1
-        if self.packets_read != self.packets_per_block:
-
-            return
+            if not assembler.add(packet):
+                return
+            self.data_packet = assembler.packet()
 
         data= {
             'context_pkt' : self._vrt_context,
-            'data_pkt' : self.data_packet}
+            'data_pkt' : self.data_packet,
+            'lost_packets': assembler.lost,
+            'mismatched_packets': assembler.mismatched}
+        metrics.count('capture.lost_packets', assembler.lost)
+        metrics.count('capture.mismatched_packets', assembler.mismatched)
+        assembler.reset()
         self.packets_read = 0
 
         rfe_mode = self._device_set['rfe_mode']
@@ -149,13 +244,52 @@ class CaptureDevice(object):
         self.usable_bins, fstart, fstop = adjust_usable_fstart_fstop(
             self.real_device.properties,
             rfe_mode,
-            (self.points * self.packets_per_block),
+            self._fft_points,
             decimation,
             freq,
             packet.spec_inv,
             self.usable_bins)
 
+        if self._spectrum:
+            return self._emit_spectrum(fstart, fstop, data)
+
         if self.async_callback:
             self.async_callback(fstart, fstop, data)
             return
         return (fstart, fstop, data)
+
+    def _emit_spectrum(self, fstart, fstop, data):
+        if self._welch is not None:
+            pow_data = self._welch_spectrum(data['data_pkt'],
+                data['context_pkt'])
+        else:
+            device_set = self._device_set
+            correction = self._iq_corrections.lookup(device_set['freq'],
+                device_set['rfe_mode'], device_set.get('attenuator', 0),
+                device_set.get('decimation', 1))
+            pow_data = compute_fft(self.real_device, data['data_pkt'],
+                data['context_pkt'], iq_correction=correction)
+        pow_data, usable_bins, fstart, fstop = trim_to_usable_fstart_fstop(
+            pow_data, self.usable_bins, fstart, fstop)
+
+        if self._trace is not None:
+            pow_data = self._trace.update(pow_data)
+            if pow_data is None:
+                # capture again until the trace is emitted
+                self.usable_bins = self._capture_usable_bins
+                self.real_device.capture(self.points, self.packets_per_block)
+                return
+            pow_data = np.array(pow_data)
+
+        if self.async_callback:
+            self.async_callback(fstart, fstop, pow_data)
+            return
+        return (fstart, fstop, pow_data)
+
+    def _welch_spectrum(self, data_pkt, context):
+        pow_data = self._welch.power_spectrum()
+        self._welch.reset()
+        if data_pkt.spec_inv:
+            pow_data = np.flipud(pow_data)
+        return (pow_data + context['reflevel']
+            + self.real_device.properties.REFLEVEL_ERROR)
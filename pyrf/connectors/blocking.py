@@ -1,18 +1,157 @@
 import socket
+from socket import timeout as socket_timeout
+import threading
+try:
+    from Queue import Queue, Full, Empty
+except ImportError:
+    from queue import Queue, Full, Empty
 
 from pyrf.connectors.base import sync_async, SCPI_PORT, VRT_PORT
+from pyrf.vrt import vrt_packet_reader
+from pyrf.metrics import metrics, monotonic
 
 import logging
 logger = logging.getLogger(__name__)
 
+#: reader thread policy: wait for room in the queue, letting the
+#: device's buffers absorb the backlog
+BLOCK = 'block'
+#: reader thread policy: drop data packets when the queue is full
+DROP = 'drop'
+
+# how often a reader thread waiting for data checks if it should stop
+READER_POLL_INTERVAL = 0.2
+
+
+class VRTReader(object):
+    """
+    A thread that reads and parses VRT packets from a connector into a
+    bounded queue, so that reading the network overlaps with processing
+    the packets.  Created by :meth:`PlainSocketConnector.start_reader`.
+
+    :param connector: the :class:`PlainSocketConnector` to read from
+    :param int queue_size: maximum number of packets waiting to be read
+    :param str policy: :data:`BLOCK` or :data:`DROP`; context packets
+                       are never dropped, and are queued even when the
+                       queue is full of data packets
+
+    .. attribute:: dropped
+
+       number of data packets dropped because the queue was full
+
+    .. attribute:: held
+
+       the packet read but not queued because the thread was stopped
+       while the queue was full, *None* if there wasn't one
+    """
+    def __init__(self, connector, queue_size=64, policy=BLOCK):
+        if policy not in (BLOCK, DROP):
+            raise ValueError("unknown reader policy %r" % (policy,))
+        self.connector = connector
+        self.policy = policy
+        self.queue_size = queue_size
+        self.queue = Queue(queue_size if policy == BLOCK else 0)
+        self.dropped = 0
+        self.held = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop after the packet being read, if any, and wait for the
+        thread to exit.  A packet that can't be queued is kept in
+        :attr:`held`.
+        """
+        self._stopping = True
+        self._thread.join()
+
+    def _raw_read(self, num):
+        while True:
+            try:
+                data = self.connector.raw_read(num)
+            except socket.timeout:
+                # only stop between packets so the stream stays aligned
+                if self._stopping and self._at_boundary:
+                    raise _ReaderStopped()
+                continue
+            if not data and not self._at_boundary:
+                # socketread returns False when the peer closes the socket
+                raise EOFError()
+            self._at_boundary = False
+            return data
+
+    def _run(self):
+        try:
+            self._read_packets()
+        except _ReaderStopped:
+            return
+
+    def _read_packets(self):
+        try:
+            while True:
+                self._at_boundary = True
+                packet = self.connector.sync_async(
+                    vrt_packet_reader(self._raw_read))
+                tracker = self.connector.sequence_tracker
+                if tracker is not None and packet is not None:
+                    tracker.update(packet)
+                self._put(packet)
+                if packet is None:
+                    return
+        except _ReaderStopped:
+            raise
+        except EOFError:
+            logger.debug('VRT connection closed in the middle of a packet')
+            self._put(None)
+        except socket.error as err:
+            logger.debug('VRT reader stopped on socket error: %s', err)
+            self._put(None)
+        except Exception:
+            logger.exception('VRT reader failed')
+            self._put(None)
+
+    def _put(self, packet):
+        if self.policy == DROP:
+            if (packet is not None and packet.is_data_packet()
+                    and self.queue.qsize() >= self.queue_size):
+                self.dropped += 1
+                metrics.count('reader.dropped')
+                return
+            self.queue.put(packet)
+            return
+        while True:
+            try:
+                self.queue.put(packet, timeout=READER_POLL_INTERVAL)
+                return
+            except Full:
+                if self._stopping:
+                    self.held = packet
+                    raise _ReaderStopped()
+
+
+class _ReaderStopped(Exception):
+    pass
+
+
 class PlainSocketConnector(object):
     """
     This connector makes SCPI/VRT socket connections using plain sockets, of blocking type.
+
+    A :class:`pyrf.vrt.SequenceTracker` may be assigned to
+    *sequence_tracker* to check every VRT packet read.
     """
 
     def __init__(self):
+        self.sequence_tracker = None
         self._sock_scpi = None
         self._sock_vrt = None
+        self._reader = None
+        self._packets = None
+        self._held = None
 
     def connect(self, host, timeout=8): # if after 8s nothing has happened, throw timeout
         """connect scpi and vrt with a timeout"""
@@ -36,6 +175,13 @@ class PlainSocketConnector(object):
 
     def disconnect(self):
         """attempt to disconnect safely from SCPI and VRT"""
+        reader = self._reader
+        if reader is not None:
+            # the reader exits when the socket is shut down
+            reader._stopping = True
+            self._reader = None
+            self._packets = None
+        self._held = None
         try:
             # try to shutdown both sessions
             self._sock_scpi.shutdown(socket.SHUT_RDWR)
@@ -44,14 +190,26 @@ class PlainSocketConnector(object):
             # regardless of what happens in shutdown, ALWAYS lose sockets on disconnect
             self._sock_scpi.close()
             self._sock_vrt.close()
+            if reader is not None:
+                reader._thread.join()
 
     def scpiset(self, cmd):
         cmd = "%s\n" % cmd
         logger.debug('scpiset %r', cmd)
+        metrics.count('scpi.commands')
         self._sock_scpi.send(cmd)
 
     def scpiget(self, cmd):
         """send a query to the device and wait for its response"""
+        if not metrics.enabled:
+            return self._scpiget(cmd)
+        start = monotonic()
+        try:
+            return self._scpiget(cmd)
+        finally:
+            metrics.add_time('scpi.query', monotonic() - start)
+
+    def _scpiget(self, cmd):
         cmd = "%s\n" % cmd
         logger.debug('scpiget %r', cmd)
         try:
@@ -109,7 +267,75 @@ class PlainSocketConnector(object):
         return self._vrt.has_data()
 
     def raw_read(self, num):
-        return socketread(self._sock_vrt, num)
+        if not metrics.enabled:
+            return socketread(self._sock_vrt, num)
+        start = monotonic()
+        data = socketread(self._sock_vrt, num)
+        metrics.add_time('socket.read', monotonic() - start)
+        if data:
+            # socketread returns False when the socket is closed
+            metrics.count('socket.bytes', len(data))
+        return data
+
+    def start_reader(self, queue_size=64, policy=BLOCK):
+        """
+        Start a :class:`VRTReader` thread that drains the VRT socket
+        into a queue of parsed packets returned by :meth:`read_packet`
+
+        :param int queue_size: maximum number of packets waiting to be read
+        :param str policy: :data:`BLOCK` or :data:`DROP`
+        :returns: the :class:`VRTReader`
+        """
+        if self._reader is not None:
+            raise ValueError("VRT reader already started")
+        self._sock_vrt.settimeout(READER_POLL_INTERVAL)
+        self._reader = VRTReader(self, queue_size, policy)
+        self._packets = self._reader.queue
+        self._reader.start()
+        return self._reader
+
+    def stop_reader(self):
+        """
+        Stop the VRT reader thread.  Packets it already queued, and the
+        packet it was holding if the queue was full, are returned by
+        :meth:`read_packet` before reading the socket again.
+        """
+        reader = self._reader
+        if reader is None:
+            return
+        reader.stop()
+        self._held = reader.held
+        self._reader = None
+        self._sock_vrt.settimeout(None)
+
+    def read_packet(self, timeout=None):
+        """
+        Return the next parsed VRT packet, from the reader thread's queue
+        if it was started, or *None* if the VRT connection was closed
+
+        :param float timeout: seconds to wait for the reader thread to
+                              queue a packet, *None* to wait until it
+                              does; ignored without a reader thread
+        :raises socket.timeout: if no packet was queued in time
+        """
+        packets = self._packets
+        if packets is not None:
+            if self._reader is not None:
+                try:
+                    return packets.get(timeout=timeout)
+                except Empty:
+                    raise socket_timeout()
+            try:
+                return packets.get_nowait()
+            except Empty:
+                self._packets = None
+            if self._held is not None:
+                packet, self._held = self._held, None
+                return packet
+        packet = self.sync_async(vrt_packet_reader(self.raw_read))
+        if self.sequence_tracker is not None and packet is not None:
+            self.sequence_tracker.update(packet)
+        return packet
 
     def sync_async(self, gen):
         """
@@ -141,7 +367,14 @@ def socketread(socket, count, flags = None):
         return False
 
     while datalen < count:
-        data = data + socket.recv(count - datalen)
+        try:
+            chunk = socket.recv(count - datalen)
+        except socket_timeout:
+            # keep waiting for the rest of a partly received read
+            continue
+        if not chunk:
+            return False
+        data = data + chunk
         datalen = len(data)
 
     return data
@@ -20,6 +20,7 @@ except ImportError:
 
 from pyrf.connectors.base import sync_async, SCPI_PORT, VRT_PORT
 from pyrf.vrt import vrt_packet_reader, generate_speca_packet
+from pyrf.metrics import metrics, monotonic
 import logging
 import time
 import os
@@ -35,11 +36,15 @@ class TwistedConnector(object):
 
     :param reactor: a twisted reactor, (ex: "from twisted.internet import reactor")
     :param callback vrt_callback: A callback may be assigned to *vrt_callback* that will be called with VRT packets as they arrive.  When *vrt_callback* is None (the default), arriving packets will be ignored.
+
+    A :class:`pyrf.vrt.SequenceTracker` may be assigned to
+    *sequence_tracker* to check every VRT packet as it arrives.
     """
 
     def __init__(self, reactor, vrt_callback=None):
         self._reactor = reactor
         self.vrt_callback = vrt_callback
+        self.sequence_tracker = None
 
     def connect(self, host, output_file=None, timeout=8):
         point = HostnameEndpoint(self._reactor, host, SCPI_PORT)
@@ -92,6 +97,8 @@ class TwistedConnector(object):
         raise TwistedConnectorError('synchronous read() not supported.')
 
     def _vrt_callback(self, packet):
+        if self.sequence_tracker is not None:
+            self.sequence_tracker.update(packet)
         if self.vrt_callback:
             self.vrt_callback(packet)
 
@@ -247,6 +254,7 @@ class SCPIClient(Protocol, TimeoutMixin):
         self._buf_scpi = StringIO()
 
     def scpiset(self, cmd):
+        metrics.count('scpi.commands')
         if self._pending:
             # prevent reordering
             self._pending.append((cmd, None))
@@ -256,6 +264,8 @@ class SCPIClient(Protocol, TimeoutMixin):
 
     def scpiget(self, cmd):
         d = defer.Deferred()
+        if metrics.enabled:
+            d.addBoth(self._query_done, monotonic())
         if self._pending:
             # command pipelining not supported
             self._pending.append((cmd, d))
@@ -266,6 +276,10 @@ class SCPIClient(Protocol, TimeoutMixin):
             logger.debug('scpiget %r', cmd)
         return d
 
+    def _query_done(self, result, start):
+        metrics.add_time('scpi.query', monotonic() - start)
+        return result
+
     def timeoutConnection(self):
         if len(self._pending) > 0:
             cmd, d = self._pending.pop(0)
@@ -1,73 +1,225 @@
-import math
-import random
-from collections import namedtuple
-import time
+import mmap
+import os
 
 import numpy as np
 
-from pyrf.numpy_util import compute_fft
-from pyrf.config import SweepEntry
-from pyrf.util import find_saturation
+# bytes of the file scanned at a time while indexing
+INDEX_CHUNK = 1 << 24
 
 
 class CSVReader(object):
     """
     Object that reads, and parses ThinkRF RTSA CSV files
 
+    Opening the file builds an index of the byte range of every sweep,
+    found by scanning the file for the sweep header lines, the only
+    lines after the file header containing commas.  Sweeps are then
+    read in any order, each parsed in one call rather than a line at a
+    time.  The index can be saved next to the file and reused while the
+    file is unchanged.
+
     :param filename: name of the file to be read
     :param callback: callback to use for async operation (not used if
                      file_name is using a :class:`PlainSocketConnector`)
+    :param bool cache_index: save the index as *file_name* + '.idx.npz'
+                             and load it from there when it matches the
+                             file's size and modification time
 
     """
     _file = None
     device_id = ''
-    def __init__(self, file_name, async_callback=None):
+    def __init__(self, file_name, async_callback=None, cache_index=False):
         self._file_name = file_name
         self.async_callback = async_callback
+        self.cache_index = cache_index
+        self._position = 0
 
     def open_csv(self):
-        self._file = open(self._file_name, 'r')
-        
+        self._file = open(self._file_name, 'rb')
+
         # read first line, which is the comment line
-        self._file_comment = self._file.readline()
+        self._file_comment = self._file.readline().decode('utf-8')
         # read second line, which is the device ID line
-        self.device_id = self._file.readline()
+        self.device_id = self._file.readline().decode('utf-8')
         # read the header of the data format
         self._file.readline()
         self._line_num = 3
-    
+        self._data_start = self._file.tell()
+
+        if not self._load_index():
+            self._build_index()
+            if self.cache_index:
+                self._save_index()
+        self._position = 0
+
     def close_csv(self):
         if self._file is not None:
             self._file.close()
             self._file = None
+
+    def _index_file(self):
+        return self._file_name + '.idx.npz'
+
+    def _file_signature(self):
+        stat = os.stat(self._file_name)
+        return np.array([stat.st_size, stat.st_mtime])
+
+    def _load_index(self):
+        if not self.cache_index or not os.path.exists(self._index_file()):
+            return False
+        with np.load(self._index_file()) as index:
+            if not np.array_equal(index['signature'], self._file_signature()):
+                return False
+            self._offsets = index['offsets']
+            self._ends = index['ends']
+            self.modes = index['modes']
+            self.fstarts = index['fstarts']
+            self.fstops = index['fstops']
+            self.points = index['points']
+            self.timestamps = index['timestamps']
+        self.times = _parse_times(self.timestamps)
+        return True
+
+    def _save_index(self):
+        with open(self._index_file(), 'wb') as f:
+            np.savez(f, signature=self._file_signature(),
+                offsets=self._offsets, ends=self._ends, modes=self.modes,
+                fstarts=self.fstarts, fstops=self.fstops,
+                points=self.points, timestamps=self.timestamps)
+
+    def _build_index(self):
+        size = os.path.getsize(self._file_name)
+        headers = []
+        end = size
+        if size > self._data_start:
+            contents = mmap.mmap(self._file.fileno(), 0,
+                access=mmap.ACCESS_READ)
+            try:
+                headers = _header_offsets(contents, self._data_start, size)
+                # the data of the last sweep stops at the EOF line
+                eof = contents.find(b'\nEOF', self._data_start - 1)
+                if eof >= 0:
+                    end = eof + 1
+                elif contents[self._data_start:self._data_start + 3] == b'EOF':
+                    end = self._data_start
+                headers = [h for h in headers if h < end]
+            finally:
+                contents.close()
+
+        offsets = []
+        fields = []
+        for header in headers:
+            self._file.seek(header)
+            line = self._file.readline()
+            offsets.append(header + len(line))
+            fields.append(line.decode('utf-8').split(','))
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._ends = np.append(np.array(headers[1:], dtype=np.int64), end)
+        self._ends = self._ends[:len(offsets)]
+        self.modes = np.array([f[1] for f in fields], dtype='U')
+        self.fstarts = np.array([float(f[2]) for f in fields])
+        self.fstops = np.array([float(f[3]) for f in fields])
+        self.points = np.array([int(f[4]) for f in fields], dtype=int)
+        self.timestamps = np.array([f[5] for f in fields], dtype='U')
+        self.times = _parse_times(self.timestamps)
+
+    def __len__(self):
+        """
+        The number of sweeps in the file
+        """
+        return len(self._offsets)
+
+    def seek(self, sweep_index):
+        """
+        Make sweep *sweep_index* the next one returned by :meth:`read_data`
+        """
+        if not 0 <= sweep_index < len(self._offsets):
+            raise IndexError("sweep index out of range")
+        self._position = sweep_index
+
+    def read_sweep(self, sweep_index):
+        """
+        Parse one sweep
+
+        :param int sweep_index: position of the sweep in the file
+        :returns: (start, stop, pow_data) where *pow_data* is a numpy
+                  array of the sweep's power values
+        """
+        self._file.seek(self._offsets[sweep_index])
+        block = self._file.read(self._ends[sweep_index]
+            - self._offsets[sweep_index])
+        pow_data = np.fromstring(block, sep=' ')
+        return (self.fstarts[sweep_index], self.fstops[sweep_index],
+            pow_data)
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self.read_sweep(index)
+
+    def time_range(self, start_time=None, stop_time=None):
+        """
+        Find the sweeps with numeric timestamps from *start_time* up to
+        but not including *stop_time*
+
+        :returns: a numpy array of sweep indexes
+        """
+        match = ~np.isnan(self.times)
+        if start_time is not None:
+            match &= self.times >= start_time
+        if stop_time is not None:
+            match &= self.times < stop_time
+        return np.flatnonzero(match)
+
     def read_data(self):
-        try:
-            data_header = self._file.readline().split(',')
-        except AttributeError:
+        if self._file is None:
             return (0,0,[0,0])
 
         # if we reached end of file, reset the file
-        if data_header[0] == 'EOF':
+        if self._position >= len(self._offsets):
             self._reset_file()
-            data_header = self._file.readline().split(',')
-
-        mode = data_header[1]
-        start = float(data_header[2])
-        stop = float(data_header[3])
-        points = int(data_header[4])
-        pow_data = []
-        for p in range(points - 1):
-            data = self._file.readline()
-            pow_data.append(float(data))
-        self.time_stamp = data_header[5]
+        if not len(self._offsets):
+            return (0,0,[0,0])
+
+        index = self._position
+        start, stop, pow_data = self.read_sweep(index)
+        self.time_stamp = self.timestamps[index]
+        self._position = index + 1
         if self.async_callback is None:
             return (start, stop, pow_data)
         else:
             self.async_callback(start, stop, pow_data)
 
     def _reset_file(self):
-        # reset the data file, and read first 3 lines
-        self._file.seek(0)
-        self._file.readline()
-        self._file.readline()
-        self._file.readline()
\ No newline at end of file
+        # go back to the first sweep
+        self._position = 0
+
+
+def _header_offsets(contents, data_start, size):
+    # offsets of the lines containing commas, scanned in chunks
+    headers = []
+    last_newline = data_start - 1
+    for chunk_start in range(data_start, size, INDEX_CHUNK):
+        chunk = np.frombuffer(contents[chunk_start:chunk_start + INDEX_CHUNK],
+            dtype=np.uint8)
+        newlines = np.flatnonzero(chunk == ord('\n')) + chunk_start
+        commas = np.flatnonzero(chunk == ord(',')) + chunk_start
+        if len(commas):
+            line_ends = np.concatenate(([last_newline], newlines))
+            line_starts = line_ends[np.searchsorted(line_ends, commas) - 1] + 1
+            for start in np.unique(line_starts):
+                # a line may have commas in two chunks
+                if not headers or headers[-1] != start:
+                    headers.append(int(start))
+        if len(newlines):
+            last_newline = newlines[-1]
+    return headers
+
+
+def _parse_times(timestamps):
+    times = np.empty(len(timestamps))
+    for i, timestamp in enumerate(timestamps):
+        try:
+            times[i] = float(timestamp)
+        except ValueError:
+            times[i] = np.nan
+    return times
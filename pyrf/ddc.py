@@ -0,0 +1,145 @@
+"""
+Software digital down-conversion of wideband IQ captures.
+
+A :class:`DDC` extracts several narrowband channels from one ZIF or
+IQIN capture or stream, so many channels can be analyzed from one
+capture instead of retuning the RTSA with
+:meth:`pyrf.devices.thinkrf.WSA.fshift` and
+:meth:`pyrf.devices.thinkrf.WSA.decimation` for each one::
+
+    from pyrf.ddc import DDC
+    rate = dut.properties.FULL_BW['ZIF']
+    ddc = DDC(rate, [-20e6, 5e6, 30e6], decimation=50)
+    for packet in packets:
+        channels = ddc.process_packet(packet)
+
+Each call returns a row of IQ samples at ``sample_rate / decimation`` for
+every channel.  The mixer phase and the filter history are carried from
+one call to the next, so a stream split into packets gives the same
+samples as the whole capture processed at once.
+"""
+
+import numpy as np
+
+
+def lowpass_taps(numtaps, cutoff):
+    """
+    Return a Blackman windowed sinc low pass filter with unit DC gain
+
+    :param int numtaps: number of taps
+    :param float cutoff: cutoff frequency, as a fraction of the sample rate
+    :returns: numpy array of taps
+    """
+    n = np.arange(numtaps) - (numtaps - 1) / 2.0
+    taps = np.sinc(2 * cutoff * n) * np.blackman(numtaps)
+    return taps / np.sum(taps)
+
+
+class DDC(object):
+    """
+    Mix each channel down to 0 Hz with a numerically controlled
+    oscillator (NCO), low pass filter it and keep every *decimation*-th
+    sample.
+
+    The filter is only evaluated at the samples that are kept, one tap
+    at a time across all channels and output samples, which is the same
+    work as a polyphase decimator.
+
+    :param float sample_rate: sample rate of the input, in Hz
+    :param offsets: center frequency of each channel relative to the
+                    center of the capture, in Hz
+    :param int decimation: ratio of the input to the output sample rate
+    :param float bandwidth: bandwidth of the channels, in Hz; defaults
+                            to 80% of the output sample rate
+    :param taps: low pass filter taps to use instead of a
+                 :func:`lowpass_taps` filter of ``24 * decimation + 1``
+                 taps cut off at half the *bandwidth*
+    """
+    def __init__(self, sample_rate, offsets, decimation, bandwidth=None,
+            taps=None):
+        if decimation < 1:
+            raise ValueError("decimation must be at least 1")
+        self.sample_rate = float(sample_rate)
+        self.offsets = np.atleast_1d(np.asarray(offsets, dtype=float))
+        self.decimation = int(decimation)
+        if bandwidth is None:
+            bandwidth = 0.8 * self.sample_rate / self.decimation
+        self.bandwidth = bandwidth
+        if taps is None:
+            taps = lowpass_taps(24 * self.decimation + 1,
+                0.5 * bandwidth / self.sample_rate)
+        self.taps = np.asarray(taps, dtype=float)
+        self._phase_step = -2 * np.pi * self.offsets / self.sample_rate
+        self.reset()
+
+    @property
+    def output_rate(self):
+        """
+        The sample rate of the channels, in Hz
+        """
+        return self.sample_rate / self.decimation
+
+    def reset(self):
+        """
+        Start a new capture, e.g. after a gap in the stream
+        """
+        numtaps = len(self.taps)
+        self._phase = np.zeros(len(self.offsets))
+        self._history = np.zeros((len(self.offsets), numtaps - 1),
+            dtype=np.complex128)
+        # position in the history of the newest sample of the next output
+        self._next = numtaps - 1
+
+    def process(self, samples):
+        """
+        Down-convert the next block of samples
+
+        :param samples: complex IQ samples
+        :returns: a numpy array with a row of samples for each channel,
+                  complex64 for complex64 input or complex128 otherwise
+        """
+        samples = np.asarray(samples)
+        count = len(samples)
+
+        # NCO, with the phase wrapped between calls
+        steps = np.arange(count)
+        phase = self._phase[:, np.newaxis] + np.outer(self._phase_step, steps)
+        mixed = np.exp(1j * phase)
+        mixed *= samples
+        self._phase = np.mod(self._phase + self._phase_step * count,
+            2 * np.pi)
+
+        buf = np.concatenate((self._history, mixed), axis=1)
+        first = self._next
+        outputs = max(0, (buf.shape[1] - 1 - first) // self.decimation + 1)
+        out = np.zeros((len(self.offsets), outputs), dtype=np.complex128)
+        if outputs:
+            last = first + (outputs - 1) * self.decimation + 1
+            for index, tap in enumerate(self.taps):
+                out += tap * buf[:, first - index:last - index:self.decimation]
+
+        # keep what the next outputs need
+        numtaps = len(self.taps)
+        keep_from = first + outputs * self.decimation - (numtaps - 1)
+        self._history = buf[:, keep_from:].copy()
+        # filters shorter than the decimation skip samples not received yet
+        self._next = numtaps - 1 + max(0, keep_from - buf.shape[1])
+
+        if samples.dtype == np.complex64:
+            return out.astype(np.complex64)
+        return out
+
+    def process_packet(self, data_pkt):
+        """
+        Down-convert the samples of an IQ data packet, undoing spectral
+        inversion
+
+        :param data_pkt: a :class:`pyrf.vrt.DataPacket` of I14Q14 data
+        :returns: the output of :meth:`process`
+        """
+        samples = data_pkt.samples()
+        if not np.iscomplexobj(samples):
+            raise ValueError("DDC needs IQ data packets")
+        if data_pkt.spec_inv:
+            samples = np.conj(samples)
+        return self.process(samples)
@@ -1,14 +1,334 @@
+import time
+import struct
+
+from twisted.internet import defer
+
 from pyrf.devices.thinkrf_properties import wsa_properties
+from pyrf.vrt import vrt_packet_reader
+
+# number of packets delivered per reactor call when not rate limited
+PLAYBACK_BATCH = 64
+
+class PlaybackError(Exception):
+    pass
+
 
 class Playback(object):
-    def __init__(self, device_class, device_identifier):
+    """
+    A device that replays a VRT recording, as written by
+    :meth:`pyrf.devices.thinkrf.WSA.set_recording_output`, in place of
+    a real RTSA.  :class:`pyrf.sweep_device.SweepDevice` and
+    :class:`pyrf.capture_device.CaptureDevice` can use it unchanged.
+
+    :param str device_class: recorded device class, only 'thinkrf.WSA'
+                             is supported
+    :param str device_identifier: the recorded device's ``*IDN?`` response
+    :param recording: file name or binary file object of the VRT
+                      recording, or *None* for a device without data
+    :param speed: *None* to replay as fast as possible, otherwise a
+                  multiplier applied to the recorded timestamps
+                  (1.0 for real time)
+    :param bool loop: rewind to the start of the recording when the end
+                      is reached
+    :param reactor: a twisted reactor for asynchronous playback through
+                    :meth:`set_async_callback`, or *None* to use :meth:`read`
+
+    Recorded sweep ID context packets are rewritten to the ID passed to
+    :meth:`sweep_start` so that sweeps are accepted by
+    :class:`pyrf.sweep_device.SweepDevice`.
+    """
+    def __init__(self, device_class, device_identifier, recording=None,
+            speed=None, loop=False, reactor=None):
         # XXX this is all we support for now
         assert device_class == 'thinkrf.WSA'
         self.properties = wsa_properties(device_identifier)
         self.device_id = device_identifier
+        self.device_state = {}
+
+        # latest speca state packet found in the recording
+        self.recorded_state = None
+
+        if recording is None or hasattr(recording, 'read'):
+            self._file = recording
+        else:
+            self._file = open(recording, 'rb')
+        self._speed = speed
+        self._loop = loop
+        self._reactor = reactor
+        self._async_callback = None
+        self._eof = self._file is None
+
+        self._next_packet = None
+        self._time_base = None
+        self._sweep_id = None
+
+        # (kind, remaining data packets) of the capture being replayed
+        # through the async callback
+        self._request = None
+        self._data_delivered = 0
+        self._delayed_call = None
 
     def async_connector(self):
-        return False
+        """
+        Return True if packets are delivered through an async callback
+        """
+        return self._reactor is not None
+
+    def set_async_callback(self, callback):
+        """
+        Set the callback that receives replayed packets.
+
+        :param callback: callback to set, *None* to stop delivering packets
+        """
+        self._async_callback = callback
+        self._schedule(0)
 
     def disconnect(self):
+        self._request = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._eof = True
+
+    def request_read_perm(self):
+        return True
+
+    def have_read_perm(self):
+        return True
+
+    def reset(self):
+        pass
+
+    def abort(self):
+        self._request = None
+
+    def flush(self):
+        pass
+
+    def flush_captures(self):
+        pass
+
+    def apply_device_settings(self, settings, force_change=False):
+        """
+        Remember device settings, a recording can't be reconfigured.
+        """
+        self.device_state.update(settings)
+
+    def correction_size(self, data_type=None):
+        # recordings carry no spectral flattening vectors
+        return self._result(0)
+
+    def correction_data(self, data_type=None, offset=0, length=0):
+        return self._result(b'')
+
+    def trace_format(self, fmt=None):
+        """
+        Remember the requested data format, a recording is replayed in
+        the format it was recorded in.
+
+        :param str fmt: 'SAMPLES', 'PSD8', or *None* to query
+        :returns: the current data format if *None* is used
+        """
+        if fmt is None:
+            fmt = self.device_state.get('trace_format', 'SAMPLES')
+        else:
+            self.device_state['trace_format'] = fmt
+        return self._result(fmt)
+
+    def capture(self, spp, ppb):
+        """
+        Replay the next block capture of *ppb* data packets
+        """
+        self._start_request('block', ppb)
+
+    def sweep_clear(self):
+        pass
+
+    def sweep_add(self, entry):
         pass
+
+    def sweep_iterations(self, count=None):
+        pass
+
+    def sweep_start(self, start_id=None):
+        """
+        Replay the next sweep, reporting it as sweep *start_id*
+        """
+        self._sweep_id = start_id
+        self._start_request('sweep', None)
+
+    def sweep_stop(self):
+        self._request = None
+
+    def stream_start(self, stream_id=None):
+        """
+        Replay the recording continuously until :meth:`stream_stop`
+        """
+        self._start_request('stream', None)
+
+    def stream_stop(self):
+        self._request = None
+
+    def eof(self):
+        """
+        :returns: True when the end of the recording has been reached
+        """
+        return self._eof and self._next_packet is None
+
+    def read(self):
+        """
+        Return the next packet in the recording, waiting as required
+        by the playback speed, or *None* at the end of the recording.
+        """
+        packet = self._peek_packet()
+        if packet is None:
+            return None
+        delay = self._packet_delay(packet)
+        if delay > 0:
+            time.sleep(delay)
+        self._next_packet = None
+        return packet
+
+    def _result(self, value):
+        """
+        Return *value* the way :class:`pyrf.devices.thinkrf.WSA` returns
+        query results: in a deferred when used with a reactor.
+        """
+        if self._reactor is not None:
+            return defer.succeed(value)
+        return value
+
+    def _start_request(self, kind, packets):
+        self._request = (kind, packets)
+        self._data_delivered = 0
+        self._schedule(0)
+
+    def _schedule(self, delay):
+        if self._reactor is None or self._delayed_call is not None:
+            return
+        if self._request is None or self._async_callback is None:
+            return
+        self._delayed_call = self._reactor.callLater(delay, self._deliver)
+
+    def _deliver(self):
+        """
+        Send packets to the async callback until the current request
+        is satisfied or the next packet isn't due yet.
+        """
+        self._delayed_call = None
+        for i in range(PLAYBACK_BATCH):
+            if self._request is None or self._async_callback is None:
+                return
+            packet = self._peek_packet()
+            if packet is None:
+                self._request = None
+                return
+
+            kind, packets = self._request
+            if (kind == 'sweep' and self._data_delivered
+                    and packet.is_context_packet()
+                    and 'sweepid' in packet.fields):
+                # hold the start of the next sweep for the next request
+                self._request = None
+                return
+
+            delay = self._packet_delay(packet)
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            self._next_packet = None
+            if packet.is_data_packet():
+                self._data_delivered += 1
+                if kind == 'block' and self._data_delivered >= packets:
+                    self._request = None
+            self._async_callback(packet)
+        self._schedule(0)
+
+    def _packet_delay(self, packet):
+        """
+        Return the number of seconds to wait before *packet* is due
+        """
+        if not self._speed or packet.tsi is None:
+            return 0
+        timestamp = packet.tsi + packet.tsf * 1e-12
+        now = time.time()
+        if self._time_base is None or timestamp < self._time_base[0]:
+            # first timestamp, or the recording was rewound
+            self._time_base = (timestamp, now)
+            return 0
+        recorded_start, wall_start = self._time_base
+        return wall_start + (timestamp - recorded_start) / self._speed - now
+
+    def _peek_packet(self):
+        if self._next_packet is None:
+            self._next_packet = self._read_recorded_packet()
+        return self._next_packet
+
+    def _read_recorded_packet(self):
+        if self._eof:
+            return None
+        rewound = False
+        while True:
+            packet = _parse_packet(self._file)
+            if packet:
+                break
+            if not self._loop or rewound:
+                self._eof = True
+                return None
+            self._file.seek(0)
+            self._time_base = None
+            rewound = True
+
+        if packet.is_context_packet():
+            if 'speca' in packet.fields:
+                self.recorded_state = packet.fields['speca']
+            if 'sweepid' in packet.fields and self._sweep_id is not None:
+                packet.fields['sweepid'] = self._sweep_id
+                packet.fields['startid'] = "0x%08x" % self._sweep_id
+        return packet
+
+
+def _parse_packet(recording):
+    """
+    Return the next VRT packet from *recording* or *None* at the end of
+    the file.  A packet cut short by the end of the file is discarded.
+    """
+    def raw_read(num):
+        data = recording.read(num)
+        if data and len(data) < num:
+            raise EOFError
+        return data
+
+    reader = vrt_packet_reader(raw_read)
+    packet = None
+    try:
+        while True:
+            packet = reader.send(packet)
+    except StopIteration:
+        return packet or None
+    except (EOFError, struct.error):
+        return None
+
+
+def open_recording(recording, **kwargs):
+    """
+    Return a :class:`Playback` device for a recording that starts with
+    the speca state packet injected by
+    :meth:`pyrf.devices.thinkrf.WSA.inject_recording_state`.  The state
+    must include the 'device_identifier' of the recorded device.
+
+    :param recording: file name or binary file object of the VRT recording
+    :param kwargs: other :class:`Playback` parameters, e.g. *speed*
+    """
+    if not hasattr(recording, 'read'):
+        recording = open(recording, 'rb')
+    packet = _parse_packet(recording)
+    state = None
+    if packet is not None and packet.is_context_packet():
+        state = packet.fields.get('speca')
+    if not state or 'device_identifier' not in state:
+        raise PlaybackError("recording doesn't start with a device state packet")
+    recording.seek(0)
+    return Playback(state.get('device_class', 'thinkrf.WSA'),
+        state['device_identifier'], recording, **kwargs)
@@ -1,10 +1,10 @@
 from pyrf.config import SweepEntry, TriggerSettings, TRIGGER_TYPE_LEVEL, TRIGGER_TYPE_NONE, TriggerSettingsError
 from pyrf.connectors.blocking import PlainSocketConnector
 from pyrf.connectors.base import sync_async
-from pyrf.vrt import vrt_packet_reader
+from pyrf.vrt import vrt_packet_reader, SequenceTracker
 from pyrf.devices.thinkrf_properties import wsa_properties
 from pyrf.util import capture_spectrum, read_data_and_context
-from pyrf.numpy_util import compute_fft
+from pyrf.numpy_util import compute_fft, find_peaks, estimate_noisefloor
 import struct
 import socket
 import select
@@ -138,6 +138,9 @@ class WSA(object):
         Returns frequency and the power level of the maximum spectral point
         computed using the current settings, Note this function disables
 
+        Peaks are the highest local maxima found by
+        :func:`pyrf.numpy_util.find_peaks`, so each signal is reported once.
+
         :param int n: determine the number of peaks to return
         :param int rbw: rbw of spectral capture (Hz) (will round to nearest native RBW) or None
         :param int average: number of capture iterations
@@ -155,11 +158,7 @@ class WSA(object):
         self.request_read_perm()
 
         fstart, fstop, pow_data = capture_spectrum(self, rbw, average)
-        frequencies = np.linspace(fstart, fstop, len(pow_data))
-        peak_points = []
-        for p in sorted(pow_data, reverse=True)[0:n]:
-            peak_points.append((frequencies[np.where(pow_data == p)][0], p))
-        return peak_points
+        return find_peaks(pow_data, fstart, fstop, n)
 
     def measure_noisefloor(self, rbw=None, average=1):
         """
@@ -177,8 +176,7 @@ class WSA(object):
         # get read access
         self.request_read_perm()
         fstart, fstop, pow_data = capture_spectrum(self, rbw, average)
-        noisefloor = np.mean(sorted(pow_data)[int(len(pow_data) * 0.2):])
-        return noisefloor
+        return estimate_noisefloor(pow_data)
 
     @sync_async
     def rfe_mode(self, mode=None):
@@ -503,6 +501,34 @@ class WSA(object):
         else:
             self.scpiset(":TRACE:SPP %s\n" % (samples,))
 
+    @sync_async
+    def trace_format(self, fmt=None):
+        """
+        This command sets or queries the format of the data packets the
+        RTSA sends.  In 'PSD8' format the RTSA computes the spectrum of
+        each packet's samples and sends 8-bit log power bins instead,
+        see :func:`pyrf.numpy_util.psd8_to_dbm`.
+
+        The PSD8 format is experimental: its command and bin scaling are
+        those of :class:`pyrf.sim.SimulatedRTSA`, the only device with
+        the *PSD8_TRACE* property, until confirmed on hardware.
+
+        :param str fmt: 'SAMPLES', 'PSD8', or *None* to query
+        :returns: the current data format if *None* is used
+        :raises ValueError: if 'PSD8' is requested from a device without
+                            the *PSD8_TRACE* property
+        """
+        if (fmt is not None and str(fmt).upper() == 'PSD8'
+                and not self.properties.PSD8_TRACE):
+            raise ValueError("the experimental PSD8 trace format is only "
+                "supported by pyrf.sim.SimulatedRTSA")
+        if fmt is None:
+            buf = yield self.scpiget(":TRACE:FORMAT?")
+            fmt = buf.strip()
+        else:
+            self.scpiset(":TRACE:FORMAT %s" % str(fmt))
+        yield fmt
+
     @sync_async
     def ppb(self, packets=None):
         """
@@ -589,12 +615,56 @@ class WSA(object):
         else:
             yield -1
 
-    @sync_async
-    def read(self):
+    def read(self, timeout=None):
         """
         Read and return a single **parsed** VRT packet from the RTSA, either context or data.
+
+        :param float timeout: seconds to wait for a packet while the
+                              thread started by :meth:`start_vrt_reader`
+                              is running, *None* to wait until one arrives
+        :raises socket.timeout: if no packet arrived in time
+        """
+        read_packet = getattr(self.connector, 'read_packet', None)
+        if read_packet is not None:
+            return read_packet(timeout)
+        return self.connector.sync_async(
+            vrt_packet_reader(self.connector.raw_read))
+
+    def start_vrt_reader(self, queue_size=64, policy='block'):
+        """
+        Start a background thread that continuously reads and parses VRT
+        packets into a queue that :meth:`read` returns packets from, so
+        that network reads overlap with processing.  Only supported by
+        :class:`pyrf.connectors.blocking.PlainSocketConnector`.
+
+        :param int queue_size: maximum number of packets waiting to be read
+        :param str policy: 'block' to stop reading while the queue is
+                           full or 'drop' to drop data packets instead
+        :returns: the :class:`pyrf.connectors.blocking.VRTReader`, whose
+                  *dropped* attribute counts dropped packets
+        """
+        return self.connector.start_reader(queue_size, policy)
+
+    def stop_vrt_reader(self):
+        """
+        Stop the thread started by :meth:`start_vrt_reader`
+        """
+        self.connector.stop_reader()
+
+    def track_sequences(self, callback=None):
+        """
+        Check the count sequence and trailer flags of every VRT packet
+        received from now on.
+
+        :param callback: optional function called with (event, packet,
+                         lost) for each problem found, see
+                         :class:`pyrf.vrt.SequenceTracker`
+        :returns: the :class:`pyrf.vrt.SequenceTracker`, whose
+                  :meth:`stats` return the tallies so far
         """
-        return vrt_packet_reader(self.connector.raw_read)
+        tracker = SequenceTracker(callback)
+        self.connector.sequence_tracker = tracker
+        return tracker
 
     def raw_read(self, num):
         """
@@ -3,6 +3,9 @@ from distutils.version import StrictVersion, LooseVersion
 from pyrf.units import M
 from pyrf.vrt import I_ONLY, IQ
 
+#: serial number prefix of :class:`pyrf.sim.SimulatedRTSA` devices
+SIM_SERIAL_PREFIX = 'SIM-'
+
 def wsa_properties(device_id):
     """
     Return a WSA*Properties class for device_id passed
@@ -60,6 +63,10 @@ def wsa_properties(device_id):
 
     firmware_rev = LooseVersion(firmware.replace('-', '.'))
 
+    if serial.startswith(SIM_SERIAL_PREFIX):
+        # the PSD8 trace format is only implemented by the simulator
+        p.PSD8_TRACE = True
+
     return p
 
 def create_sample_size(min, max, multiple):
@@ -101,6 +108,7 @@ class WSA4000Properties(object):
     OLD_CMD_OUTPUT_MODE_CMD = True
     ATTENUATOR_TYPE = "BLOCK"
     BLOCK_ATTENUATOR_TYPE = "BOOL"
+    PSD8_TRACE = False
 
 
 ###
@@ -0,0 +1,168 @@
+"""
+Selectable FFT implementations for the transforms in
+:mod:`pyrf.numpy_util`.
+
+numpy's FFT is used by default.  scipy's FFT can use several threads
+for large transforms, such as multi-packet captures and batched Welch
+segments, and pyFFTW caches the plan for each transform size::
+
+    from pyrf import fft_backend
+    fft_backend.set_backend('scipy', workers=4)
+
+Available backends:
+
+========== =============================================================
+name       implementation
+========== =============================================================
+numpy      :mod:`numpy.fft`, single threaded
+scipy      :mod:`scipy.fft` with *workers* threads, or :mod:`scipy.fftpack`
+           on a single thread for scipy versions before 1.4
+fftw       :mod:`pyfftw.interfaces.numpy_fft` with *workers* threads and
+           plan caching
+========== =============================================================
+"""
+
+import numpy as np
+
+
+class NumpyBackend(object):
+    """
+    Transforms using :mod:`numpy.fft`
+    """
+    name = 'numpy'
+    workers = 1
+
+    def fft(self, x, axis=-1):
+        return np.fft.fft(x, axis=axis)
+
+    def ifft(self, x, axis=-1):
+        return np.fft.ifft(x, axis=axis)
+
+    def rfft(self, x, axis=-1):
+        return np.fft.rfft(x, axis=axis)
+
+
+class ScipyBackend(object):
+    """
+    Transforms using :mod:`scipy.fft` on *workers* threads, where
+    -1 uses all cores.  Older scipy versions without :mod:`scipy.fft`
+    use :mod:`scipy.fftpack` and numpy's real FFT on a single thread.
+    """
+    name = 'scipy'
+
+    def __init__(self, workers=-1):
+        try:
+            import scipy.fft as scipy_fft
+        except ImportError:
+            scipy_fft = None
+        if scipy_fft is None or not hasattr(scipy_fft, 'rfft'):
+            # scipy.fft was a function before scipy 1.4
+            import scipy.fftpack
+            self._fftpack = scipy.fftpack
+            self._fft = None
+            self.workers = 1
+        else:
+            self._fftpack = None
+            self._fft = scipy_fft
+            self.workers = workers
+
+    def fft(self, x, axis=-1):
+        if self._fft is None:
+            return self._fftpack.fft(x, axis=axis)
+        return self._fft.fft(x, axis=axis, workers=self.workers)
+
+    def ifft(self, x, axis=-1):
+        if self._fft is None:
+            return self._fftpack.ifft(x, axis=axis)
+        return self._fft.ifft(x, axis=axis, workers=self.workers)
+
+    def rfft(self, x, axis=-1):
+        if self._fft is None:
+            # fftpack packs real FFT results differently
+            return np.fft.rfft(x, axis=axis)
+        return self._fft.rfft(x, axis=axis, workers=self.workers)
+
+
+class FFTWBackend(object):
+    """
+    Transforms using pyFFTW on *workers* threads, keeping the plan of
+    each recently used transform size
+    """
+    name = 'fftw'
+
+    def __init__(self, workers=-1):
+        import pyfftw.interfaces.cache
+        import pyfftw.interfaces.numpy_fft
+        pyfftw.interfaces.cache.enable()
+        self._fft = pyfftw.interfaces.numpy_fft
+        if workers < 1:
+            import multiprocessing
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+
+    def fft(self, x, axis=-1):
+        return self._fft.fft(x, axis=axis, threads=self.workers)
+
+    def ifft(self, x, axis=-1):
+        return self._fft.ifft(x, axis=axis, threads=self.workers)
+
+    def rfft(self, x, axis=-1):
+        return self._fft.rfft(x, axis=axis, threads=self.workers)
+
+
+BACKENDS = {
+    'numpy': NumpyBackend,
+    'scipy': ScipyBackend,
+    'fftw': FFTWBackend,
+    }
+
+_backend = NumpyBackend()
+
+
+def set_backend(name='numpy', workers=-1):
+    """
+    Select the FFT implementation used from now on.
+
+    :param str name: 'numpy', 'scipy' or 'fftw'
+    :param int workers: number of threads for the 'scipy' and 'fftw'
+                        backends, -1 for all cores
+    :returns: the backend object
+    :raises ValueError: for an unknown backend
+    :raises ImportError: if the backend's package isn't installed
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError("unknown FFT backend %r" % (name,))
+    if name == 'numpy':
+        _backend = NumpyBackend()
+    else:
+        _backend = BACKENDS[name](workers)
+    return _backend
+
+
+def get_backend():
+    """
+    :returns: the backend object in use
+    """
+    return _backend
+
+
+def fft(x, axis=-1):
+    """
+    Complex FFT of *x* with the selected backend
+    """
+    return _backend.fft(x, axis)
+
+
+def ifft(x, axis=-1):
+    """
+    Inverse complex FFT of *x* with the selected backend
+    """
+    return _backend.ifft(x, axis)
+
+
+def rfft(x, axis=-1):
+    """
+    FFT of real *x* with the selected backend
+    """
+    return _backend.rfft(x, axis)
@@ -0,0 +1,213 @@
+"""
+Lightweight timing and counter instrumentation for the pyrf pipeline.
+
+The shared :data:`metrics` registry is disabled by default and every
+instrumented call site checks :attr:`MetricsRegistry.enabled` before
+doing any work, so the overhead when disabled is a single attribute
+lookup.  Enable it to see whether time goes to the network, the VRT
+parser or the DSP::
+
+    from pyrf.metrics import metrics
+    metrics.enabled = True
+    ...
+    print metrics.as_dict()
+
+Timers use :func:`time.monotonic`.  Python 2 has no monotonic clock,
+so there they fall back to :func:`time.time`, and a timer running
+while the system clock is adjusted records a wrong, possibly negative,
+duration.
+
+Instrumented stages:
+
+========================== ========= =========================================
+name                       kind      measures
+========================== ========= =========================================
+socket.read                timer     blocking connector VRT socket reads
+socket.bytes               counter   bytes read from the VRT socket
+reader.dropped             counter   data packets dropped by a full VRT reader
+vrt.parse                  timer     building packet objects from raw data
+vrt.packets                counter   VRT packets parsed
+vrt.bytes                  counter   VRT bytes parsed
+vrt.sample_loss            counter   data packets with the sample loss flag
+vrt.over_range             counter   data packets with the over range flag
+vrt.lost_packets           counter   packets missing from a tracked sequence
+capture.lost_packets       counter   block packets missing from the sequence
+capture.mismatched_packets counter   block packets of the wrong size or stream
+stream.samples             counter   stream samples stored in the ring buffer
+stream.lost_packets        counter   stream packets missing from the sequence
+stream.overruns            counter   stream packets dropped with the ring full
+scpi.query                 timer     SCPI query round trips
+scpi.commands              counter   SCPI commands sent without a response
+dsp.fft                    timer     :func:`pyrf.numpy_util.compute_fft`
+sweep.flattening           timer     spectral flattening in a sweep
+sweep.copy                 timer     copying spectra into the sweep result
+sweep.trace                timer     adding a sweep to its trace accumulator
+sweep.emit                 timer     emitting the sweep result
+sweep.archive              timer     appending a sweep to its archive file
+sweep.completed            counter   sweeps completed
+sweep.dropped              counter   sweeps abandoned before being completed
+========================== ========= =========================================
+"""
+
+import threading
+import time
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # python 2 has no monotonic clock in the standard library
+    monotonic = time.time
+
+
+class _Timer(object):
+    __slots__ = ('_registry', '_name', '_start')
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __enter__(self):
+        self._start = monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._registry.add_time(self._name, monotonic() - self._start)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry(object):
+    """
+    A thread-safe collection of named counters and timers.
+
+    :param bool enabled: start collecting immediately
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+
+    def count(self, name, value=1):
+        """
+        Add *value* to counter *name*, if enabled
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        """
+        Record one *seconds* long measurement for timer *name*, if enabled
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds, seconds]
+                return
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds < timer[2]:
+                timer[2] = seconds
+            if seconds > timer[3]:
+                timer[3] = seconds
+
+    def timer(self, name):
+        """
+        Return a context manager that records the time spent in its
+        block for timer *name*, or a no-op context manager if disabled
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def reset(self):
+        """
+        Clear all counters and timers
+        """
+        with self._lock:
+            self._counters = {}
+            self._timers = {}
+
+    def as_dict(self):
+        """
+        :returns: a dict with 'counters' mapping names to values and
+                  'timers' mapping names to dicts of 'count', and 'total',
+                  'mean', 'min' and 'max' in seconds
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            timers = dict((name, list(t)) for name, t in self._timers.items())
+        return {
+            'counters': counters,
+            'timers': dict((name, {
+                'count': count,
+                'total': total,
+                'mean': total / count,
+                'min': tmin,
+                'max': tmax,
+                }) for name, (count, total, tmin, tmax) in timers.items()),
+            }
+
+
+class MetricsExporter(object):
+    """
+    Periodically pass a snapshot of a registry to a callback from a
+    background thread, e.g. to log it or send it to a monitoring system.
+
+    :param callback: function called with :meth:`MetricsRegistry.as_dict`
+    :param float interval: seconds between exports
+    :param registry: registry to export, default :data:`metrics`
+    :param bool reset: reset the registry after each export so that each
+                       snapshot covers a single interval
+    """
+    def __init__(self, callback, interval=10.0, registry=None, reset=False):
+        self.callback = callback
+        self.interval = interval
+        self.registry = metrics if registry is None else registry
+        self.reset = reset
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the exporter after one last export
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def export(self):
+        snapshot = self.registry.as_dict()
+        if self.reset:
+            self.registry.reset()
+        self.callback(snapshot)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+
+#: the registry used by pyrf's instrumented stages
+metrics = MetricsRegistry()
@@ -1,9 +1,21 @@
 import numpy as np
 import random
+import threading
+from collections import OrderedDict, namedtuple
 pi = np.pi
 
 from pyrf.vrt import (I_ONLY, VRT_IFDATA_I14Q14, VRT_IFDATA_I14,
                       VRT_IFDATA_I24, VRT_IFDATA_PSD8)
+from pyrf.metrics import metrics, monotonic
+from pyrf import fft_backend
+
+# dB per count of the signed 8-bit bins of PSD8 data packets, which hold
+# the power of each bin relative to full scale.  Bins are in the same
+# order as the compute_fft output of the packet's samples, except that
+# I-only spectra leave out the Nyquist bin so the payload stays
+# word-aligned.  The PSD8 format is experimental: this layout is the one
+# sent by pyrf.sim.SimulatedRTSA and hasn't been confirmed on hardware.
+PSD8_DB_PER_COUNT = 1.0
 
 def calculate_channel_power(power_spectrum):
     """
@@ -24,36 +36,134 @@ def calculate_channel_power(power_spectrum):
 
     return channel_power
 
+#: the result of :func:`channel_power_table`: *power* is a numpy array
+#: of the power of each channel in dBm and *acpr* a numpy array with a
+#: row for each channel and a column for each adjacent channel offset,
+#: holding the power of that adjacent channel relative to the channel,
+#: in dBc, or *None* when no offsets were given
+ChannelPowers = namedtuple('ChannelPowers', 'power acpr')
+
+def channel_power_table(pow_data, fstart, fstop, centers, bandwidth,
+        adjacent=None):
+    """
+    Return the channel power of many channels of one spectrum, such as
+    a stitched sweep, and optionally their adjacent channel power ratios.
+
+    The spectrum is converted to linear power once and each channel's
+    power is the difference of two cumulative sums, so the cost per
+    channel doesn't depend on its bandwidth.  A channel covers the bins
+    from ``center - bandwidth / 2`` up to, but not including,
+    ``center + bandwidth / 2``, and its power is the same as
+    :func:`calculate_channel_power` of those bins.  Channels with no
+    bins in the spectrum have a power of -inf.
+
+    A channel raster is ``first_center + spacing * np.arange(count)``.
+
+    :param pow_data: spectral data in dBm
+    :param float fstart: frequency of the first bin, in Hz
+    :param float fstop: frequency of the last bin, in Hz
+    :param centers: center frequency of each channel, in Hz
+    :param bandwidth: bandwidth of all the channels, or of each channel,
+                      in Hz
+    :param adjacent: offsets in Hz of the adjacent channels measured for
+                     each channel, e.g. ``[-5e6, 5e6]``; adjacent
+                     channels have the bandwidth of their channel
+    :returns: a :class:`ChannelPowers` tuple
+    """
+    pow_data = np.asarray(pow_data, dtype=float)
+    points = len(pow_data)
+    centers = np.atleast_1d(np.asarray(centers, dtype=float))
+    half_bw = np.broadcast_to(np.asarray(bandwidth, dtype=float) / 2,
+        centers.shape)
+
+    cumulative = np.zeros(points + 1)
+    np.cumsum(np.power(10, pow_data / 10), out=cumulative[1:])
+    bin_width = float(fstop - fstart) / (points - 1) if points > 1 else 1.0
+
+    def powers(channel_centers):
+        # index of the first bin at or above each edge
+        edges = np.ceil((np.stack((channel_centers - half_bw,
+            channel_centers + half_bw)) - fstart) / bin_width - 1e-9)
+        low, high = np.clip(edges, 0, points).astype(int)
+        with np.errstate(divide='ignore'):
+            return 10 * np.log10(cumulative[high] - cumulative[low])
+
+    power = powers(centers)
+    if adjacent is None:
+        return ChannelPowers(power, None)
+
+    acpr = np.empty((len(centers), len(adjacent)))
+    for column, offset in enumerate(adjacent):
+        with np.errstate(invalid='ignore'):
+            acpr[:, column] = powers(centers + offset) - power
+    return ChannelPowers(power, acpr)
+
 def _decode_data_pkts(data_pkt):
+    # views of the packet's cached samples, see DataPacket.samples
     stream_id = data_pkt.stream_id
     spec_inv = data_pkt.spec_inv
     i_data = None
     q_data = None
 
     if stream_id == VRT_IFDATA_I14Q14:
-        i_data = np.array(data_pkt.data.numpy_array()[:, 0], dtype=float) / 2 ** 13
-        q_data = np.array(data_pkt.data.numpy_array()[:, 1], dtype=float) / 2 ** 13
+        samples = data_pkt.samples()
+        i_data = samples.real
+        q_data = samples.imag
 
-    if stream_id == VRT_IFDATA_I14:
-        i_data = (np.array(data_pkt.data.numpy_array(), dtype=float) / 2 ** 13)
-
-    if stream_id == VRT_IFDATA_I24:
-        i_data = np.array(data_pkt.data.numpy_array(), dtype=float) / 2 ** 23
+    if stream_id in (VRT_IFDATA_I14, VRT_IFDATA_I24):
+        i_data = data_pkt.samples()
 
     return i_data, q_data, stream_id, spec_inv
 
+def _decode_psd8(data_pkt):
+    return data_pkt.data.numpy_array() * PSD8_DB_PER_COUNT
+
+def psd8_to_dbm(dut, data_pkt, context, apply_spec_inv=True,
+        apply_reference=True, ref=None):
+    """
+    Return an array of dBm values from a PSD8 data packet, whose spectrum
+    was computed by the device, without running an FFT.  The result
+    matches :func:`compute_fft` of the samples the spectrum was computed
+    from, to within the 8-bit resolution.
+
+    Experimental: the PSD8 format is only sent by
+    :class:`pyrf.sim.SimulatedRTSA`, see
+    :meth:`pyrf.devices.thinkrf.WSA.trace_format`.
+
+    :param dut: WSA device
+    :type dut: pyrf.devices.thinkrf.WSA
+    :param data_pkt: packet containing PSD8 bins
+    :type data_pkt: pyrf.vrt.DataPacket
+    :param context: context values, such as 'reflevel'
+    :type context: dict
+    :param bool apply_spec_inv: apply spectral inversion to the FFT bin or not
+    :param bool apply_reference: apply reference level correction or not
+    :param float ref: the reference level to use if *context* has no
+                      'reflevel'
+
+    :returns: numpy array of spectral data in dBm, as floats
+    """
+    power_spectrum = _decode_psd8(data_pkt)
+    if apply_spec_inv and data_pkt.spec_inv:
+        power_spectrum = power_spectrum[::-1]
+    if apply_reference:
+        reference_level = context.get('reflevel', ref)
+        power_spectrum += reference_level + dut.properties.REFLEVEL_ERROR
+    return power_spectrum
+
 def _compute_fft_i_only(i_data, convert_to_dbm, apply_window):
     if apply_window:
         i_data = i_data * np.hanning(len(i_data))
 
-    power_spectrum = np.abs(np.fft.rfft(i_data))/len(i_data)
+    power_spectrum = np.abs(fft_backend.rfft(i_data))/len(i_data)
     if convert_to_dbm:
         power_spectrum = 20 * np.log10(power_spectrum)
     return power_spectrum
 
 def compute_fft(dut, data_pkt, context, correct_phase=True, iq_correction_wideband=True,
         hide_differential_dc_offset=True, convert_to_dbm=True, apply_window=True,
-        apply_spec_inv=True, apply_reference=True, ref=None, decimation=1):
+        apply_spec_inv=True, apply_reference=True, ref=None, decimation=1,
+        iq_correction=None):
     """
     Return an array of dBm values by computing the FFT of
     the passed data and reference level.
@@ -75,9 +185,14 @@ def compute_fft(dut, data_pkt, context, correct_phase=True, iq_correction_wideba
     :param bool apply_reference: apply reference level correction or not
     :param float ref: a reference value to apply to the noise level
     :param int decimation: the decimation value (1, 4 - 1024)
+    :param iq_correction: the :class:`IQCorrection` for the tuning the
+                          packet was captured at, from an
+                          :class:`IQCorrectionState`, to reuse phase
+                          correction estimates between packets
 
     :returns: numpy array of spectral data in dBm, as floats
     """
+    start = monotonic() if metrics.enabled else None
 
     i_data, q_data, stream_id, spec_inv = _decode_data_pkts(data_pkt)
     if not 'bandwidth' in context:
@@ -95,7 +210,8 @@ def compute_fft(dut, data_pkt, context, correct_phase=True, iq_correction_wideba
         else:
             iq_swap = 0
         power_spectrum = _compute_fft(i_data, q_data, correct_phase, iq_correction_wideband,
-            hide_differential_dc_offset, convert_to_dbm, apply_window, decimation, iq_swap, context['bandwidth'])
+            hide_differential_dc_offset, convert_to_dbm, apply_window, decimation, iq_swap, context['bandwidth'],
+            iq_correction)
 
     if stream_id == VRT_IFDATA_I14:
         power_spectrum = _compute_fft_i_only(i_data, convert_to_dbm, apply_window)
@@ -105,19 +221,23 @@ def compute_fft(dut, data_pkt, context, correct_phase=True, iq_correction_wideba
         power_spectrum = _compute_fft_i_only(i_data, convert_to_dbm, apply_window)
 
     if stream_id == VRT_IFDATA_PSD8:
-        # TODO: handle convert_to_dbm option
-        power_spectrum = np.array(data, dtype=float)
+        power_spectrum = _decode_psd8(data_pkt)
+        if not convert_to_dbm:
+            power_spectrum = 10 ** (power_spectrum / 20)
     if apply_spec_inv:
         if spec_inv:  # handle inverted spectrum
             power_spectrum = np.flipud(power_spectrum)
 
     if apply_reference:
         noiselevel_offset = reference_level + prop.REFLEVEL_ERROR
-        return power_spectrum + noiselevel_offset
+        power_spectrum = power_spectrum + noiselevel_offset
+    if start is not None:
+        metrics.add_time('dsp.fft', monotonic() - start)
     return power_spectrum
 
 def _compute_fft(i_data, q_data, correct_phase, iq_correction_wideband,
-        hide_differential_dc_offset, convert_to_dbm, apply_window, decimation, iqswapedbit, Rx_Bw):
+        hide_differential_dc_offset, convert_to_dbm, apply_window, decimation, iqswapedbit, Rx_Bw,
+        iq_correction=None):
 
     Nsamp = len(i_data)
     rbw = Rx_Bw/Nsamp
@@ -134,7 +254,19 @@ def _compute_fft(i_data, q_data, correct_phase, iq_correction_wideband,
         phi2_deg = 52   # phase error after which the T.D algorithm is skipped to avoid noise floor jumping
         # Measuring phase error
         phi_rad, Phi_deg = measurePhaseError(i_data, q_data)
-        if decimation == 1: # F.D + T.D corrections
+        use_estimates = False
+        if iq_correction is not None:
+            gain = np.sqrt(np.var(i_data) / np.var(q_data))
+            if abs(Phi_deg) >= phi2_deg or iq_correction.due(phi_rad):
+                iq_correction.restart(phi_rad, gain)
+            else:
+                iq_correction.update(phi_rad, gain)
+                use_estimates = True
+        if use_estimates:
+            # T.D correction only, from the smoothed estimates
+            i_data, q_data = _calibrate_i_q_tarek1(i_data, q_data,
+                iq_correction.phase, iq_correction.gain)
+        elif decimation == 1: # F.D + T.D corrections
             if abs(Phi_deg) < phi2_deg:
                 # T.D correction
                 i_cal, q_cal = _calibrate_i_q_tarek1(i_data, q_data, phi_rad)
@@ -155,7 +287,7 @@ def _compute_fft(i_data, q_data, correct_phase, iq_correction_wideband,
     if apply_window:
         iq = iq * np.hanning(len(i_data))
 
-    power_spectrum = np.abs(np.fft.fftshift(np.fft.fft(iq)))/len(i_data)
+    power_spectrum = np.abs(np.fft.fftshift(fft_backend.fft(iq)))/len(i_data)
 
     if convert_to_dbm:
         power_spectrum = 20 * np.log10(power_spectrum)
@@ -167,11 +299,13 @@ def _compute_fft(i_data, q_data, correct_phase, iq_correction_wideband,
 
     return power_spectrum
 
-def _calibrate_i_q_tarek1(i_data, q_data, phi_rad):
+def _calibrate_i_q_tarek1(i_data, q_data, phi_rad, gain=None):
 
     Nsamp = len(i_data)
     # Correcting for gain imbalance
-    q_data = q_data * np.sqrt(np.var(i_data)/np.var(q_data))
+    if gain is None:
+        gain = np.sqrt(np.var(i_data)/np.var(q_data))
+    q_data = q_data * gain
     # Correcting for phase error
     cFactor = (1 / np.cos(phi_rad)) - 1
     q_cal = (q_data - i_data * np.sin(phi_rad)) * cFactor
@@ -199,7 +333,7 @@ def imageAttenuation(i_in, q_in, Phi_deg, iqswapedbit, iq_correction_wideband, R
 
     iq = i_in + 1j * q_in
     iq = iq * np.hanning(len(i_in))
-    ampl_spectrum = np.fft.fftshift(np.fft.fft(iq))/Nsamp
+    ampl_spectrum = np.fft.fftshift(fft_backend.fft(iq))/Nsamp
 
     ampl_spectrum_mag = np.abs(ampl_spectrum)
 
@@ -274,7 +408,7 @@ def imageAttenuation(i_in, q_in, Phi_deg, iqswapedbit, iq_correction_wideband, R
 
                     Natt = np.random.normal(0, N, len(att_ind)) + 1j * np.random.normal(0, N, len(att_ind))
                     ampl_spectrum[att_ind] = (ampl_spectrum[att_ind]/np.abs(ampl_spectrum[att_ind])) * Natt
-                    iq = np.fft.ifft(np.fft.fftshift(ampl_spectrum*Nsamp))
+                    iq = fft_backend.ifft(np.fft.fftshift(ampl_spectrum*Nsamp))
                     i_data = np.real(iq); q_data = np.imag(iq)
                 else:
                     i_data = i_in; q_data = q_in
@@ -289,45 +423,274 @@ def imageAttenuation(i_in, q_in, Phi_deg, iqswapedbit, iq_correction_wideband, R
 
     return i_data, q_data
 
-def calculate_occupied_bw(pow_data, span, occupied_perc):
+def calculate_occupied_bw(pow_data, span, occupied_perc, center='middle'):
     """
     Return the occupied bandwidth of a given spectrum, in Hz
 
-    :param list pow_data: spectral data to be analyzed
+    The bandwidth is that of the narrowest window of bins around the
+    center bin that holds *occupied_perc* percent of the total power.
+    A window of *k* bins each side covers the *2k* bins from
+    ``center - k`` to ``center + k - 1``, and is cut short at the edges
+    of the spectrum.
+
+    :param list pow_data: spectral data to be analyzed, or a 2D array
+                          with one spectrum per row to compute the
+                          occupied bandwidth of many channels at once
     :param int span: span of the given spectrum, in Hz
     :param float occupied_perc: Percentage of the power to be measured
+    :param str center: 'middle' to center the window on the middle bin,
+                       or 'centroid' to center it on the bin nearest the
+                       power centroid of each spectrum
 
-    :returns: float value of the occupied bandwidth (in Hz)
+    :returns: float value of the occupied bandwidth (in Hz), or a numpy
+              array of them for a 2D *pow_data*
     """
+    pow_data = np.asarray(pow_data, dtype=float)
+    batch = pow_data.ndim == 2
+    spectra = pow_data if batch else pow_data[np.newaxis]
+    count, total_points = spectra.shape
 
     # 100% of the occupied bandwidth is the full span
     if occupied_perc >= 100.0:
-        return span
-
-    # calculate center bin
-    pow_list = list(pow_data)
-    total_points = len(pow_list)
-    mid_point = int(total_points / 2)
+        return np.full(count, float(span)) if batch else span
 
-    # calculate total linear power & the % equivalent
-    total_linear_power = np.sum(np.power(10, np.divide(pow_list, 10)))
+    linear = np.power(10, spectra / 10)
+    cumulative = np.zeros((count, total_points + 1))
+    np.cumsum(linear, axis=1, out=cumulative[:, 1:])
+    total_linear_power = cumulative[:, -1]
     perc_power = (occupied_perc / 100.0) * total_linear_power
 
-    # calculate channel power at center point, while incrementing by span_step
-    # of 1 RBW increment to increase span of calculation
-    span_step = 1 # initially 1 rbw span
-    section_power = np.sum(np.power(10, np.divide(pow_list[mid_point - span_step : mid_point + span_step], 10)))
-    while True:
-        if section_power >= perc_power:
-            break
-        span_step = span_step + 1
-        section_power = section_power + np.power(10, np.divide(pow_list[mid_point - span_step], 10))
-        section_power = section_power + np.power(10, np.divide(pow_list[mid_point + span_step], 10))
+    if center == 'middle':
+        mid_points = np.full(count, total_points // 2, dtype=int)
+    elif center == 'centroid':
+        centroid = linear.dot(np.arange(total_points)) / total_linear_power
+        mid_points = np.round(centroid).astype(int)
+    else:
+        raise ValueError("unknown occupied bandwidth center %r" % (center,))
+
+    # power of every window size at once, starting from 1 bin each side
+    span_steps = np.arange(1, total_points + 1)
+    lows = np.clip(mid_points[:, np.newaxis] - span_steps, 0, total_points)
+    highs = np.clip(mid_points[:, np.newaxis] + span_steps, 0, total_points)
+    rows = np.arange(count)[:, np.newaxis]
+    section_power = cumulative[rows, highs] - cumulative[rows, lows]
+
+    # windows only grow, so the first one holding enough power is found
+    # by counting the ones that don't
+    if batch:
+        index = np.sum(section_power < perc_power[:, np.newaxis], axis=1)
+    else:
+        index = np.searchsorted(section_power[0], perc_power, side='left')
+    index = np.minimum(index, total_points - 1)
+    window_bins = highs[rows[:, 0], index] - lows[rows[:, 0], index]
+
+    # calculate occupied bandwidth from the bins in the window
+    occupied_bw = window_bins * (float(span) / total_points)
 
-    # calculate occupied bandwidth by taking span_step on each side * rbw
-    occupied_bw = float((2 * span_step) * (span / total_points))
+    return occupied_bw if batch else float(occupied_bw[0])
 
-    return occupied_bw
+def _peak_bases(values, gaps):
+    """
+    Return the lowest bin between each local maximum and the nearest
+    higher one before it, or the start of the spectrum, given the
+    lowest bin *gaps* between each maximum and the one before it
+    """
+    bases = np.empty(len(values))
+    # maxima not yet passed by a higher one, with the lowest bin
+    # between each and the entry below it
+    stack = []
+    for i, value in enumerate(values):
+        low = gaps[i]
+        while stack and stack[-1][0] <= value:
+            low = min(low, stack.pop()[1])
+        bases[i] = low
+        stack.append((value, low))
+    return bases
+
+def find_peaks(pow_data, fstart, fstop, n=1, threshold=None, excursion=0.0,
+        min_separation=0.0, interpolate=False):
+    """
+    Return the highest peaks of a spectrum, from a single capture or a
+    stitched sweep.
+
+    Peaks are local maxima, so the neighbouring bins of a signal are not
+    returned as more peaks.  A flat topped peak is reported at its first
+    bin.
+
+    :param pow_data: spectral data in dBm
+    :param float fstart: frequency of the first bin, in Hz
+    :param float fstop: frequency of the last bin, in Hz
+    :param int n: maximum number of peaks to return, or *None* for all
+    :param float threshold: ignore peaks below this level, in dBm
+    :param float excursion: minimum prominence of a peak, in dB: its
+                            height above the higher of the lowest bins on
+                            each side between it and the nearest higher
+                            bin, or the edge of the spectrum, as
+                            measured by spectrum analyzers and
+                            ``scipy.signal.peak_prominences``
+    :param float min_separation: minimum distance between peaks, in Hz;
+                                 only the highest of peaks closer than
+                                 this is returned
+    :param bool interpolate: refine the frequency and power of each peak
+                             by fitting a parabola through it and its
+                             neighbouring bins
+
+    :returns: [(peak_freq1, peak_power1), (peak_freq2, peak_power2), ...]
+              sorted by decreasing power
+    """
+    pow_data = np.asarray(pow_data, dtype=float)
+    points = len(pow_data)
+    if not points:
+        return []
+    bin_width = float(fstop - fstart) / (points - 1) if points > 1 else 0.0
+
+    # local maxima, including the first and last bins
+    padded = np.concatenate(([-np.inf], pow_data, [-np.inf]))
+    peaks = np.flatnonzero((padded[1:-1] > padded[:-2])
+        & (padded[1:-1] >= padded[2:]))
+
+    if excursion > 0 and len(peaks):
+        # lowest bins between each pair of neighbouring maxima
+        valleys = np.minimum.reduceat(pow_data, peaks)[:-1]
+        lead = pow_data[:peaks[0]].min() if peaks[0] else np.inf
+        trail = (pow_data[peaks[-1] + 1:].min()
+            if peaks[-1] < points - 1 else np.inf)
+        values = pow_data[peaks]
+        left = _peak_bases(values, np.concatenate(([lead], valleys)))
+        right = _peak_bases(values[::-1],
+            np.concatenate(([trail], valleys[::-1])))[::-1]
+        # peaks at the edges only need to rise on one side
+        if peaks[0] == 0:
+            left[0] = -np.inf
+        if peaks[-1] == points - 1:
+            right[-1] = -np.inf
+        heights = values - np.maximum(left, right)
+        peaks = peaks[heights >= excursion]
+
+    if threshold is not None:
+        peaks = peaks[pow_data[peaks] >= threshold]
+
+    separation = int(np.ceil(min_separation / bin_width)) if bin_width else 0
+    if n is not None and n < len(peaks) and separation <= 1:
+        # only sort the n highest
+        peaks = peaks[np.argpartition(-pow_data[peaks], n - 1)[:n]]
+    peaks = peaks[np.argsort(-pow_data[peaks], kind='mergesort')]
+
+    if separation > 1:
+        suppressed = np.zeros(points, dtype=bool)
+        kept = []
+        for peak in peaks:
+            if suppressed[peak]:
+                continue
+            kept.append(peak)
+            if len(kept) == n:
+                break
+            suppressed[max(0, peak - separation + 1):peak + separation] = True
+        peaks = np.array(kept, dtype=int)
+
+    freqs = fstart + peaks * bin_width
+    powers = pow_data[peaks]
+    if interpolate and len(peaks):
+        inner = (peaks > 0) & (peaks < points - 1)
+        index = peaks[inner]
+        before = pow_data[index - 1]
+        peak = pow_data[index]
+        after = pow_data[index + 1]
+        curve = before - 2 * peak + after
+        offset = np.zeros(len(index))
+        curved = curve != 0
+        offset[curved] = 0.5 * (before - after)[curved] / curve[curved]
+        freqs[inner] += offset * bin_width
+        powers[inner] = peak - 0.25 * (before - after) * offset
+
+    return list(zip(freqs.tolist(), powers.tolist()))
+
+def _partition_floor(segments, exclude, percentile):
+    # noise floor of each row of a 2D array of spectrum segments
+    bins = segments.shape[1]
+    if percentile is not None:
+        rank = int(round(percentile / 100.0 * (bins - 1)))
+        return np.partition(segments, rank, axis=1)[:, rank]
+    rank = min(int(bins * exclude), bins - 1)
+    return np.partition(segments, rank, axis=1)[:, rank:].mean(axis=1)
+
+def estimate_noisefloor(pow_data, exclude=0.2, percentile=None):
+    """
+    Return a power level that represents the noise floor of a spectrum.
+
+    By default this is the mean of the bins left after dropping the
+    lowest *exclude* fraction, the same as
+    ``np.mean(sorted(pow_data)[int(len(pow_data) * exclude):])`` but
+    found with a partial sort, so it stays fast for stitched sweeps of
+    millions of bins.
+
+    :param pow_data: spectral data in dBm
+    :param float exclude: fraction of the lowest bins left out of the mean
+    :param float percentile: return this percentile of the bins (0-100,
+                             nearest rank) instead of the trimmed mean
+    :returns: the noise floor in dBm
+    """
+    pow_data = np.asarray(pow_data, dtype=float)
+    if not len(pow_data):
+        raise ValueError("empty spectrum")
+    return float(_partition_floor(pow_data[np.newaxis], exclude,
+        percentile)[0])
+
+def noisefloor_profile(pow_data, fstart, fstop, segment_bins=None,
+        boundaries=None, exclude=0.2, percentile=None):
+    """
+    Return the noise floor of each segment of a spectrum, for detectors
+    that need a frequency dependent floor across a wide sweep.
+
+    Segments are either every *segment_bins* bins, the last one holding
+    what is left over, or start at each index in *boundaries*, such as
+    the sweep steps returned by
+    :meth:`pyrf.sweep_device.SweepDevice.step_boundaries`.  The floor of
+    each segment is computed as in :func:`estimate_noisefloor`.
+
+    :param pow_data: spectral data in dBm
+    :param float fstart: frequency of the first bin, in Hz
+    :param float fstop: frequency of the last bin, in Hz
+    :param int segment_bins: number of bins in each segment
+    :param boundaries: increasing bin indexes where segments start; bins
+                       before the first index belong to the first segment
+    :param float exclude: fraction of the lowest bins left out of each
+                          segment's mean
+    :param float percentile: use this percentile of each segment instead
+                             of the trimmed mean
+    :returns: (freqs, floors) numpy arrays with the center frequency and
+              the noise floor in dBm of each segment
+    """
+    pow_data = np.asarray(pow_data, dtype=float)
+    points = len(pow_data)
+    if (segment_bins is None) == (boundaries is None):
+        raise ValueError("pass one of segment_bins or boundaries")
+    if segment_bins is not None:
+        if segment_bins < 1:
+            raise ValueError("segment_bins must be at least 1")
+        starts = np.arange(0, points, segment_bins)
+    else:
+        starts = np.unique(np.clip(np.asarray(boundaries, dtype=int),
+            0, points))
+        starts = starts[starts < points]
+        if not len(starts) or starts[0]:
+            starts = np.concatenate(([0], starts))
+    if not points:
+        return np.zeros(0), np.zeros(0)
+    stops = np.append(starts[1:], points)
+    lengths = stops - starts
+
+    floors = np.empty(len(starts))
+    # segments of the same length are partitioned together
+    for length in np.unique(lengths):
+        which = np.flatnonzero(lengths == length)
+        index = starts[which][:, np.newaxis] + np.arange(length)
+        floors[which] = _partition_floor(pow_data[index], exclude,
+            percentile)
+
+    bin_width = float(fstop - fstart) / (points - 1) if points > 1 else 0.0
+    freqs = fstart + (starts + stops - 1) * bin_width / 2
+    return freqs, floors
 
 def calibrate_time_domain(power_spectrum, data_pkt):
     """
@@ -339,17 +702,14 @@ def calibrate_time_domain(power_spectrum, data_pkt):
 
     :returns: a list containing the calibrated time domain data
     """
-    i_data, q_data, stream_id, spec_inv = _decode_data_pkts(data_pkt)
+    samples = data_pkt.samples()
 
     # Time domain data calibration
-    if stream_id in (VRT_IFDATA_I14, VRT_IFDATA_I24):
-            td_data = i_data -np.mean(i_data)
-            complex_coefficient = 1
-
-    if stream_id == VRT_IFDATA_I14Q14:
-        td_data = i_data + 1j * q_data
-        td_data = td_data - np.mean(td_data)
+    td_data = samples - np.mean(samples)
+    if data_pkt.stream_id == VRT_IFDATA_I14Q14:
         complex_coefficient = 2
+    else:
+        complex_coefficient = 1
 
     P_FD_Ln = 10**(power_spectrum/10)
     P_FD_av = np.mean(P_FD_Ln)
@@ -357,3 +717,427 @@ def calibrate_time_domain(power_spectrum, data_pkt):
     v_volt = td_data * np.sqrt(1e-3) * np.sqrt(P_FD_av/np.var(td_data)) * 50 * np.sqrt(complex_coefficient*len(td_data)/128.0)
 
     return v_volt
+
+# number of frequency axes kept by frequency_axis
+FREQUENCY_AXIS_CACHE_SIZE = 16
+_frequency_axes = OrderedDict()
+_frequency_axes_lock = threading.Lock()
+
+def frequency_axis(fstart, fstop, points):
+    """
+    Return the frequency of each bin of a spectrum of *points* bins from
+    *fstart* to *fstop*, as computed by ``np.linspace(fstart, fstop, points)``.
+
+    Recently used axes are cached and shared, so the returned array is
+    read-only.
+
+    :param float fstart: frequency of the first bin, in Hz
+    :param float fstop: frequency of the last bin, in Hz
+    :param int points: number of bins
+    :returns: a read-only numpy array of frequencies
+    """
+    key = (fstart, fstop, points)
+    with _frequency_axes_lock:
+        axis = _frequency_axes.pop(key, None)
+        if axis is None:
+            axis = np.linspace(fstart, fstop, points)
+            axis.flags.writeable = False
+        _frequency_axes[key] = axis
+        while len(_frequency_axes) > FREQUENCY_AXIS_CACHE_SIZE:
+            _frequency_axes.popitem(last=False)
+    return axis
+
+class IQCorrection(object):
+    """
+    Smoothed IQ phase and gain imbalance estimates for one tuning of a
+    device, created by :meth:`IQCorrectionState.lookup`.
+
+    :func:`compute_fft` runs the full time and frequency domain
+    correction when the estimates are first made, every *refresh*
+    packets after that and whenever a packet's measured phase error
+    drifts from the estimate.  Other packets only get the time domain
+    correction using the estimates.
+
+    .. attribute:: phase
+
+       phase imbalance estimate, in radians, or *None* before the first
+       packet
+
+    .. attribute:: gain
+
+       I to Q amplitude ratio estimate
+
+    .. attribute:: packets
+
+       number of packets corrected since the last full correction
+
+    .. attribute:: full_corrections
+
+       number of full corrections run
+    """
+    def __init__(self, alpha, refresh, drift):
+        self.alpha = alpha
+        self.refresh = refresh
+        self.drift = drift
+        self.phase = None
+        self.gain = None
+        self.packets = 0
+        self.full_corrections = 0
+
+    def due(self, phase):
+        """
+        :param float phase: the phase error measured for a packet
+        :returns: True if the packet needs the full correction
+        """
+        return (self.phase is None or self.packets >= self.refresh
+            or abs(phase - self.phase) > self.drift)
+
+    def restart(self, phase, gain):
+        """
+        Replace the estimates with the values measured for a packet that
+        gets the full correction
+        """
+        self.phase = phase
+        self.gain = gain
+        self.packets = 0
+        self.full_corrections += 1
+
+    def update(self, phase, gain):
+        """
+        Smooth the values measured for a packet into the estimates
+        """
+        self.phase += self.alpha * (phase - self.phase)
+        self.gain += self.alpha * (gain - self.gain)
+        self.packets += 1
+
+
+class IQCorrectionState(object):
+    """
+    :class:`IQCorrection` estimates kept for recently used tunings, so
+    that repeated IQ captures at the same tuning skip most of the full
+    IQ correction in :func:`compute_fft`::
+
+        state = IQCorrectionState()
+        correction = state.lookup(rffreq, 'ZIF', attenuation, decimation)
+        pow_data = compute_fft(dut, data_pkt, context,
+            iq_correction=correction)
+
+    :param float alpha: weight of each packet's measurements in the
+                        exponentially smoothed estimates
+    :param int refresh: number of packets corrected from the estimates
+                        between full corrections
+    :param float drift_deg: phase error change, in degrees, that
+                            triggers a full correction
+    :param int tunings: number of tunings kept
+    """
+    def __init__(self, alpha=0.2, refresh=16, drift_deg=3.0, tunings=64):
+        self.alpha = alpha
+        self.refresh = refresh
+        self.drift = drift_deg * pi / 180
+        self.tunings = tunings
+        self._corrections = OrderedDict()
+
+    def lookup(self, rffreq, rfe_mode, attenuation=0, decimation=1):
+        """
+        :returns: the :class:`IQCorrection` for a tuning, created if it
+                  isn't kept
+        """
+        key = (rffreq, rfe_mode, attenuation, decimation)
+        correction = self._corrections.pop(key, None)
+        if correction is None:
+            correction = IQCorrection(self.alpha, self.refresh, self.drift)
+        self._corrections[key] = correction
+        while len(self._corrections) > self.tunings:
+            self._corrections.popitem(last=False)
+        return correction
+
+    def clear(self):
+        """
+        Forget the estimates of all tunings
+        """
+        self._corrections.clear()
+
+def _segment_window(segment, iq):
+    window = np.hanning(segment)
+    if iq:
+        # compute_fft windows IQ data twice
+        window = window * window
+    return window
+
+def _segment_view(samples, segment, step):
+    # overlapping segments of samples as a strided view, without copying
+    count = (len(samples) - segment) // step + 1
+    if count < 1:
+        return None
+    stride = samples.strides[0]
+    return np.lib.stride_tricks.as_strided(samples,
+        shape=(count, segment), strides=(stride * step, stride))
+
+def _segment_parts(tail, samples, segment, step):
+    """
+    Overlapping segments of *tail* followed by *samples*, without joining
+    the two: only the segments spanning the boundary are copied, from
+    the tail and the start of *samples*, and the rest are a strided view
+    of *samples*.  *tail* must be shorter than *segment*.
+
+    :returns: (parts, count, tail, skip) where *parts* is a list of 2D
+              arrays of segments, *count* the number of segments, *tail*
+              the samples left for the next segment and *skip* the
+              number of samples to drop before it
+    """
+    parts = []
+    count = 0
+    if len(tail):
+        # segments starting in the tail
+        spanning = -(-len(tail) // step)
+        joined = np.concatenate([tail,
+            samples[:(spanning - 1) * step + segment - len(tail)]])
+        boundary = _segment_view(joined, segment, step)
+        if boundary is not None:
+            parts.append(boundary)
+            count = len(boundary)
+    else:
+        spanning = 0
+
+    next_start = count * step - len(tail)
+    if count == spanning:
+        rest = _segment_view(samples[next_start:], segment, step)
+        if rest is not None:
+            parts.append(rest)
+            count += len(rest)
+            next_start += len(rest) * step
+
+    if next_start < 0:
+        tail = np.concatenate([tail[count * step:], samples])
+    else:
+        tail = samples[next_start:].copy()
+    return parts, count, tail, max(0, next_start - len(samples))
+
+def _segment_power(segments, window, iq):
+    # unscaled power of each bin of each row of segments
+    if iq:
+        segments = segments - segments.mean(axis=1)[:, np.newaxis]
+        spectra = fft_backend.fft(segments * window, axis=1)
+    else:
+        spectra = fft_backend.rfft(segments * window, axis=1)
+    return spectra.real ** 2 + spectra.imag ** 2
+
+def _segment_db(power, iq):
+    # power scaled to full scale converted to dB, in compute_fft's order
+    power_spectrum = 10 * np.log10(power)
+    if iq:
+        power_spectrum = np.fft.fftshift(power_spectrum, axes=-1)
+        # hide the DC offset like compute_fft
+        median_index = power_spectrum.shape[-1] // 2
+        power_spectrum[..., median_index] = (
+            power_spectrum[..., median_index - 1]
+            + power_spectrum[..., median_index + 1]) / 2
+    return power_spectrum
+
+class WelchEstimator(object):
+    """
+    Streaming averaged periodogram (Welch's method) power spectrum.
+
+    Samples are added a packet at a time and cut into overlapping
+    segments, including segments spanning packet boundaries.  Each
+    segment is windowed and transformed as it becomes available and only
+    the running sum of segment powers is kept, so memory use depends on
+    the segment and packet sizes rather than the length of the capture.
+
+    Windows and scaling match :func:`compute_fft`, so a single segment
+    gives the same levels as :func:`compute_fft` without IQ phase
+    correction.
+
+    :param int segment: number of samples in each FFT segment
+    :param float overlap: fraction of each segment shared with the next,
+                          from 0 up to but not including 1
+    """
+    def __init__(self, segment, overlap=0.5):
+        if not 0 <= overlap < 1:
+            raise ValueError("overlap must be in [0, 1)")
+        self.segment = int(segment)
+        self.step = max(1, self.segment - int(self.segment * overlap))
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all samples and accumulated segments
+        """
+        self.segments = 0
+        self._iq = None
+        self._tail = None
+        self._sum = None
+        self._window = None
+
+    def add_packet(self, data_pkt):
+        """
+        Add the samples of a data packet
+
+        :param data_pkt: packet containing I14Q14, I14 or I24 samples
+        :type data_pkt: pyrf.vrt.DataPacket
+        """
+        self.add(data_pkt.samples())
+
+    def add(self, samples):
+        """
+        Add time domain samples, complex for IQ data or real for I-only
+        data.  All samples added until :meth:`reset` must be the same type.
+
+        :param samples: numpy array of samples scaled to full scale
+        """
+        samples = np.asarray(samples)
+        if self._iq is None:
+            self._iq = np.iscomplexobj(samples)
+            self._window = _segment_window(self.segment, self._iq)
+            self._tail = samples[:0]
+
+        parts, _count, self._tail, _skip = _segment_parts(self._tail, samples,
+            self.segment, self.step)
+        for segments in parts:
+            self._accumulate(segments)
+
+    def skip(self):
+        """
+        Discard the samples waiting for the rest of their segment, so no
+        segment spans a gap in the samples added, such as a lost packet
+        """
+        if self._tail is not None:
+            self._tail = self._tail[:0]
+
+    def _accumulate(self, segments):
+        power = _segment_power(segments, self._window, self._iq).sum(axis=0)
+        if self._sum is None:
+            self._sum = power
+        else:
+            self._sum += power
+        self.segments += len(segments)
+
+    def power_spectrum(self):
+        """
+        :returns: numpy array of the average power of each bin in dB
+                  relative to full scale, like :func:`compute_fft` before
+                  its reference level and spectral inversion are
+                  applied, or *None* if no segments are complete
+        """
+        if not self.segments:
+            return None
+        power = self._sum / (float(self.segments) * self.segment ** 2)
+        return _segment_db(power, self._iq)
+
+
+class Spectrogram(object):
+    """
+    Short-time Fourier transform of a capture or a stream, for burst
+    and transient analysis.
+
+    Samples are cut into frames of *size* samples starting every *hop*
+    samples, including frames spanning the blocks of samples added, so
+    frame *i* starts at sample ``i * hop`` of the stream.  Frames are
+    read through a strided view of the samples rather than copied, and
+    transformed *batch* frames per FFT call.
+
+    Each frame is windowed and scaled like :class:`WelchEstimator`, so a
+    row gives the same levels as a :class:`WelchEstimator` of that frame
+    alone.
+
+    :param int size: number of samples in each frame
+    :param int hop: number of samples between the starts of consecutive
+                    frames, *size* // 2 by default
+    :param int batch: number of frames transformed together
+    """
+    def __init__(self, size, hop=None, batch=64):
+        self.size = int(size)
+        self.hop = self.size // 2 if hop is None else int(hop)
+        if self.hop < 1:
+            raise ValueError("hop must be at least 1")
+        self.batch = max(1, int(batch))
+        self.reset()
+
+    def reset(self):
+        """
+        Discard the samples of any incomplete frame and start a new stream
+        """
+        self.frames = 0
+        self._iq = None
+        self._tail = None
+        self._window = None
+        # samples to drop before the next frame when hop > size
+        self._skip = 0
+
+    @property
+    def bins(self):
+        """
+        The number of bins in each frame's spectrum, or *None* before
+        the first samples are added
+        """
+        if self._iq is None:
+            return None
+        return self.size if self._iq else self.size // 2 + 1
+
+    def pending_frames(self, count):
+        """
+        :param int count: a number of samples about to be added
+        :returns: the number of frames :meth:`add` will return for them
+        """
+        available = (len(self._tail) if self._tail is not None else 0) + count
+        available -= self._skip
+        return max(0, (available - self.size) // self.hop + 1)
+
+    def add_packet(self, data_pkt, out=None):
+        """
+        Add the samples of a data packet, see :meth:`add`
+
+        :param data_pkt: packet containing I14Q14, I14 or I24 samples
+        :type data_pkt: pyrf.vrt.DataPacket
+        """
+        return self.add(data_pkt.samples(), out)
+
+    def add(self, samples, out=None):
+        """
+        Add time domain samples, complex for IQ data or real for I-only
+        data, and return the spectra of the frames they complete.  All
+        samples added until :meth:`reset` must be the same type.
+
+        :param samples: numpy array of samples scaled to full scale
+        :param out: 2D array with at least :meth:`pending_frames` rows of
+                    :attr:`bins` values to write the spectra into, such
+                    as a slice of a preallocated array or of a
+                    :class:`numpy.memmap`, or *None* to allocate one
+        :returns: numpy array with one row per frame of the power of
+                  each bin in dB relative to full scale, in the order of
+                  :func:`compute_fft`; the first rows of *out* if given
+        """
+        samples = np.asarray(samples)
+        if self._iq is None:
+            self._iq = np.iscomplexobj(samples)
+            self._window = _segment_window(self.size, self._iq)
+            self._tail = samples[:0]
+
+        if self._skip:
+            skipped = min(self._skip, len(samples))
+            samples = samples[skipped:]
+            self._skip -= skipped
+        parts, count, tail, skip = _segment_parts(self._tail, samples,
+            self.size, self.hop)
+        if out is None:
+            out = np.empty((count, self.bins))
+        elif len(out) < count:
+            raise ValueError("out has %d rows for %d frames"
+                % (len(out), count))
+
+        scale = 1.0 / self.size ** 2
+        row = 0
+        for segments in parts:
+            for start in range(0, len(segments), self.batch):
+                stop = min(len(segments), start + self.batch)
+                power = _segment_power(segments[start:stop], self._window,
+                    self._iq)
+                power *= scale
+                out[row + start:row + stop] = _segment_db(power, self._iq)
+            row += len(segments)
+
+        # samples not yet skipped are still due when these run out
+        self._skip += skip
+        self._tail = tail
+        self.frames += count
+        return out[:count]
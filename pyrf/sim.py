@@ -0,0 +1,646 @@
+"""
+A simulated RTSA that speaks SCPI and VRT on localhost, for testing and
+benchmarking the connectors, :class:`pyrf.sweep_device.SweepDevice` and
+:class:`pyrf.capture_device.CaptureDevice` without hardware.
+
+Only the subset of SCPI commands used by
+:class:`pyrf.devices.thinkrf.WSA` is implemented.  Captures are
+synthesized from a list of tones on top of white noise and are scaled so
+that :func:`pyrf.numpy_util.compute_fft` shows the tones at their
+requested power.  In PSD8 trace format the spectrum of each packet is
+computed the same way and sent as PSD8 bins.
+
+Usage::
+
+    sim = SimulatedRTSA(tones=[(2450e6, -30)])
+    sim.start()
+    dut = WSA()
+    dut.connect('127.0.0.1')
+    ...
+    sim.stop()
+"""
+
+import socket
+import threading
+import time
+import random
+import logging
+
+import numpy as np
+
+from pyrf.connectors.base import SCPI_PORT, VRT_PORT
+from pyrf.devices.thinkrf_properties import wsa_properties
+from pyrf.vrt import (I_ONLY, VRT_IFDATA_I14Q14, VRT_IFDATA_I14,
+    VRT_IFDATA_PSD8, VRTRECEIVER, VRTDIGITIZER, VRTCUSTOM,
+    generate_context_packet, generate_data_packet)
+from pyrf.numpy_util import (_compute_fft, _compute_fft_i_only,
+    PSD8_DB_PER_COUNT)
+
+logger = logging.getLogger(__name__)
+
+SIM_DEVICE_ID = 'ThinkRF,R5500-408 v1,SIM-000001,1.5.0'
+
+# full scale of I14 samples
+SAMPLE_SCALE = 2 ** 13
+
+# noise power of the default simulated device, in dBm/Hz
+DEFAULT_NOISE_DENSITY = -160.0
+
+# context stream carrying each field sent by the simulator
+_CONTEXT_STREAMS = {
+    'rffreq': VRTRECEIVER,
+    'reflevel': VRTDIGITIZER,
+    'bandwidth': VRTDIGITIZER,
+    'sweepid': VRTCUSTOM,
+    'streamid': VRTCUSTOM,
+    }
+
+# (long form SCPI header, default value) of settings that are simply
+# stored and reported back
+_SETTINGS = [
+    ('INPUT:MODE', 'SH'),
+    ('FREQUENCY:CENTER', 2400000000),
+    ('FREQUENCY:SHIFT', 0),
+    ('SENSE:DECIMATION', 1),
+    ('TRACE:SPP', 1024),
+    ('TRACE:BLOCK:PACKETS', 1),
+    ('TRACE:FORMAT', 'SAMPLES'),
+    ('INPUT:ATTENUATOR', 0),
+    ('INPUT:ATTENUATOR:VAR', 0),
+    ('INPUT:GAIN:IF', 0),
+    ('INPUT:GAIN:HDR', -10),
+    ('INPUT:FILTER:PRESELECT', 1),
+    ('OUTPUT:MODE', 'DIGITIZER'),
+    ('OUTPUT:IQ:MODE', 'DIGITIZER'),
+    ('SOURCE:REFERENCE:PLL', 'INT'),
+    ('TRIGGER:TYPE', 'NONE'),
+    ('TRIGGER:LEVEL', '50000000,10000000000,-100'),
+    ]
+
+_SWEEP_ENTRY_SETTINGS = {
+    'SWEEP:ENTRY:MODE': 'rfe_mode',
+    'SWEEP:ENTRY:SPP': 'spp',
+    'SWEEP:ENTRY:PPB': 'ppb',
+    'SWEEP:ENTRY:DECIMATION': 'decimation',
+    'SWEEP:ENTRY:ATTENUATOR': 'attenuator',
+    'SWEEP:ENTRY:ATTENUATOR:VAR': 'attenuator',
+    'SWEEP:ENTRY:FREQUENCY:STEP': 'fstep',
+    }
+
+
+class SimulatedRTSAError(Exception):
+    pass
+
+
+def _number(text):
+    value = float(text)
+    if value == int(value):
+        return int(value)
+    return value
+
+
+def _header_matches(parts, keywords):
+    """
+    Return True if each SCPI header part is the long form keyword or an
+    abbreviation of it, e.g. 'FREQ' for 'FREQUENCY'
+    """
+    if len(parts) != len(keywords):
+        return False
+    for part, keyword in zip(parts, keywords):
+        if not keyword.startswith(part) or len(part) < min(3, len(keyword)):
+            return False
+    return True
+
+
+class SimulatedRTSA(object):
+    """
+    A simulated RTSA serving SCPI and VRT connections.
+
+    :param str host: address to listen on
+    :param int scpi_port: SCPI port, 0 to pick a free port
+    :param int vrt_port: VRT port, 0 to pick a free port
+    :param str device_id: the ``*IDN?`` response, which selects the
+                          simulated device properties; clients only use
+                          the PSD8 trace format if its serial number
+                          starts with ``SIM-``
+    :param tones: list of (frequency in Hz, power in dBm) tones present
+                  at the input
+    :param float noise_density: noise power in dBm/Hz
+    :param bool spec_inv: report SH and SHN captures as spectrally
+                          inverted
+    :param float sample_loss: probability of a data packet having its
+                              sample loss trailer bit set
+    :param float packet_loss: probability of a data packet being dropped,
+                              leaving a gap in the VRT packet count
+    :param rate: maximum data packets per second, *None* for as fast as
+                 the connection allows
+    :param int seed: random seed for noise and losses
+    """
+    def __init__(self, host='127.0.0.1', scpi_port=SCPI_PORT,
+            vrt_port=VRT_PORT, device_id=SIM_DEVICE_ID, tones=(),
+            noise_density=DEFAULT_NOISE_DENSITY, spec_inv=False,
+            sample_loss=0.0, packet_loss=0.0, rate=None, seed=None):
+        self.host = host
+        self.scpi_port = scpi_port
+        self.vrt_port = vrt_port
+        self.device_id = device_id
+        self.properties = wsa_properties(device_id)
+        self.tones = list(tones)
+        self.noise_density = noise_density
+        self.spec_inv = spec_inv
+        self.sample_loss = sample_loss
+        self.packet_loss = packet_loss
+        self.rate = rate
+        self.reflevel = 0.0
+
+        self._random = random.Random(seed)
+        self._noise = np.random.RandomState(seed)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._threads = []
+        self._listeners = []
+        self._reset_state()
+
+    def _reset_state(self):
+        self.settings = dict(_SETTINGS)
+        self._errors = []
+        self._entry = self._new_entry()
+        self._sweep_list = []
+        self._sweep_iterations = 1
+        self._jobs = []
+        self._counts = {}
+        self._sample_clock = 0
+
+    def _new_entry(self):
+        return {
+            'rfe_mode': 'SH',
+            'fstart': 2400000000,
+            'fstop': 2400000000,
+            'fstep': 100000000,
+            'spp': 1024,
+            'ppb': 1,
+            'decimation': 1,
+            'attenuator': 0,
+            }
+
+    def start(self):
+        """
+        Start listening for SCPI and VRT connections
+        """
+        scpi = self._listen(self.scpi_port)
+        vrt = self._listen(self.vrt_port)
+        self.scpi_port = scpi.getsockname()[1]
+        self.vrt_port = vrt.getsockname()[1]
+        self._listeners = [scpi, vrt]
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._serve, args=(scpi, self._scpi_session)),
+            threading.Thread(target=self._serve, args=(vrt, self._vrt_session)),
+            ]
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        """
+        Stop the simulator and close all connections
+        """
+        self._running = False
+        self._wakeup.set()
+        for t in self._threads:
+            t.join()
+        for s in self._listeners:
+            s.close()
+        self._threads = []
+        self._listeners = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _listen(self, port):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((self.host, port))
+        s.listen(1)
+        s.settimeout(0.1)
+        return s
+
+    def _serve(self, listener, session):
+        while self._running:
+            try:
+                conn, addr = listener.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            conn.settimeout(0.1)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+            try:
+                session(conn)
+            except socket.error as err:
+                logger.debug('simulator connection closed: %s', err)
+            finally:
+                conn.close()
+
+    def _scpi_session(self, conn):
+        buf = b''
+        while self._running:
+            try:
+                data = conn.recv(4096)
+            except socket.timeout:
+                continue
+            if not data:
+                return
+            buf += data
+            while b'\n' in buf:
+                line, buf = buf.split(b'\n', 1)
+                response = self.scpi(line.decode('latin-1'))
+                if response is not None:
+                    conn.sendall((response + '\n').encode('latin-1'))
+
+    def _vrt_session(self, conn):
+        next_due = time.time()
+        while self._running:
+            with self._lock:
+                packet = self._next_job_packet()
+            if packet is None:
+                self._wakeup.wait(0.05)
+                self._wakeup.clear()
+                next_due = time.time()
+                continue
+            data, is_data = packet
+            if is_data and self.rate:
+                next_due += 1.0 / self.rate
+                delay = next_due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            if data:
+                self._sendall(conn, data)
+
+    def _sendall(self, conn, data):
+        while data:
+            try:
+                sent = conn.send(data)
+            except socket.timeout:
+                if not self._running:
+                    return
+                continue
+            data = data[sent:]
+
+    def _next_job_packet(self):
+        while self._jobs:
+            try:
+                return next(self._jobs[0])
+            except StopIteration:
+                self._jobs.pop(0)
+        return None
+
+    def _start_job(self, job):
+        self._jobs.append(job)
+        self._wakeup.set()
+
+    def scpi(self, line):
+        """
+        Handle one SCPI command line and return the response, or *None*
+        if the command doesn't send a response.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        header, _space, args = line.partition(' ')
+        args = args.strip()
+        query = header.endswith('?')
+        parts = header.rstrip('?').lstrip(':').upper().split(':')
+
+        with self._lock:
+            try:
+                response = self._command(parts, query, args)
+            except (ValueError, IndexError):
+                self._errors.append((-224, 'Illegal parameter value'))
+                response = ''
+            except SimulatedRTSAError:
+                self._errors.append((-113, 'Undefined header'))
+                response = ''
+        # data requests like :TRACE:BLOCK:DATA? answer on the VRT socket
+        if query and response is not None:
+            return str(response)
+        return None
+
+    def _command(self, parts, query, args):
+        def match(keywords):
+            return _header_matches(parts, keywords.split(':'))
+
+        if match('*IDN'):
+            return self.device_id
+        if match('*RST'):
+            self._reset_state()
+            return
+        if match('SYSTEM:LOCK:REQUEST') or match('SYSTEM:LOCK:HAVE'):
+            return 1
+        if match('SYSTEM:ABORT') or match('SYSTEM:FLUSH'):
+            del self._jobs[:]
+            return
+        if match('SYSTEM:ERROR'):
+            if not self._errors:
+                return '0,"No error"'
+            return '%d,"%s"' % self._errors.pop(0)
+        if match('SYSTEM:CAPTURE:MODE'):
+            return 'BLOCK' if not self._jobs else 'SWEEP'
+        if match('SENSE:LOCK:RF') or match('SENSE:LOCK:REFERENCE'):
+            return 1
+        if match('INPUT:GAIN'):
+            # psfm gain stages, "<stage> <state>"
+            stage = args.split()[0]
+            if query:
+                return self.settings.get('INPUT:GAIN %s' % stage, '1')
+            self.settings['INPUT:GAIN %s' % stage] = args.split()[1]
+            return
+        if match('DATA:CORRECTION:SIGNAL:SIZE') or match(
+                'DATA:CORRECTION:NOISE:SIZE'):
+            return 0
+        if match('DATA:CORRECTION:SIGNAL:READ') or match(
+                'DATA:CORRECTION:NOISE:READ'):
+            # empty block response
+            return '#10'
+
+        if match('TRACE:BLOCK:DATA'):
+            self._start_job(self._block_job(
+                self.settings['INPUT:MODE'],
+                float(self.settings['FREQUENCY:CENTER']),
+                int(self.settings['TRACE:SPP']),
+                int(self.settings['TRACE:BLOCK:PACKETS']),
+                self._decimation(self.settings['SENSE:DECIMATION'])))
+            return
+        if match('TRACE:STREAM:START'):
+            self._start_job(self._stream_job(int(args) if args else None))
+            return
+        if match('TRACE:STREAM:STOP'):
+            del self._jobs[:]
+            return
+        if match('TRACE:STREAM:STATUS'):
+            return 'RUNNING' if self._jobs else 'STOPPED'
+
+        if match('SWEEP:ENTRY:NEW'):
+            self._entry = self._new_entry()
+            return
+        if match('SWEEP:ENTRY:SAVE'):
+            self._sweep_list.append(dict(self._entry))
+            return
+        if match('SWEEP:ENTRY:DELETE'):
+            if args.upper() == 'ALL':
+                del self._sweep_list[:]
+            else:
+                del self._sweep_list[int(args) - 1]
+            return
+        if match('SWEEP:ENTRY:COUNT'):
+            return len(self._sweep_list)
+        if match('SWEEP:ENTRY:FREQUENCY:CENTER'):
+            if query:
+                return '%d,%d' % (self._entry['fstart'], self._entry['fstop'])
+            fstart, fstop = args.split(',')
+            self._entry['fstart'] = _number(fstart)
+            self._entry['fstop'] = _number(fstop)
+            return
+        for keywords, name in _SWEEP_ENTRY_SETTINGS.items():
+            if match(keywords):
+                if query:
+                    return self._entry[name]
+                if name == 'rfe_mode':
+                    self._entry[name] = args.upper()
+                else:
+                    self._entry[name] = _number(args)
+                return
+        if match('SWEEP:LIST:ITERATIONS'):
+            if query:
+                return self._sweep_iterations
+            self._sweep_iterations = int(args)
+            return
+        if match('SWEEP:LIST:START'):
+            self._start_job(self._sweep_job(int(args) if args else 0,
+                list(self._sweep_list), self._sweep_iterations))
+            return
+        if match('SWEEP:LIST:STOP'):
+            del self._jobs[:]
+            return
+
+        for keywords, default in _SETTINGS:
+            if match(keywords):
+                if query:
+                    return self.settings[keywords]
+                value = args
+                if isinstance(default, int):
+                    value = _number(args)
+                elif isinstance(default, str) and ',' not in default:
+                    value = args.upper()
+                self.settings[keywords] = value
+                return
+
+        raise SimulatedRTSAError(':'.join(parts))
+
+    def _decimation(self, value):
+        # firmware < 2.5.3 used 0 for no decimation
+        return max(1, int(value))
+
+    def _psd8(self):
+        return self.settings['TRACE:FORMAT'] == 'PSD8'
+
+    def _block_job(self, rfe_mode, freq, spp, ppb, decimation):
+        for packet in self._capture(rfe_mode, freq, spp, ppb, decimation,
+                self._psd8()):
+            yield packet
+
+    def _stream_job(self, stream_id):
+        if stream_id is not None:
+            yield self._context('streamid', stream_id)
+        rfe_mode = self.settings['INPUT:MODE']
+        freq = float(self.settings['FREQUENCY:CENTER'])
+        spp = int(self.settings['TRACE:SPP'])
+        decimation = self._decimation(self.settings['SENSE:DECIMATION'])
+        for packet in self._capture(rfe_mode, freq, spp, None, decimation,
+                self._psd8()):
+            yield packet
+
+    def _sweep_job(self, sweep_id, entries, iterations):
+        psd8 = self._psd8()
+        iteration = 0
+        while not iterations or iteration < iterations:
+            iteration += 1
+            yield self._context('sweepid', sweep_id)
+            for entry in entries:
+                fstart, fstop, fstep = (entry['fstart'], entry['fstop'],
+                    entry['fstep'])
+                steps = 1
+                if fstep > 0 and fstop > fstart:
+                    steps = int((fstop - fstart) / fstep + 1e-9) + 1
+                for step in range(steps):
+                    packets = self._capture(entry['rfe_mode'],
+                        fstart + step * fstep, int(entry['spp']),
+                        int(entry['ppb']),
+                        self._decimation(entry['decimation']), psd8)
+                    for packet in packets:
+                        yield packet
+
+    def _context(self, field, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        tsi = int(timestamp)
+        stream_id = _CONTEXT_STREAMS[field]
+        count = self._counts.get(stream_id, 0)
+        data, self._counts[stream_id] = generate_context_packet(field, value,
+            count, tsi, int((timestamp - tsi) * 1e12))
+        return data, False
+
+    def _capture(self, rfe_mode, freq, spp, ppb, decimation, psd8=False):
+        """
+        Generate the context and data packets of a capture of *ppb*
+        packets (forever if *ppb* is None) with continuous samples, or
+        their spectra if *psd8* is set
+        """
+        prop = self.properties
+        if rfe_mode in ('SH', 'SHN') and decimation > 1:
+            pass_band_center = prop.PASS_BAND_CENTER['DEC_' + rfe_mode]
+            full_bw = prop.FULL_BW['DEC_' + rfe_mode] / float(decimation)
+        else:
+            pass_band_center = prop.PASS_BAND_CENTER[rfe_mode]
+            full_bw = prop.FULL_BW[rfe_mode] / float(decimation)
+        i_only = prop.DEFAULT_SAMPLE_TYPE.get(rfe_mode) == I_ONLY
+        spec_inv = self.spec_inv and rfe_mode in ('SH', 'SHN')
+        if rfe_mode in ('DD', 'IQIN'):
+            freq = prop.MIN_TUNABLE[rfe_mode]
+
+        start_time = time.time()
+        yield self._context('rffreq', freq, start_time)
+        yield self._context('reflevel', self.reflevel, start_time)
+        yield self._context('bandwidth', full_bw, start_time)
+
+        # display offset applied by compute_fft
+        reference = self.reflevel + prop.REFLEVEL_ERROR
+        if i_only:
+            sample_rate = 2 * full_bw
+            offset = full_bw * (0.5 - pass_band_center)
+            if spec_inv:
+                offset = -offset
+            band_start = freq - full_bw / 2.0 + offset
+        else:
+            sample_rate = full_bw
+
+        # white noise giving noise_density at the compute_fft output,
+        # which uses one hanning window for I only data and two for IQ
+        density = 10 ** ((self.noise_density - reference) / 10.0)
+        if i_only:
+            noise_sigma = np.sqrt(density * 16 * full_bw / 3.0)
+        else:
+            noise_sigma = np.sqrt(density * full_bw * 128 / 35.0)
+
+        tones = []
+        for tone_freq, power in self.tones:
+            amplitude = 10 ** ((power - reference) / 20.0)
+            if i_only:
+                baseband = tone_freq - band_start
+                if spec_inv:
+                    baseband = full_bw - baseband
+                if 0 < baseband < full_bw:
+                    tones.append((baseband, 4 * amplitude))
+            else:
+                baseband = tone_freq - freq
+                if abs(baseband) < full_bw / 2.0:
+                    tones.append((baseband, amplitude / 0.375))
+
+        packet = 0
+        sample_clock = self._sample_clock
+        while ppb is None or packet < ppb:
+            packet += 1
+            t = (sample_clock + np.arange(spp)) / sample_rate
+            if i_only:
+                samples = self._noise.normal(0, noise_sigma, spp)
+                for baseband, amplitude in tones:
+                    samples += amplitude * np.cos(2 * np.pi * baseband * t)
+                stream_id = VRT_IFDATA_I14
+            else:
+                samples = np.empty((spp, 2))
+                samples[:, 0] = self._noise.normal(0, noise_sigma / np.sqrt(2), spp)
+                samples[:, 1] = self._noise.normal(0, noise_sigma / np.sqrt(2), spp)
+                for baseband, amplitude in tones:
+                    phase = 2 * np.pi * baseband * t
+                    samples[:, 0] += amplitude * np.cos(phase)
+                    samples[:, 1] += amplitude * np.sin(phase)
+                stream_id = VRT_IFDATA_I14Q14
+            samples = np.round(samples * SAMPLE_SCALE)
+            over_range = bool(np.any(np.abs(samples) >= SAMPLE_SCALE))
+            samples = np.clip(samples, -SAMPLE_SCALE, SAMPLE_SCALE - 1)
+            if psd8:
+                stream_id = VRT_IFDATA_PSD8
+
+            timestamp = start_time + (sample_clock - self._sample_clock) / sample_rate
+            sample_clock += spp
+            count = self._counts.get(stream_id, 0)
+            if self.packet_loss and self._random.random() < self.packet_loss:
+                self._counts[stream_id] = (count + 1) & 0x0f
+                continue
+            if psd8:
+                payload = self._psd8_payload(samples, full_bw)
+            else:
+                payload = samples.astype('>i2').tobytes()
+            tsi = int(timestamp)
+            data, self._counts[stream_id] = generate_data_packet(stream_id,
+                payload, count, tsi,
+                int((timestamp - tsi) * 1e12),
+                spec_inv=spec_inv,
+                over_range=over_range,
+                sample_loss=bool(self.sample_loss
+                    and self._random.random() < self.sample_loss))
+            yield data, True
+        self._sample_clock = sample_clock
+
+    def _psd8_payload(self, samples, bandwidth):
+        """
+        Return the PSD8 bins of a packet of samples, the compute_fft
+        spectrum before the reference level and spectral inversion
+        are applied
+        """
+        samples = samples / SAMPLE_SCALE
+        if samples.ndim == 2:
+            spectrum = _compute_fft(samples[:, 0], samples[:, 1], True, True,
+                True, True, True, 1, 0, bandwidth)
+        else:
+            spectrum = _compute_fft_i_only(samples, True, True)
+            spectrum = spectrum[:len(samples) // 2]
+        counts = np.round(spectrum / PSD8_DB_PER_COUNT)
+        return np.clip(counts, -128, 127).astype(np.int8).tobytes()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=
+        'Run a simulated RTSA on the SCPI and VRT ports')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--tone', action='append', default=[],
+        metavar='FREQ,DBM', help='add a tone, e.g. 2450e6,-30')
+    parser.add_argument('--noise', type=float, default=DEFAULT_NOISE_DENSITY,
+        help='noise density in dBm/Hz')
+    parser.add_argument('--spec-inv', action='store_true')
+    parser.add_argument('--sample-loss', type=float, default=0.0)
+    parser.add_argument('--packet-loss', type=float, default=0.0)
+    parser.add_argument('--rate', type=float, default=None,
+        help='maximum data packets per second')
+    args = parser.parse_args()
+
+    tones = [tuple(float(v) for v in t.split(',')) for t in args.tone]
+    sim = SimulatedRTSA(args.host, tones=tones, noise_density=args.noise,
+        spec_inv=args.spec_inv, sample_loss=args.sample_loss,
+        packet_loss=args.packet_loss, rate=args.rate)
+    sim.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    sim.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import socket
+import threading
+from collections import namedtuple, deque
+
+import numpy as np
+
+from pyrf.vrt import SAMPLE_FULL_SCALE
+from pyrf.metrics import metrics
+
+#: a gap in the stream: *index* is the position in the stream of the
+#: first sample after the gap, *packets* the number of packets lost
+#: (0 if unknown) and *reason* one of 'count' for a jump in the VRT
+#: packet count, 'sample_loss' for a packet with the sample loss
+#: trailer bit set or 'overrun' for a packet dropped because the ring
+#: buffer was full
+StreamGap = namedtuple('StreamGap', 'index packets reason')
+
+# how often a blocking reader thread checks if the stream was closed
+READ_POLL_INTERVAL = 0.2
+
+
+class StreamDeviceError(Exception):
+    pass
+
+
+class SampleRing(object):
+    """
+    A single producer, single consumer ring buffer of samples.
+
+    The producer only advances :attr:`written` and the consumer only
+    advances :attr:`consumed`, each after copying its data, so the two
+    sides never need a lock.  Writes that don't fit are refused rather
+    than overwriting samples that haven't been read.
+
+    :param int capacity: number of samples in the buffer
+    :param dtype: numpy dtype of the samples
+    """
+    def __init__(self, capacity, dtype):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=dtype)
+        self.written = 0
+        self.consumed = 0
+
+    def available(self):
+        """
+        :returns: the number of samples waiting to be read
+        """
+        return self.written - self.consumed
+
+    def write(self, samples, scale=1.0):
+        """
+        Copy samples into the buffer.  IQ samples as an (n, 2) array
+        are stored as complex values.
+
+        :param samples: the samples to store
+        :param float scale: divide the samples by this value
+        :returns: True if written, False if there wasn't enough room
+        """
+        count = len(samples)
+        if count > self.capacity - self.available():
+            return False
+        start = self.written % self.capacity
+        first = min(count, self.capacity - start)
+        for dst, src in ((self.buffer[start:start + first], samples[:first]),
+                (self.buffer[:count - first], samples[first:])):
+            if not len(dst):
+                continue
+            if src.ndim == 2:
+                dst.real = src[:, 0]
+                dst.imag = src[:, 1]
+            else:
+                dst[:] = src
+            if scale != 1.0:
+                dst /= scale
+        self.written += count
+        return True
+
+    def read(self, count, out=None):
+        """
+        Copy the oldest *count* samples out of the buffer.
+
+        :param int count: number of samples, no more than
+                          :meth:`available`
+        :param out: array to copy the samples into, or *None* to
+                    allocate one
+        :returns: the array of samples
+        """
+        if out is None:
+            out = np.empty(count, dtype=self.buffer.dtype)
+        start = self.consumed % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:count] = self.buffer[:count - first]
+        self.consumed += count
+        return out
+
+
+class StreamDevice(object):
+    """
+    Virtual device that captures continuous streams of samples from a
+    real device with :meth:`pyrf.devices.thinkrf.WSA.stream_start`.
+
+    Data packets are drained into a :class:`SampleRing` as they arrive,
+    by a reader thread when *real_device* uses a blocking connector, or
+    from the reactor when it uses an async connector.  The reader thread
+    reads every VRT packet from the device, discarding them while
+    stopped, until :meth:`close` is called.  It reads through the VRT
+    reader thread of :meth:`pyrf.devices.thinkrf.WSA.start_vrt_reader`,
+    started if needed, so it can be stopped without waiting for another
+    packet.  Samples are stored as
+    complex values scaled to full scale for IQ data, or as floats for
+    I-only data.
+
+    Consumers either pull samples with :meth:`read` or :meth:`frames`,
+    or have every *frame_size* samples pushed to *frame_callback*.
+    Discontinuities are recorded in :attr:`gaps`.
+
+    :param real_device: the device that will be used for capturing data,
+                        typically a :class:`pyrf.devices.thinkrf.WSA` instance.
+    :param frame_callback: function called with (samples, index) for
+                           each *frame_size* samples, where *index* is
+                           the position in the stream of the first
+                           sample.  Required for async operation.
+    :param int frame_size: number of samples passed to *frame_callback*
+    :param int buffer_samples: capacity of the ring buffer
+    :param int timestamps: number of recent packet timestamps kept for
+                           :meth:`timestamp`
+    """
+    def __init__(self, real_device, frame_callback=None, frame_size=32768,
+            buffer_samples=2 ** 23, timestamps=4096):
+        self.real_device = real_device
+        if real_device.async_connector() and not frame_callback:
+            raise StreamDeviceError(
+                "frame_callback required for async operation")
+        self.frame_callback = frame_callback
+        self.frame_size = frame_size
+        self.buffer_samples = buffer_samples
+        self.ring = None
+        self.gaps = []
+        self.context = {}
+        self._timestamps = deque(maxlen=timestamps)
+        self._next_count = None
+        self._streaming = False
+        self._reader = None
+        self._read_timeout = None
+        self._vrt_reader_started = False
+        self._data_ready = threading.Event()
+
+    def start(self, stream_id=None):
+        """
+        Start streaming, discarding any samples from a previous stream
+
+        :param int stream_id: optional unsigned 32-bit stream identifier
+        """
+        if self._streaming:
+            raise StreamDeviceError("stream already started")
+
+        self.ring = None
+        self.gaps = []
+        self.context = {}
+        self._timestamps.clear()
+        self._next_count = None
+        self._data_ready.clear()
+
+        self.real_device.abort()
+        self.real_device.flush()
+        self.real_device.request_read_perm()
+        self._streaming = True
+        if self.real_device.async_connector():
+            self.real_device.set_async_callback(self._vrt_receive)
+        elif self._reader is None or not self._reader.is_alive():
+            self._start_reader()
+        self.real_device.stream_start(stream_id)
+
+    def _start_reader(self):
+        self._read_timeout = None
+        self._vrt_reader_started = False
+        start_vrt_reader = getattr(self.real_device, 'start_vrt_reader', None)
+        if start_vrt_reader is not None:
+            try:
+                start_vrt_reader()
+                self._vrt_reader_started = True
+            except ValueError:
+                # already started by the caller
+                pass
+            self._read_timeout = READ_POLL_INTERVAL
+        self._reader = threading.Thread(target=self._read_loop)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def stop(self):
+        """
+        Stop streaming.  Samples already in the ring buffer can still be
+        read.
+        """
+        if not self._streaming:
+            return
+        self._streaming = False
+        self.real_device.stream_stop()
+        self.real_device.flush()
+        if self.real_device.async_connector():
+            self.real_device.set_async_callback(None)
+        self._data_ready.set()
+
+    def close(self):
+        """
+        Stop streaming, wait for a blocking reader thread to exit and
+        stop the VRT reader thread it started.  Devices without
+        :meth:`pyrf.devices.thinkrf.WSA.start_vrt_reader` leave the
+        reader thread to exit after the next packet it receives.
+        """
+        self.stop()
+        reader = self._reader
+        self._reader = None
+        if reader is None or self._read_timeout is None:
+            return
+        reader.join()
+        if self._vrt_reader_started:
+            self.real_device.stop_vrt_reader()
+            self._vrt_reader_started = False
+
+    def _read_loop(self):
+        reader = threading.current_thread()
+        while self._reader is reader:
+            try:
+                if self._read_timeout is None:
+                    packet = self.real_device.read()
+                else:
+                    packet = self.real_device.read(self._read_timeout)
+            except socket.timeout:
+                continue
+            except Exception:
+                packet = None
+            if packet is None:
+                # the device was disconnected
+                self._streaming = False
+                self._data_ready.set()
+                return
+            if self._reader is reader:
+                self._vrt_receive(packet)
+
+    def _vrt_receive(self, packet):
+        if not self._streaming:
+            return
+        if packet.is_context_packet():
+            self.context.update(packet.fields)
+            return
+
+        scale = SAMPLE_FULL_SCALE.get(packet.stream_id)
+        if scale is None:
+            return
+        samples = packet.data.numpy_array()
+        if self.ring is None:
+            dtype = np.complex64 if samples.ndim == 2 else np.float32
+            self.ring = SampleRing(self.buffer_samples, dtype)
+        ring = self.ring
+
+        if self._next_count is not None and packet.count != self._next_count:
+            lost = (packet.count - self._next_count) & 0x0f
+            self.gaps.append(StreamGap(ring.written, lost, 'count'))
+            metrics.count('stream.lost_packets', lost)
+        self._next_count = (packet.count + 1) & 0x0f
+        if packet.sample_loss:
+            self.gaps.append(StreamGap(ring.written, 0, 'sample_loss'))
+
+        index = ring.written
+        if not ring.write(samples, scale):
+            self.gaps.append(StreamGap(ring.written, 1, 'overrun'))
+            metrics.count('stream.overruns')
+            return
+        self._timestamps.append((index, packet.tsi, packet.tsf))
+        metrics.count('stream.samples', len(samples))
+
+        if self.frame_callback:
+            while ring.available() >= self.frame_size:
+                index = ring.consumed
+                self.frame_callback(ring.read(self.frame_size), index)
+        else:
+            self._data_ready.set()
+
+    def read(self, count, timeout=None, out=None):
+        """
+        Wait for and return the next *count* samples of the stream.
+        Not available when using *frame_callback*.
+
+        :param int count: number of samples, no more than *buffer_samples*
+        :param float timeout: seconds to wait, or *None* to wait until
+                              the samples arrive or the stream is stopped
+        :param out: array to copy the samples into, or *None* to
+                    allocate one
+        :returns: a numpy array of samples, or *None* if the samples
+                  didn't arrive
+        """
+        if self.frame_callback:
+            raise StreamDeviceError(
+                "samples are passed to frame_callback")
+        while self.ring is None or self.ring.available() < count:
+            if not self._streaming:
+                return None
+            if not self._data_ready.wait(timeout):
+                return None
+            self._data_ready.clear()
+        return self.ring.read(count, out)
+
+    def frames(self, size, timeout=None):
+        """
+        Iterate over the stream in frames of *size* samples, until the
+        stream is stopped or a frame takes longer than *timeout*
+        seconds to arrive
+        """
+        while True:
+            frame = self.read(size, timeout)
+            if frame is None:
+                return
+            yield frame
+
+    @property
+    def position(self):
+        """
+        The position in the stream of the next sample to be read
+        """
+        return self.ring.consumed if self.ring is not None else 0
+
+    def timestamp(self, index):
+        """
+        Find the timestamp of a sample from a recent packet
+
+        :param int index: position of the sample in the stream
+        :returns: (tsi, tsf, offset) where *tsi* and *tsf* are the
+                  timestamp of the packet containing the sample and
+                  *offset* is the sample's position in the packet, or
+                  *None* if the packet is no longer kept
+        """
+        for start, tsi, tsf in reversed(self._timestamps):
+            if start <= index:
+                return tsi, tsf, index - start
+        return None
@@ -0,0 +1,261 @@
+"""
+Memory-mapped archives of continuous sweeps, for keeping hours of
+sweeps to replay or review later.
+
+An archive file is a fixed size header followed by one fixed size
+record per sweep, holding its timestamp and power spectrum, so every
+sweep in an archive must come from the same sweep plan::
+
+    from pyrf.sweep_archive import SweepArchiveWriter, SweepArchive
+    writer = SweepArchiveWriter('sweeps.dat')
+    sd.capture_power_spectrum(2400e6, 2500e6, 100e3, continuous=True,
+        archive=writer)
+    ...
+    archive = SweepArchive('sweeps.dat')
+    times, freqs, power = archive.read(start_time, stop_time,
+        2430e6, 2450e6)
+
+Records are only ever appended, and the number of records is taken
+from the size of the file rather than stored in the header, so a sweep
+half written when the writer crashed is ignored by readers and dropped
+when the archive is opened for writing again.
+
+The header is :data:`HEADER_MAGIC` followed by a JSON object with the
+record layout (``fstart``, ``fstop``, ``points`` and ``dtype``) and any
+other metadata, such as ``rfe_mode``, ``rbw`` and ``device_id`` for
+archives written by :class:`pyrf.sweep_device.SweepDevice`, padded to
+:data:`HEADER_SIZE` bytes.  Each record is a little-endian float64 UNIX
+timestamp followed by the *points* power values in dBm.
+"""
+
+import bisect
+import json
+import os
+import time
+
+import numpy as np
+
+from pyrf.numpy_util import frequency_axis
+
+HEADER_MAGIC = b'PYRFSWA1'
+HEADER_SIZE = 4096
+
+
+class SweepArchiveError(Exception):
+    pass
+
+
+def _record_dtype(points, dtype):
+    return np.dtype([('time', '<f8'), ('power', dtype, (points,))])
+
+
+def _read_header(f):
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(HEADER_MAGIC):
+        raise SweepArchiveError("not a sweep archive")
+    return json.loads(header[len(HEADER_MAGIC):].decode('utf-8'))
+
+
+class SweepArchiveWriter(object):
+    """
+    Append sweeps to an archive file, creating it with the plan of the
+    first sweep added if it doesn't exist.
+
+    :meth:`add` takes the same arguments as a
+    :class:`pyrf.sweep_device.SweepDevice` async callback, so a writer can
+    also be called from one, or passed as the *archive* of
+    :meth:`pyrf.sweep_device.SweepDevice.capture_power_spectrum`.
+
+    :param str filename: the archive file
+    :param dtype: numpy dtype the power values are stored as, '<f4' or
+                  '<f8'; an existing archive keeps its own
+    :param dict metadata: more values to store in the header of a new
+                          archive
+    :param bool sync: call ``os.fsync`` after every sweep so it survives
+                      a system crash, not only a crash of the process
+    """
+    def __init__(self, filename, dtype='<f4', metadata=None, sync=False):
+        self.filename = filename
+        self.sync = sync
+        self.metadata = None
+        self._dtype = np.dtype(dtype).newbyteorder('<')
+        self._new_metadata = dict(metadata or {})
+        self._record = None
+        self._file = None
+        if os.path.exists(filename):
+            self._open_existing()
+
+    def _open_existing(self):
+        with open(self.filename, 'rb') as f:
+            self.metadata = _read_header(f)
+        self._record = _record_dtype(self.metadata['points'],
+            self.metadata['dtype'])
+        self._file = open(self.filename, 'r+b')
+        # drop a record left half written by a crash
+        size = os.path.getsize(self.filename) - HEADER_SIZE
+        self._file.truncate(HEADER_SIZE
+            + size // self._record.itemsize * self._record.itemsize)
+        self._file.seek(0, os.SEEK_END)
+
+    def _create(self, fstart, fstop, points, metadata):
+        header = dict(self._new_metadata)
+        header.update(metadata or {})
+        header.update(fstart=float(fstart), fstop=float(fstop),
+            points=int(points), dtype=self._dtype.str)
+        encoded = HEADER_MAGIC + json.dumps(header, sort_keys=True).encode(
+            'utf-8')
+        if len(encoded) >= HEADER_SIZE:
+            raise SweepArchiveError("archive metadata too large")
+        encoded += b' ' * (HEADER_SIZE - 1 - len(encoded)) + b'\n'
+
+        # a complete header appears under the archive's name, or nothing
+        partial = self.filename + '.tmp'
+        with open(partial, 'wb') as f:
+            f.write(encoded)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(partial, self.filename)
+        self._open_existing()
+
+    def add(self, fstart, fstop, data, timestamp=None, metadata=None):
+        """
+        Append a sweep
+
+        :param float fstart: frequency of the first point, in Hz
+        :param float fstop: frequency of the last point, in Hz
+        :param data: power spectrum in dBm
+        :param float timestamp: UNIX time of the sweep, the current time
+                                by default
+        :param dict metadata: values stored in the header if this sweep
+                              creates the archive
+        :raises SweepArchiveError: if the sweep doesn't match the
+                                   archive's plan
+        """
+        data = np.asarray(data)
+        if self._file is None:
+            self._create(fstart, fstop, len(data), metadata)
+        elif (len(data) != self.metadata['points']
+                or float(fstart) != self.metadata['fstart']
+                or float(fstop) != self.metadata['fstop']):
+            raise SweepArchiveError("sweep doesn't match the archive plan "
+                "%(fstart)r-%(fstop)r Hz, %(points)d points" % self.metadata)
+
+        record = np.zeros(1, dtype=self._record)
+        record['time'] = time.time() if timestamp is None else timestamp
+        record['power'][0] = data
+        self._file.write(record.tobytes())
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    __call__ = add
+
+    def close(self):
+        """
+        Close the archive file
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SweepArchive(object):
+    """
+    Random access to the sweeps of an archive without loading it.
+
+    Sweeps are read through a read-only :class:`numpy.memmap` of the
+    file, so only the parts of the file used are read from disk.  Time
+    range lookups are binary searches, which expect timestamps that
+    don't go backwards.
+
+    :param str filename: the archive file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.metadata = _read_header(f)
+        self.fstart = self.metadata['fstart']
+        self.fstop = self.metadata['fstop']
+        self.points = self.metadata['points']
+        self._record = _record_dtype(self.points, self.metadata['dtype'])
+        self._records = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Map the sweeps appended since the archive was opened
+        """
+        size = os.path.getsize(self.filename) - HEADER_SIZE
+        count = size // self._record.itemsize
+        if self._records is not None and len(self._records) == count:
+            return
+        if count:
+            self._records = np.memmap(self.filename, dtype=self._record,
+                mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self._records = np.zeros(0, dtype=self._record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        """
+        :returns: (timestamp, power) of sweep *index*
+        """
+        record = self._records[index]
+        return float(record['time']), record['power']
+
+    @property
+    def times(self):
+        """
+        The timestamp of each sweep, as a memory-mapped array
+        """
+        return self._records['time']
+
+    def frequencies(self):
+        """
+        :returns: the frequency of each point of the sweeps, in Hz
+        """
+        return frequency_axis(self.fstart, self.fstop, self.points)
+
+    def time_range(self, start_time=None, stop_time=None):
+        """
+        :returns: a slice of the sweeps with timestamps from *start_time*
+                  up to but not including *stop_time*
+        """
+        times = self._records['time']
+        start = 0 if start_time is None else bisect.bisect_left(times,
+            start_time)
+        stop = len(times) if stop_time is None else bisect.bisect_left(
+            times, stop_time)
+        return slice(start, max(start, stop))
+
+    def frequency_range(self, fstart=None, fstop=None):
+        """
+        :returns: a slice of the points with frequencies from *fstart*
+                  to *fstop* inclusive
+        """
+        freqs = self.frequencies()
+        start = 0 if fstart is None else np.searchsorted(freqs, fstart,
+            'left')
+        stop = self.points if fstop is None else np.searchsorted(freqs,
+            fstop, 'right')
+        return slice(int(start), int(max(start, stop)))
+
+    def read(self, start_time=None, stop_time=None, fstart=None,
+            fstop=None):
+        """
+        Return the part of the sweeps in a time and frequency range
+
+        :param float start_time: first UNIX time included
+        :param float stop_time: UNIX time where the range ends, excluded
+        :param float fstart: lowest frequency included, in Hz
+        :param float fstop: highest frequency included, in Hz
+        :returns: (times, freqs, power) where *power* is a 2D
+                  memory-mapped array with a row per sweep
+        """
+        rows = self.time_range(start_time, stop_time)
+        columns = self.frequency_range(fstart, fstop)
+        records = self._records[rows]
+        return (records['time'], self.frequencies()[columns],
+            records['power'][:, columns])
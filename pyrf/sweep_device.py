@@ -3,13 +3,17 @@ import math
 import random
 from collections import namedtuple
 import time
+import threading
 from pyrf.util import (compute_usable_bins, adjust_usable_fstart_fstop,
     trim_to_usable_fstart_fstop, find_saturation)
 
 import numpy as np
 from twisted.internet import defer
 
-from pyrf.numpy_util import compute_fft
+from pyrf.numpy_util import (compute_fft, psd8_to_dbm, frequency_axis,
+    IQCorrectionState)
+from pyrf.vrt import I_ONLY, VRT_IFDATA_PSD8
+from pyrf.metrics import metrics
 import struct
 MAXIMUM_SPP = 32768
 
@@ -239,10 +243,133 @@ class SweepSettings(object):
         # what's the actual RBW of what we're capturing
         self.rbw = 0
 
+        # whether the device sends PSD8 spectra instead of samples
+        self.psd8 = False
+
+        # placement of each step in the results, see SweepAssembly
+        self.assembly = None
+
     def __str__(self):
         return "SweepSettings[ bandstart = %d, bandstop = %d, fstart = %d, fstop = %d, fstep = %d, step_count = %d, rfe_mode = %s, dd_mode = %s, beyond_dd = %s, attenuation = %s, ppb = %d, spp = %d, iterations = %d, spectral_points = %d, make_end_entry = %s, end_entry_freq = %d, rbw = %f ]" % (self.bandstart, self.bandstop, self.fstart, self.fstop, self.fstep, self.step_count, self.rfe_mode, self.dd_mode, self.beyond_dd, self.attenuation, self.ppb, self.spp, self.iterations, self.spectral_points, self.make_end_entry, self.end_entry_freq, self.rbw)
 
 
+def copy_bins(src_fstart, src_fstop, srclen, dst_fstart, dst_fstop, dstlen):
+    """
+    Return the bins to copy from a spectrum of *srclen* bins covering
+    *src_fstart* to *src_fstop* into a spectrum of *dstlen* bins covering
+    *dst_fstart* to *dst_fstop*, as (src_start, src_stop, dst_start,
+    dst_stop).  There is nothing to copy unless both ranges are non-empty.
+    """
+    # calc src and dest rbw
+    srcrbw = float(src_fstop - src_fstart) / srclen
+    dstrbw = float(dst_fstop - dst_fstart) / dstlen
+
+    # check if packet start is before sweep start.  shouldn't happen, but check anyway
+    if src_fstart < dst_fstart:
+        src_start_bin = int(float(dst_fstart - src_fstart) / srcrbw)
+    else:
+        src_start_bin = 0
+
+    # check if packet stop is after sweep stop.  this means we don't need the whole packet
+    if src_fstop > dst_fstop:
+        src_stop_bin = srclen - int(float(src_fstop - dst_fstop) / srcrbw)
+    else:
+        src_stop_bin = srclen
+
+    # how many values are we copying?
+    tocopy = src_stop_bin - src_start_bin
+
+    # calculate dest start index
+    if src_fstart < dst_fstart:
+        dst_start_bin = 0
+    else:
+        dst_start_bin = int(round(float(src_fstart - dst_fstart) / dstrbw))
+
+    # calculate dest stop index
+    dst_stop_bin = dst_start_bin + tocopy
+    if dst_stop_bin > dstlen:
+        dst_stop_bin = dstlen
+
+        # adjust tocopy
+        tocopy = dst_stop_bin - dst_start_bin
+
+        # adjust src stop bin because we adjusted tocopy
+        src_stop_bin = src_start_bin + tocopy
+
+    return src_start_bin, src_stop_bin, dst_start_bin, dst_stop_bin
+
+
+def usable_packet_range(dev_prop, rfe_mode, spp, bins, packet_freq, spec_inv):
+    """
+    Return the usable bins of a sweep packet's spectrum of *bins* bins
+    as (left bin, right bin, usable fstart, usable fstop)
+    """
+    usable_bins = compute_usable_bins(dev_prop, rfe_mode, spp, 1, 0)
+    usable_bins, packet_start, packet_stop = adjust_usable_fstart_fstop(
+        dev_prop, rfe_mode, bins * 2, 1, packet_freq, spec_inv, usable_bins)
+    left_bin = usable_bins[0][0]
+    right_bin = usable_bins[-1][0] + usable_bins[-1][1]
+    span = packet_stop - packet_start
+    usable_start = float(span) * left_bin / bins + packet_start
+    usable_stop = float(span) * right_bin / bins + packet_start
+    return left_bin, right_bin, usable_start, usable_stop
+
+
+class SweepAssembly(object):
+    """
+    The precomputed placement of each step of a planned sweep in the
+    sweep result, created by :meth:`SweepPlanner.plan_assembly`.
+
+    .. attribute:: freqs
+
+       the center frequency the device tunes to for each step, *None*
+       for a DD mode step
+
+    .. attribute:: bins
+
+       the number of spectrum bins expected for each step
+
+    .. attribute:: slices
+
+       a dict mapping (step, spec_inv) to (source slice, result slice)
+
+    .. attribute:: tolerance
+
+       how far in Hz the frequency a packet reports may be from the
+       planned frequency of its step, as the device rounds frequencies
+       to its tuning resolution
+    """
+    def __init__(self, freqs, bins, slices, tolerance=0):
+        self.freqs = freqs
+        self.bins = bins
+        self.slices = slices
+        self.tolerance = tolerance
+
+    def lookup(self, step, packet_freq, bins, spec_inv):
+        """
+        Return (source slice, result slice) for the spectrum of sweep
+        step *step*, or *None* if the packet doesn't match the plan.
+        """
+        if step >= len(self.freqs) or bins != self.bins[step]:
+            return None
+        freq = self.freqs[step]
+        if freq is not None and abs(packet_freq - freq) > self.tolerance:
+            return None
+        return self.slices[(step, bool(spec_inv))]
+
+    def step_starts(self, spec_inv=False):
+        """
+        Return the index in the sweep result of the first bin placed by
+        each step, leaving out steps that place no bins
+        """
+        starts = []
+        for step in range(len(self.freqs)):
+            dst = self.slices[(step, bool(spec_inv))][1]
+            if dst.stop > dst.start:
+                starts.append(dst.start)
+        return sorted(starts)
+
+
 class SweepPlanner(object):
     """
     An object that plans a sweep based on  given paramaters.
@@ -255,13 +382,14 @@ class SweepPlanner(object):
         self.dev_properties = dev_prop
         self._prev_settings = SweepSettings()
 
-    def plan_sweep(self, fstart, fstop, rbw, mode, dev_settings = {}):
+    def plan_sweep(self, fstart, fstop, rbw, mode, dev_settings = {}, psd8=False):
         """
         Plan the sweep given the inputs
         """
 
         # initialize the sweep settings variable
         sweep_settings = SweepSettings()
+        sweep_settings.psd8 = psd8
 
         # assign the sweep mode and start/stop
         sweep_settings.rfe_mode = mode
@@ -356,9 +484,169 @@ class SweepPlanner(object):
         # calculate the expected number of spectral bins required for the SweepEntry
         sweep_settings.spectral_points = int(round((sweep_settings.bandstop - sweep_settings.bandstart) / sweep_settings.rbw))
 
+        sweep_settings.assembly = self.plan_assembly(sweep_settings)
+
         # return the sweep_settings
         return sweep_settings
 
+    def plan_assembly(self, sweep_settings):
+        """
+        Return a :class:`SweepAssembly` with the bins each step of the
+        planned sweep contributes to the result, or *None* if the steps
+        the device will capture can't be predicted.
+
+        The placement is the same as computed from each packet with
+        :func:`pyrf.util.compute_usable_bins`,
+        :func:`pyrf.util.adjust_usable_fstart_fstop` and :func:`copy_bins`.
+        """
+        prop = self.dev_properties
+        mode = sweep_settings.rfe_mode
+        spp = int(sweep_settings.spp)
+        # PSD8 I-only spectra have no Nyquist bin
+        nyquist = 0 if sweep_settings.psd8 else 1
+
+        # the frequencies and spectrum sizes of the sweep entries
+        # created by WSA.sweep_add, which sends integer frequencies
+        freqs = []
+        bins = []
+        if sweep_settings.dd_mode:
+            dd_spp = spp * 2 if mode == 'ZIF' else spp
+            freqs.append(None)
+            bins.append(dd_spp // 2 + nyquist)
+        if sweep_settings.beyond_dd:
+            if prop.DEFAULT_SAMPLE_TYPE.get(mode) == I_ONLY:
+                step_bins = spp // 2 + nyquist
+            else:
+                step_bins = spp
+            fstart = int(sweep_settings.fstart)
+            fstep = int(sweep_settings.fstep)
+            steps = int(round((sweep_settings.fstop - sweep_settings.fstart)
+                / sweep_settings.fstep)) + 1
+            freqs.extend(fstart + fstep * i for i in range(steps))
+            if sweep_settings.make_end_entry:
+                freqs.append(int(sweep_settings.end_entry_freq
+                    + round(sweep_settings.fstep / 2)))
+            bins.extend([step_bins] * (len(freqs) - len(bins)))
+        if len(freqs) != sweep_settings.step_count:
+            return None
+
+        bandstart = sweep_settings.bandstart
+        bandstop = sweep_settings.bandstop
+        points = sweep_settings.spectral_points
+        slices = {}
+        for step, (freq, step_bins) in enumerate(zip(freqs, bins)):
+            for spec_inv in (False, True):
+                if freq is None:
+                    offset = 0
+                    copied = copy_bins(0, prop.FULL_BW['DD'], step_bins,
+                        bandstart, bandstop, points)
+                else:
+                    left, right, usable_start, usable_stop = \
+                        usable_packet_range(prop, mode, spp, step_bins, freq,
+                            spec_inv)
+                    if left < 0 or right > step_bins:
+                        return None
+                    offset = left
+                    copied = copy_bins(usable_start, usable_stop,
+                        right - left, bandstart, bandstop, points)
+
+                src_start, src_stop, dst_start, dst_stop = copied
+                if dst_stop > dst_start and src_stop > src_start:
+                    slices[(step, spec_inv)] = (
+                        slice(offset + src_start, offset + src_stop),
+                        slice(dst_start, dst_stop))
+                else:
+                    slices[(step, spec_inv)] = (slice(0, 0), slice(0, 0))
+
+        return SweepAssembly(freqs, bins, slices, prop.TUNING_RESOLUTION)
+
+
+class SweepBufferPool(object):
+    """
+    A pool of preallocated arrays for sweep results of the same size.
+
+    :param int points: the number of points in each array
+    :param int count: the number of arrays kept in the pool
+    """
+    def __init__(self, points, count=2):
+        self.points = points
+        self.count = count
+        self._free = [np.zeros(points) for i in range(count)]
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Return a zeroed array from the pool.  A new array is allocated
+        when all the arrays in the pool are in use.
+        """
+        with self._lock:
+            data = self._free.pop() if self._free else None
+        if data is None:
+            return np.zeros(self.points)
+        data.fill(0)
+        return data
+
+    def release(self, data):
+        """
+        Return an array acquired from this pool
+        """
+        with self._lock:
+            if len(self._free) < self.count and len(data) == self.points:
+                self._free.append(data)
+
+
+class SweepResult(object):
+    """
+    The power spectrum of one sweep, stored in an array borrowed from a
+    :class:`SweepBufferPool`.  It can be used like the array returned
+    without a pool, e.g. with ``len()``, indexing or ``np.asarray()``.
+
+    The array belongs to the caller until :meth:`release` is called,
+    after which the sweep device may overwrite it with a later sweep.
+
+    :param float fstart: frequency of the first point, in Hz
+    :param float fstop: frequency of the last point, in Hz
+    :param data: numpy array of power values in dBm
+    :param pool: the pool *data* is returned to on release, or *None*
+    """
+    def __init__(self, fstart, fstop, data, pool=None):
+        self.fstart = fstart
+        self.fstop = fstop
+        self.data = data
+        self._pool = pool
+
+    @property
+    def frequencies(self):
+        """
+        The read-only frequency axis of this result, shared with all
+        results of the same size and frequency range
+        """
+        return frequency_axis(self.fstart, self.fstop, len(self.data))
+
+    def release(self):
+        """
+        Return the result's array to its pool.  The result must not be
+        used afterwards.
+        """
+        if self._pool is not None:
+            self._pool.release(self.data)
+            self._pool = None
+        self.data = None
+
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.data
+        return self.data.astype(dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def __iter__(self):
+        return iter(self.data)
+
 
 class SweepDevice(object):
     """
@@ -369,6 +657,10 @@ class SweepDevice(object):
                         typically a :class:`pyrf.devices.thinkrf.WSA` instance.
     :param async_callback: a callback to use for async operation (not used if
                      *real_device* is using a blocking :class:`PlainSocketConnector`)
+    :param int buffers: number of preallocated result arrays to reuse,
+                        or *None* to allocate a new array for each sweep.
+                        When set, the power data returned is a
+                        :class:`SweepResult` that must be released.
     """
     # keep track of the mode
     rfe_mode = None
@@ -402,7 +694,7 @@ class SweepDevice(object):
     nf_corr_obj = None
     _flattening_enabled = True
 
-    def __init__(self, real_device, async_callback=None):
+    def __init__(self, real_device, async_callback=None, buffers=None):
 
         # init log string
         self.logstr = ''
@@ -532,6 +824,18 @@ class SweepDevice(object):
 
         self.async_callback = async_callback
         self.continuous = False
+        self._trace = None
+        self._archive = None
+
+        # the trace format last set on the device, None if never set
+        self._trace_format = None
+
+        # IQ correction estimates for each step of recent sweeps
+        self._iq_corrections = IQCorrectionState(tunings=512)
+
+        # pool of result arrays, created for the size of the sweep
+        self._buffers = buffers
+        self._buffer_pool = None
 
         # init the sweep id
         self._next_sweep_id = 0
@@ -592,13 +896,30 @@ class SweepDevice(object):
         self._geo_callback_func = func
         self._geo_callback_data = data
 
+    def step_boundaries(self):
+        """
+        Return the index of the first bin of each sweep step in the
+        result of the last :meth:`capture_power_spectrum`, e.g. for
+        :func:`pyrf.numpy_util.noisefloor_profile`, or *None* if the
+        placement of the steps wasn't planned.
+        """
+        if self._sweep_settings is None:
+            return None
+        assembly = self._sweep_settings.assembly
+        if assembly is None:
+            return None
+        return assembly.step_starts()
+
     def capture_power_spectrum(self,
                                fstart,
                                fstop,
                                rbw,
                                device_settings=None,
                                mode='SH',
-                               continuous=False):
+                               continuous=False,
+                               trace=None,
+                               psd8=False,
+                               archive=None):
         """
         Initiate a data capture from the *real_device* by setting up a sweep list
         and starting a single sweep, and then return power spectral density data
@@ -614,6 +935,17 @@ class SweepDevice(object):
         :type device_settings: dict
         :param str mode: sweep mode, 'ZIF', 'SH', or 'SHN'
         :param bool continuous: set sweep to be continuously or not (once only)
+        :param trace: a :class:`pyrf.traces.TraceAccumulator` to combine
+                      sweeps with.  Sweeps are repeated until it emits a
+                      trace, which is returned as the power data.
+        :param bool psd8: have the device compute the spectrum of each
+                          step and send PSD8 bins, which are stitched
+                          without running an FFT on the host.
+                          Experimental, only for devices with the
+                          *PSD8_TRACE* property such as
+                          :class:`pyrf.sim.SimulatedRTSA`
+        :param archive: a :class:`pyrf.sweep_archive.SweepArchiveWriter`
+                        that every sweep returned is appended to
 
         :returns: fstart, fstop, power_data
         """
@@ -624,29 +956,38 @@ class SweepDevice(object):
             raise SweepDeviceError(
                 "continuous mode only applies to async operation")
 
+        if psd8 and not self.dev_properties.PSD8_TRACE:
+            raise SweepDeviceError(
+                "the experimental PSD8 trace format is only supported by "
+                "pyrf.sim.SimulatedRTSA")
+
         # see if the last sweep has finished
         if not self._last_finished:
             raise SweepDeviceError(
                 "previous sweep must have finished before starting a new one")
         self._last_finished = False
 
-        # increment the sweep id
-        if self._next_sweep_id < 0x00000000ffffffff:
-            self._next_sweep_id += 1
-        else:
-            self._next_sweep_id = 0
+        self._advance_sweep_id()
 
         # keep track if this is a continuous sweep
         self.continuous = continuous
+        self._trace = trace
+        self._archive = archive
 
         # plan the sweep
         self._sweep_planner = SweepPlanner(self.dev_properties)
-        self._sweep_settings = self._sweep_planner.plan_sweep(fstart, fstop, rbw, mode, device_settings)
+        self._sweep_settings = self._sweep_planner.plan_sweep(fstart, fstop, rbw, mode, device_settings, psd8)
         self.log("self._sweep_settings = %s" % self._sweep_settings)
 
         # remember our last sweep for optimization purposes
         self._last_sweep = (fstart, fstop, rbw, mode, device_settings, continuous)
 
+        # switch the trace format, leaving it alone unless PSD8 was used
+        trace_format = 'PSD8' if psd8 else 'SAMPLES'
+        if trace_format != (self._trace_format or 'SAMPLES'):
+            self.real_device.trace_format(trace_format)
+            self._trace_format = trace_format
+
         # configure the device with the sweep_settings
         self.real_device.sweep_clear()
         self.real_device.sweep_add(self._sweep_settings)
@@ -657,6 +998,12 @@ class SweepDevice(object):
         # capture the sweep data
         return self._perform_full_sweep()
 
+    def _advance_sweep_id(self):
+        if self._next_sweep_id < 0x00000000ffffffff:
+            self._next_sweep_id += 1
+        else:
+            self._next_sweep_id = 0
+
     def _perform_full_sweep(self):
 
         # perform the sweep using async socket
@@ -682,7 +1029,13 @@ class SweepDevice(object):
         self._vrt_context = {}
 
         # initialize the array we'll use to hold results
-        self.spectral_data = np.zeros(self._sweep_settings.spectral_points)
+        points = self._sweep_settings.spectral_points
+        if self._buffers:
+            if self._buffer_pool is None or self._buffer_pool.points != points:
+                self._buffer_pool = SweepBufferPool(points, self._buffers)
+            self.spectral_data = self._buffer_pool.acquire()
+        else:
+            self.spectral_data = np.zeros(points)
 
         # keep track of packets recieved
         self.packet_count = 0
@@ -703,6 +1056,11 @@ class SweepDevice(object):
                 func = self._geo_callback_func
                 func(self._geo_callback_data, geo)
 
+            # a new sweep started before this one was completed
+            if ('sweepid' in packet.fields and self.packet_count
+                    and not self._last_finished):
+                metrics.count('sweep.dropped')
+
             self._vrt_context.update(packet.fields)
             self.log(packet)
             return
@@ -713,6 +1071,7 @@ class SweepDevice(object):
 
         # make sure we are receiving packets for the right sweep
         if not (self._vrt_context['sweepid'] == self._next_sweep_id):
+            metrics.count('sweep.dropped')
             raise SweepDeviceError("data packets received before start of sweep received!  cur = %d, next = %d" % (self._vrt_context['sweepid'], self._next_sweep_id))
 
         # increment the packet count
@@ -723,62 +1082,51 @@ class SweepDevice(object):
         packet_freq = self._vrt_context['rffreq']
         usable_bw = self.dev_properties.USABLE_BW[self._sweep_settings.rfe_mode]
 
-        # compute the fft
-        pow_data = compute_fft(self.real_device, packet, self._vrt_context)
+        # compute the fft, unless the device already did
+        if packet.stream_id == VRT_IFDATA_PSD8:
+            pow_data = psd8_to_dbm(self.real_device, packet, self._vrt_context)
+        else:
+            correction = self._iq_corrections.lookup(packet_freq,
+                self._sweep_settings.rfe_mode,
+                self._sweep_settings.attenuation)
+            pow_data = compute_fft(self.real_device, packet, self._vrt_context,
+                iq_correction=correction)
 
         # calc rbw for this packet
         rbw = float(self.dev_properties.FULL_BW[self._sweep_settings.rfe_mode]) / len(pow_data)
         self.log("rbw = %f, %f" % (rbw, self._sweep_settings.rbw))
         if self._flattening_enabled:
-            # Check if we are above 50 MHz and in SH mode
-            if packet_freq >= 50e6 and self._sweep_settings.rfe_mode == "SH":
-                number_of_points = len(pow_data)
-                # check if we have correction vectors (Noise)
-                if self.nf_corr_obj is not None:
-                    # if so grab them
-                    nf_cal = \
-                            self.nf_corr_obj.get_correction_vector(packet_freq,
-                                                                   number_of_points)
-                else:
-                    # if no set it to 0
-                    nf_cal = np.zeros(number_of_points)
-
-                # check if we have corrrection vectors (Spectrum)
-                if self.sp_corr_obj is not None:
-                    # if so grab them
-                    sp_cal = \
-                            self.sp_corr_obj.get_correction_vector(packet_freq,
-                                                                   number_of_points)
-                else:
-                    # if not set it to 0
-                    sp_cal = np.zeros(number_of_points)
-
-                # if the data is spectraly inverted, invert the vectors
-                if packet.spec_inv:
-                    nf_cal = np.flipud(nf_cal)
-                    sp_cal = np.flipud(sp_cal)
-
-                # calculate the correction threshold
-                correction_thresh = (-135.0 + ((10.0 * packet_freq / 1e6)
-                                               / 27000.0) + 10.0
-                                     * np.log10(rbw)
-                                     + self._sweep_settings.attenuation)
-                # creat the spectrum. per bin, if the ampltitude is above
-                # correction threshold do pow_data - sp_cal else do pow_data -
-                # nf_cal
-                pow_data = np.where(pow_data < correction_thresh,
-                                    pow_data - nf_cal, pow_data - sp_cal)
+            with metrics.timer('sweep.flattening'):
+                pow_data = self._flatten(packet, packet_freq, rbw, pow_data)
+
+        # place the spectrum with the planned assembly if the packet
+        # matches the plan, otherwise work it out from the packet
+        placement = None
+        if self._sweep_settings.assembly is not None:
+            placement = self._sweep_settings.assembly.lookup(
+                self.packet_count - 1, packet_freq, len(pow_data),
+                packet.spec_inv)
+        if placement is not None:
+            src, dst = placement
+            with metrics.timer('sweep.copy'):
+                self.spectral_data[dst] = pow_data[src]
+        else:
+            self._stitch(packet, packet_freq, pow_data)
 
+        # if there's no more packets, emit result
+        if self.packet_count == self._sweep_settings.step_count:
+            return self._emit_data()
+
+        # all done
+        return
+
+    def _stitch(self, packet, packet_freq, pow_data):
         # check if DD mode was used in this sweep
         if self.packet_count == 1 and self._sweep_settings.dd_mode:
             # copy the data into the result array
-            self._copy_data(0, self.dev_properties.FULL_BW['DD'], pow_data, self._sweep_settings.bandstart, self._sweep_settings.bandstop, self.spectral_data);
-
-            if self._sweep_settings.beyond_dd:
-                return
-            else:
-                return self._emit_data()
-
+            with metrics.timer('sweep.copy'):
+                self._copy_data(0, self.dev_properties.FULL_BW['DD'], pow_data, self._sweep_settings.bandstart, self._sweep_settings.bandstop, self.spectral_data);
+            return
 
         # determine the usable bins in this config
         self.log("===> compute_usable_bins()", self._sweep_settings.rfe_mode, self._sweep_settings.spp, 1, 0)
@@ -817,81 +1165,106 @@ class SweepDevice(object):
         self.log("<--- trim_to_usable_fstart_fstop", usable_start, usable_stop, "trimmed_spectrum", edge_data)
 
         # copy the data
-        self._copy_data(usable_start, usable_stop, trimmed_spectrum, self._sweep_settings.bandstart, self._sweep_settings.bandstop, self.spectral_data);
-
-        # if there's no more packets, emit result
-        if self.packet_count == self._sweep_settings.step_count:
-            return self._emit_data()
-
-        # all done
-        return
-
+        with metrics.timer('sweep.copy'):
+            self._copy_data(usable_start, usable_stop, trimmed_spectrum, self._sweep_settings.bandstart, self._sweep_settings.bandstop, self.spectral_data);
+
+
+    def _flatten(self, packet, packet_freq, rbw, pow_data):
+        # Check if we are above 50 MHz and in SH mode
+        if packet_freq >= 50e6 and self._sweep_settings.rfe_mode == "SH":
+            number_of_points = len(pow_data)
+            # check if we have correction vectors (Noise)
+            if self.nf_corr_obj is not None:
+                # if so grab them
+                nf_cal = \
+                        self.nf_corr_obj.get_correction_vector(packet_freq,
+                                                               number_of_points)
+            else:
+                # if no set it to 0
+                nf_cal = np.zeros(number_of_points)
+
+            # check if we have corrrection vectors (Spectrum)
+            if self.sp_corr_obj is not None:
+                # if so grab them
+                sp_cal = \
+                        self.sp_corr_obj.get_correction_vector(packet_freq,
+                                                               number_of_points)
+            else:
+                # if not set it to 0
+                sp_cal = np.zeros(number_of_points)
+
+            # if the data is spectraly inverted, invert the vectors
+            if packet.spec_inv:
+                nf_cal = np.flipud(nf_cal)
+                sp_cal = np.flipud(sp_cal)
+
+            # calculate the correction threshold
+            correction_thresh = (-135.0 + ((10.0 * packet_freq / 1e6)
+                                           / 27000.0) + 10.0
+                                 * np.log10(rbw)
+                                 + self._sweep_settings.attenuation)
+            # creat the spectrum. per bin, if the ampltitude is above
+            # correction threshold do pow_data - sp_cal else do pow_data -
+            # nf_cal
+            pow_data = np.where(pow_data < correction_thresh,
+                                pow_data - nf_cal, pow_data - sp_cal)
+        return pow_data
 
     def _emit_data(self):
 
         # note that we finished this sweep
         self._last_finished = True
+        metrics.count('sweep.completed')
+
+        if self._trace is not None:
+            with metrics.timer('sweep.trace'):
+                trace = self._trace.update(self.spectral_data)
+            if trace is None:
+                # sweep again until the trace is emitted
+                self._release_spectral_data()
+                self._last_finished = False
+                self._advance_sweep_id()
+                self._start_sweep()
+                return
+            self.spectral_data[:] = trace
+
+        with metrics.timer('sweep.emit'):
+            return self._emit_sweep()
+
+    def _release_spectral_data(self):
+        if self._buffers:
+            self._buffer_pool.release(self.spectral_data)
+
+    def _emit_sweep(self):
+
+        data = self.spectral_data
+        if self._archive is not None:
+            with metrics.timer('sweep.archive'):
+                self._archive.add(self._sweep_settings.bandstart,
+                    self._sweep_settings.bandstop, data, metadata={
+                        'rfe_mode': self._sweep_settings.rfe_mode,
+                        'rbw': self._sweep_settings.rbw,
+                        'device_id': getattr(self.real_device, 'device_id',
+                            None)})
+        if self._buffers:
+            data = SweepResult(self._sweep_settings.bandstart,
+                self._sweep_settings.bandstop, data, self._buffer_pool)
 
         # if async callback is available, emit the data
         if self.async_callback:
 
-            self.async_callback(self._sweep_settings.bandstart, self._sweep_settings.bandstop, self.spectral_data)
+            self.async_callback(self._sweep_settings.bandstart, self._sweep_settings.bandstop, data)
             return
         # return the values if using blocking sockets
         else:
-            return (self._sweep_settings.bandstart, self._sweep_settings.bandstop, self.spectral_data)
+            return (self._sweep_settings.bandstart, self._sweep_settings.bandstop, data)
 
 
     def _copy_data(self, src_fstart, src_fstop, src_psd, dst_fstart, dst_fstop, dst_psd):
         self.log("_copy_data(%d, %d, src_psd, %d, %d, dst_psd)" % (src_fstart, src_fstop, dst_fstart, dst_fstop))
 
-        # calc src len and dst len
-        srclen = len(src_psd)
-        dstlen = len(dst_psd)
-        self.log("len -- src = %d, dst = %d" % (srclen, dstlen))
-
-        # calc src and dest rbw
-        srcrbw = float(src_fstop - src_fstart) / srclen
-        dstrbw = float(dst_fstop - dst_fstart) / dstlen
-        self.log("rbw = %f, %f, %f" % (srcrbw, dstrbw, self._sweep_settings.rbw))
-
-        # check if packet start is before sweep start.  shouldn't happen, but check anyway
-        self.log("boundary(start) = %f / %f" % (src_fstart, dst_fstart))
-        if src_fstart < dst_fstart:
-            self.log("foo")
-            src_start_bin = int(float(dst_fstart - src_fstart) / srcrbw)
-        else:
-            self.log("bar")
-            src_start_bin = 0
-
-        # check if packet stop is after sweep stop.  this means we don't need the whole packet
-        self.log("boundary(stop) = %f / %f" % (src_fstop, dst_fstop))
-        if src_fstop > dst_fstop:
-            self.log("foo")
-            src_stop_bin = srclen - int(float(src_fstop - dst_fstop) / srcrbw)
-        else:
-            self.log("bar")
-            src_stop_bin = srclen
-
-        # how many values are we copying?
-        tocopy = src_stop_bin - src_start_bin
-
-        # calculate dest start index
-        if src_fstart < dst_fstart:
-            dst_start_bin = 0
-        else:
-            dst_start_bin = int(round(float(src_fstart - dst_fstart) / dstrbw))
-
-        # calculate dest stop index
-        dst_stop_bin = dst_start_bin + tocopy
-        if dst_stop_bin > dstlen:
-            dst_stop_bin = dstlen
-
-            # adjust tocopy
-            tocopy = dst_stop_bin - dst_start_bin
-
-            # adjust src stop bin because we adjusted tocopy
-            src_stop_bin = src_start_bin + tocopy
+        src_start_bin, src_stop_bin, dst_start_bin, dst_stop_bin = copy_bins(
+            src_fstart, src_fstop, len(src_psd), dst_fstart, dst_fstop, len(dst_psd))
 
         # copy the data, if there's data that needs copying
         if ((dst_stop_bin - dst_start_bin) > 0) and ((src_stop_bin - src_start_bin) > 0):
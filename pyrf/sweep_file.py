@@ -0,0 +1,248 @@
+"""
+A compact binary container for sweeps, and a converter from the RTSA
+CSV format read by :class:`pyrf.csv_reader.CSVReader`::
+
+    from pyrf.sweep_file import SweepFileWriter, SweepFileReader
+    with SweepFileWriter('sweeps.pyrfs', device_id, dtype='int16') as f:
+        f.add(fstart, fstop, pow_data, mode='SH')
+
+    for sweep in SweepFileReader('sweeps.pyrfs'):
+        print sweep.timestamp, sweep.fstart, sweep.fstop, len(sweep.data)
+
+Unlike a :mod:`pyrf.sweep_archive` archive, each sweep can have its own
+mode, frequency range and number of points.
+
+The file starts with :data:`FILE_MAGIC`, a little-endian 32-bit length
+and a JSON object holding the ``device_id``, the int16 ``quantum`` and
+any other metadata.  Sweeps follow in chunks of up to *chunk_sweeps*
+records, each chunk a :data:`CHUNK_HEADER` followed by its payload:
+the table of the chunk's records (mode, fstart, fstop, points,
+timestamp), then the power values of every record in order, either
+float32 or int16 counts of *quantum* dB.  The payload of each chunk is
+optionally zlib compressed.  Reading stops at a chunk cut short, so a
+file left by a crashed writer can still be read.
+"""
+
+import json
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from pyrf.csv_reader import CSVReader
+
+FILE_MAGIC = b'PYRFSWB1'
+
+#: chunk tag, codec, power dtype, number of records, payload bytes
+CHUNK_HEADER = struct.Struct('<4sBBxxII')
+CHUNK_TAG = b'CHNK'
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+
+DTYPES = {
+    'float32': (0, np.dtype('<f4')),
+    'int16': (1, np.dtype('<i2')),
+    }
+
+RECORD_DTYPE = np.dtype([('mode', 'S8'), ('fstart', '<f8'),
+    ('fstop', '<f8'), ('points', '<u4'), ('timestamp', '<f8')])
+
+#: a sweep read from a sweep file, *data* being its power in dBm
+SweepRecord = namedtuple('SweepRecord', 'mode fstart fstop timestamp data')
+
+
+class SweepFileError(Exception):
+    pass
+
+
+class SweepFileWriter(object):
+    """
+    Write sweeps to a binary sweep file
+
+    :param output: file name or binary file object
+    :param str device_id: the ``*IDN?`` response of the device
+    :param str dtype: 'float32' or 'int16' to store power values
+                      rounded to *quantum* dB, from -327.68 to +327.67
+                      dBm with the default *quantum*
+    :param bool compress: zlib compress each chunk
+    :param int chunk_sweeps: number of sweeps in each chunk
+    :param float quantum: dB per count of int16 power values
+    :param dict metadata: more values to store in the file header
+    """
+    def __init__(self, output, device_id='', dtype='float32', compress=True,
+            chunk_sweeps=64, quantum=0.01, metadata=None):
+        if dtype not in DTYPES:
+            raise ValueError("unknown sweep file dtype %r" % (dtype,))
+        self._dtype_code, self._dtype = DTYPES[dtype]
+        self._codec = CODEC_ZLIB if compress else CODEC_NONE
+        self.chunk_sweeps = chunk_sweeps
+        self.quantum = quantum
+        self.count = 0
+        self._records = []
+        self._data = []
+
+        if hasattr(output, 'write'):
+            self._file = output
+            self._close_file = False
+        else:
+            self._file = open(output, 'wb')
+            self._close_file = True
+
+        header = dict(metadata or {})
+        header.update(device_id=device_id.strip(), quantum=quantum)
+        encoded = json.dumps(header, sort_keys=True).encode('utf-8')
+        self._file.write(FILE_MAGIC + struct.pack('<I', len(encoded))
+            + encoded)
+
+    def add(self, fstart, fstop, data, mode='', timestamp=None):
+        """
+        Add a sweep, with the arguments of a
+        :class:`pyrf.sweep_device.SweepDevice` async callback
+
+        :param float fstart: frequency of the first point, in Hz
+        :param float fstop: frequency of the last point, in Hz
+        :param data: power spectrum in dBm
+        :param str mode: RFE mode of the sweep
+        :param float timestamp: UNIX time of the sweep, the current time
+                                by default
+        """
+        data = np.asarray(data, dtype=float)
+        if self._dtype.kind == 'i':
+            data = np.clip(np.round(data / self.quantum), -32768, 32767)
+        self._data.append(data.astype(self._dtype))
+        self._records.append((mode.encode('ascii'), fstart, fstop, len(data),
+            time.time() if timestamp is None else timestamp))
+        self.count += 1
+        if len(self._records) >= self.chunk_sweeps:
+            self.flush()
+
+    __call__ = add
+
+    def flush(self):
+        """
+        Write the sweeps added so far as a chunk
+        """
+        if not self._records:
+            return
+        table = np.array(self._records, dtype=RECORD_DTYPE)
+        payload = table.tobytes() + b''.join(d.tobytes() for d in self._data)
+        if self._codec == CODEC_ZLIB:
+            payload = zlib.compress(payload)
+        self._file.write(CHUNK_HEADER.pack(CHUNK_TAG, self._codec,
+            self._dtype_code, len(table), len(payload)) + payload)
+        self._file.flush()
+        self._records = []
+        self._data = []
+
+    def close(self):
+        """
+        Write any remaining sweeps and close the file if it was opened by
+        this writer
+        """
+        self.flush()
+        if self._close_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SweepFileReader(object):
+    """
+    Read the sweeps of a binary sweep file one chunk at a time
+
+    :param recording: file name or binary file object
+    :raises SweepFileError: if the file isn't a sweep file
+    """
+    def __init__(self, recording):
+        if hasattr(recording, 'read'):
+            self._file = recording
+        else:
+            self._file = open(recording, 'rb')
+        head = self._file.read(len(FILE_MAGIC) + 4)
+        if len(head) < len(FILE_MAGIC) + 4 or not head.startswith(FILE_MAGIC):
+            raise SweepFileError("not a sweep file")
+        length, = struct.unpack('<I', head[len(FILE_MAGIC):])
+        self.metadata = json.loads(self._file.read(length).decode('utf-8'))
+        self.device_id = self.metadata.get('device_id', '')
+        self._first_chunk = self._file.tell()
+
+    def chunks(self):
+        """
+        Iterate over the chunks of the file from the start, as lists of
+        :class:`SweepRecord`
+        """
+        quantum = self.metadata.get('quantum', 1.0)
+        dtype_codes = dict((code, dtype) for code, dtype in DTYPES.values())
+        self._file.seek(self._first_chunk)
+        while True:
+            head = self._file.read(CHUNK_HEADER.size)
+            if len(head) < CHUNK_HEADER.size:
+                return
+            tag, codec, dtype_code, count, length = CHUNK_HEADER.unpack(head)
+            if tag != CHUNK_TAG:
+                raise SweepFileError("bad chunk header")
+            payload = self._file.read(length)
+            if len(payload) < length:
+                # cut short by a crashed writer
+                return
+            if codec == CODEC_ZLIB:
+                payload = zlib.decompress(payload)
+            elif codec != CODEC_NONE:
+                raise SweepFileError("unknown chunk codec %d" % codec)
+
+            table = np.frombuffer(payload, dtype=RECORD_DTYPE, count=count)
+            dtype = dtype_codes[dtype_code]
+            values = np.frombuffer(payload, dtype=dtype,
+                offset=table.nbytes)
+            if dtype.kind == 'i':
+                values = values * quantum
+            else:
+                values = values.astype(float)
+
+            chunk = []
+            start = 0
+            for record in table:
+                stop = start + int(record['points'])
+                chunk.append(SweepRecord(record['mode'].decode('ascii'),
+                    float(record['fstart']), float(record['fstop']),
+                    float(record['timestamp']), values[start:stop]))
+                start = stop
+            yield chunk
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            for sweep in chunk:
+                yield sweep
+
+    def close(self):
+        self._file.close()
+
+
+def csv_to_sweep_file(csv_name, output, **kwargs):
+    """
+    Convert an RTSA CSV file to a binary sweep file.  Timestamps that
+    aren't numbers are stored as NaN.
+
+    :param str csv_name: the CSV file
+    :param output: file name or binary file object to write
+    :param kwargs: more :class:`SweepFileWriter` arguments
+    :returns: the number of sweeps converted
+    """
+    reader = CSVReader(csv_name)
+    reader.open_csv()
+    try:
+        writer = SweepFileWriter(output, reader.device_id, **kwargs)
+        for index, (fstart, fstop, pow_data) in enumerate(reader):
+            writer.add(fstart, fstop, pow_data, mode=reader.modes[index],
+                timestamp=reader.times[index])
+        writer.close()
+    finally:
+        reader.close_csv()
+    return writer.count
@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+
+from pyrf.util import BlockAssembler
+from pyrf.vrt import DataPacket, VRT_IFDATA_I14Q14, VRT_IFDATA_I14
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.capture_device import CaptureDevice
+from pyrf.units import M
+
+
+def iq_packet(count, values, spp=4):
+    samples = np.array([[v, -v] for v in values], dtype='>i2')
+    assert len(samples) == spp
+    return DataPacket(count, 0, VRT_IFDATA_I14Q14, 0, 0, samples.tobytes(), 0)
+
+
+class TestBlockAssembler(unittest.TestCase):
+    def test_block(self):
+        assembler = BlockAssembler(4, 3)
+        self.assertFalse(assembler.add(iq_packet(15, [1, 2, 3, 4])))
+        self.assertFalse(assembler.add(iq_packet(0, [5, 6, 7, 8])))
+        self.assertTrue(assembler.add(iq_packet(1, [9, 10, 11, 12])))
+
+        block = assembler.packet().data.numpy_array()
+        self.assertEqual(block.shape, (12, 2))
+        self.assertEqual(list(block[:, 0]), list(range(1, 13)))
+        self.assertEqual(list(block[:, 1]), list(range(-1, -13, -1)))
+        self.assertEqual((assembler.lost, assembler.mismatched), (0, 0))
+
+    def test_lost_and_mismatched(self):
+        assembler = BlockAssembler(4, 4)
+        assembler.add(iq_packet(3, [1, 1, 1, 1]))
+        # packet 4 is lost
+        self.assertFalse(assembler.add(iq_packet(5, [3, 3, 3, 3])))
+        i_only = DataPacket(6, 0, VRT_IFDATA_I14, 0, 0, b'\0' * 16, 0)
+        self.assertTrue(assembler.add(i_only))
+
+        self.assertEqual((assembler.lost, assembler.mismatched), (1, 1))
+        block = assembler.packet().data.numpy_array()
+        self.assertEqual(list(block[:, 0]), [1] * 4 + [0] * 4 + [3] * 4
+            + [0] * 4)
+
+        assembler.reset()
+        self.assertEqual((assembler.lost, assembler.mismatched), (0, 0))
+
+    def test_lost_last_packets(self):
+        assembler = BlockAssembler(4, 3)
+        assembler.add(iq_packet(0, [1, 1, 1, 1]))
+        # a gap larger than the rest of the block completes it
+        self.assertTrue(assembler.add(iq_packet(9, [2, 2, 2, 2])))
+        self.assertEqual(assembler.lost, 2)
+        # the packet revealing the gap is dropped, not carried over
+        block = assembler.packet().data.numpy_array()
+        self.assertEqual(list(block[:, 0]), [1] * 4 + [0] * 8)
+        assembler.reset()
+        self.assertFalse(assembler.add(iq_packet(10, [3, 3, 3, 3])))
+        self.assertEqual(assembler.slots, 1)
+        self.assertEqual(assembler.lost, 0)
+
+    def test_place(self):
+        assembler = BlockAssembler(4, 3)
+        self.assertEqual(assembler.place(iq_packet(0, [1, 1, 1, 1])), 0)
+        # packet 1 is lost
+        self.assertEqual(assembler.place(iq_packet(2, [2, 2, 2, 2])), 2)
+        self.assertTrue(assembler.complete())
+        self.assertEqual((assembler.lost, assembler.mismatched), (1, 0))
+
+    def test_cached_samples_replaced(self):
+        assembler = BlockAssembler(4, 2)
+        first = iq_packet(0, [1, 2, 3, 4])
+        first.samples()
+        assembler.add(first)
+        assembler.add(iq_packet(1, [5, 6, 7, 8]))
+        samples = assembler.packet().samples()
+        self.assertEqual(len(samples), 8)
+        self.assertEqual(samples[7], (8 - 8j) / 8192.0)
+
+    def test_single_packet(self):
+        assembler = BlockAssembler(4, 1)
+        packet = iq_packet(0, [1, 2, 3, 4])
+        samples = packet.data.numpy_array()
+        self.assertTrue(assembler.add(packet))
+        # a single packet is used without copying
+        self.assertTrue(assembler.packet().data.numpy_array() is samples)
+
+
+class TestCaptureDeviceBlocks(unittest.TestCase):
+    def test_multi_packet_capture(self):
+        sim = SimulatedRTSA(seed=0)
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            cd = CaptureDevice(dut)
+            # more points than fit in one packet
+            fstart, fstop, data = cd.capture_time_domain('ZIF', 2400 * M,
+                100e6 / 65536)
+            dut.disconnect()
+        finally:
+            sim.stop()
+
+        self.assertTrue(cd.packets_per_block > 1)
+        self.assertEqual(len(data['data_pkt'].data.numpy_array()),
+            cd.points * cd.packets_per_block)
+        self.assertEqual(data['lost_packets'], 0)
+        self.assertEqual(data['mismatched_packets'], 0)
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import calculate_channel_power, channel_power_table
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+
+
+class TestChannelPowerTable(unittest.TestCase):
+    def setUp(self):
+        # bins every 1 kHz from 0 to 999 kHz
+        state = np.random.RandomState(0)
+        self.spectrum = state.normal(-100, 3, 1000)
+        self.spectrum[500:520] = -40
+
+    def test_matches_calculate_channel_power(self):
+        centers = 5e3 + 10e3 * np.arange(100)
+        table = channel_power_table(self.spectrum, 0, 999e3, centers, 10e3)
+        self.assertEqual(table.acpr, None)
+        self.assertEqual(len(table.power), 100)
+        for channel, power in enumerate(table.power):
+            expected = calculate_channel_power(
+                self.spectrum[channel * 10:channel * 10 + 10])
+            self.assertAlmostEqual(power, expected)
+
+    def test_bandwidths_and_edges(self):
+        table = channel_power_table(self.spectrum, 0, 999e3,
+            [510e3, 995e3, 2e6], [20e3, 20e3, 10e3])
+        self.assertAlmostEqual(table.power[0],
+            calculate_channel_power(self.spectrum[500:520]))
+        # cut short at the end of the spectrum
+        self.assertAlmostEqual(table.power[1],
+            calculate_channel_power(self.spectrum[985:]))
+        self.assertEqual(table.power[2], -np.inf)
+
+    def test_acpr(self):
+        table = channel_power_table(self.spectrum, 0, 999e3, 510e3, 20e3,
+            adjacent=[-20e3, 20e3, 600e3])
+        self.assertEqual(table.acpr.shape, (1, 3))
+        lower = calculate_channel_power(self.spectrum[480:500])
+        upper = calculate_channel_power(self.spectrum[520:540])
+        self.assertAlmostEqual(table.acpr[0, 0], lower - table.power[0])
+        self.assertAlmostEqual(table.acpr[0, 1], upper - table.power[0])
+        self.assertEqual(table.acpr[0, 2], -np.inf)
+
+
+class TestSweepChannelPower(unittest.TestCase):
+    def test_sweep(self):
+        sim = SimulatedRTSA(tones=[(2420 * M, -30)], seed=0)
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            sd = SweepDevice(dut)
+            fstart, fstop, pow_data = sd.capture_power_spectrum(2400 * M,
+                2500 * M, 100e3, {'attenuator': 0}, mode='SH')
+            dut.disconnect()
+        finally:
+            sim.stop()
+
+        centers = 2410 * M + 10 * M * np.arange(8)
+        table = channel_power_table(pow_data, fstart, fstop, centers,
+            10 * M, adjacent=[-10 * M, 10 * M])
+        self.assertEqual(np.argmax(table.power), 1)
+        self.assertAlmostEqual(table.power[1], -30, delta=2)
+        # the neighbours of the tone's channel only hold noise
+        self.assertTrue(np.all(table.acpr[1] < -40))
+        self.assertTrue(np.all(table.acpr[[0, 2], [1, 0]] > 40))
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyrf import csv_reader
+from pyrf.csv_reader import CSVReader
+
+DEVICE_ID = 'ThinkRF,R5500-408 v1,000000-000,1.5.0'
+
+
+def write_csv(filename, sweeps, eof=True):
+    """
+    Write (mode, start, stop, timestamp, values) sweeps in the RTSA CSV
+    layout, where the points field counts one more than the values
+    """
+    with open(filename, 'w') as f:
+        f.write('# sweeps\n%s\n' % DEVICE_ID)
+        f.write('Sweep,Mode,Start,Stop,Points,Timestamp\n')
+        for i, (mode, start, stop, timestamp, values) in enumerate(sweeps):
+            f.write('%d,%s,%r,%r,%d,%s\n' % (i, mode, start, stop,
+                len(values) + 1, timestamp))
+            for value in values:
+                f.write('%r\n' % float(value))
+        if eof:
+            f.write('EOF\n')
+
+
+class TestCSVReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp, 'sweeps.csv')
+        state = np.random.RandomState(0)
+        self.sweeps = [('SH', 2400e6 + i, 2500e6, 1000.5 + i,
+            state.normal(-100, 3, 20 + i).tolist()) for i in range(6)]
+        write_csv(self.filename, self.sweeps)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_sequential(self):
+        reader = CSVReader(self.filename)
+        reader.open_csv()
+        self.assertEqual(reader.device_id.strip(), DEVICE_ID)
+        self.assertEqual(len(reader), 6)
+        # rewinds after the last sweep
+        for mode, start, stop, timestamp, values in self.sweeps * 2:
+            fstart, fstop, pow_data = reader.read_data()
+            self.assertEqual((fstart, fstop), (start, stop))
+            self.assertEqual(list(pow_data), values)
+            self.assertEqual(float(reader.time_stamp), timestamp)
+        reader.close_csv()
+        self.assertEqual(reader.read_data(), (0, 0, [0, 0]))
+
+        received = []
+        reader = CSVReader(self.filename,
+            async_callback=lambda *args: received.append(args))
+        reader.open_csv()
+        reader.read_data()
+        self.assertEqual(received[0][0], 2400e6)
+
+    def test_random_access(self):
+        reader = CSVReader(self.filename)
+        reader.open_csv()
+        self.assertEqual(list(reader.read_sweep(4)[2]), self.sweeps[4][4])
+        reader.seek(3)
+        self.assertEqual(reader.read_data()[0], 2400e6 + 3)
+        self.assertRaises(IndexError, reader.seek, 6)
+        self.assertEqual([len(p) for s, e, p in reader],
+            list(range(20, 26)))
+        self.assertEqual(list(reader.time_range(1001, 1003)), [1, 2])
+        self.assertEqual(list(reader.time_range(1004)), [4, 5])
+        self.assertEqual(list(reader.modes), ['SH'] * 6)
+        self.assertEqual(list(reader.points), list(range(21, 27)))
+
+    def test_chunks_and_cache(self):
+        original = csv_reader.INDEX_CHUNK
+        csv_reader.INDEX_CHUNK = 7
+        try:
+            reader = CSVReader(self.filename, cache_index=True)
+            reader.open_csv()
+        finally:
+            csv_reader.INDEX_CHUNK = original
+        self.assertEqual(len(reader), 6)
+        self.assertTrue(os.path.exists(self.filename + '.idx.npz'))
+        offsets = reader._offsets
+
+        cached = CSVReader(self.filename, cache_index=True)
+        cached.open_csv()
+        self.assertEqual(list(cached._offsets), list(offsets))
+        self.assertEqual(list(cached.read_sweep(5)[2]), self.sweeps[5][4])
+
+        # a changed file is indexed again
+        write_csv(self.filename, self.sweeps[:2], eof=False)
+        cached = CSVReader(self.filename, cache_index=True)
+        cached.open_csv()
+        self.assertEqual(len(cached), 2)
+        self.assertEqual(list(cached.read_sweep(1)[2]), self.sweeps[1][4])
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+from pyrf.vrt import (DataPacket, VRT_IFDATA_I14Q14, VRT_IFDATA_I14,
+    VRT_IFDATA_I24, VRT_IFDATA_PSD8)
+from pyrf.numpy_util import calibrate_time_domain, _decode_data_pkts
+
+
+class TestDataPacketSamples(unittest.TestCase):
+    def test_iq(self):
+        payload = np.array([[4096, -8192], [0, 2048]], dtype='>i2').tobytes()
+        packet = DataPacket(0, 0, VRT_IFDATA_I14Q14, 0, 0, payload, 0)
+        samples = packet.samples()
+        self.assertEqual(samples.dtype, np.complex128)
+        self.assertEqual(list(samples), [0.5 - 1j, 0.25j])
+        # decoded once and shared
+        self.assertTrue(packet.samples() is samples)
+        self.assertRaises(ValueError, samples.__setitem__, 0, 0)
+
+        single = packet.samples(np.float32)
+        self.assertEqual(single.dtype, np.complex64)
+        self.assertEqual(list(single), [0.5 - 1j, 0.25j])
+
+        i_data, q_data, stream_id, spec_inv = _decode_data_pkts(packet)
+        self.assertEqual(list(i_data), [0.5, 0])
+        self.assertEqual(list(q_data), [-1, 0.25])
+
+    def test_i_only(self):
+        packet = DataPacket(0, 0, VRT_IFDATA_I14, 0, 0,
+            np.array([-4096, 8191], dtype='>i2').tobytes(), 0)
+        self.assertEqual(list(packet.samples()), [-0.5, 8191 / 8192.0])
+        packet = DataPacket(0, 0, VRT_IFDATA_I24, 0, 0,
+            np.array([2 ** 22, -2 ** 23], dtype='>i4').tobytes(), 0)
+        self.assertEqual(list(packet.samples()), [0.5, -1])
+
+        psd8 = DataPacket(0, 0, VRT_IFDATA_PSD8, 0, 0, b'\0' * 4, 0)
+        self.assertRaises(ValueError, psd8.samples)
+
+    def test_calibrate_time_domain(self):
+        state = np.random.RandomState(0)
+        payload = state.randint(-4096, 4096, (256, 2)).astype('>i2')
+        packet = DataPacket(0, 0, VRT_IFDATA_I14Q14, 0, 0,
+            payload.tobytes(), 0)
+        volts = calibrate_time_domain(np.zeros(256), packet)
+        iq = (payload[:, 0] + 1j * payload[:, 1]) / 8192.0
+        self.assertTrue(np.allclose(volts / (iq - iq.mean()),
+            volts[0] / (iq[0] - iq.mean())))
@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+
+from pyrf.ddc import DDC, lowpass_taps
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.units import M
+
+RATE = 100 * M
+
+
+def tone(freq, count, amplitude=1.0):
+    return amplitude * np.exp(2j * np.pi * freq / RATE * np.arange(count))
+
+
+def peak_freq(samples, rate):
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft(samples)))
+    return (np.argmax(spectrum) - len(samples) // 2) * rate / len(samples)
+
+
+class TestDDC(unittest.TestCase):
+    def setUp(self):
+        self.samples = tone(-20.1 * M, 40000) + tone(30.2 * M, 40000, 0.5)
+
+    def test_channels(self):
+        ddc = DDC(RATE, [-20 * M, 30 * M, 0], decimation=20)
+        self.assertEqual(ddc.output_rate, 5 * M)
+        out = ddc.process(self.samples)
+        self.assertEqual(out.shape, (3, 2000))
+        self.assertEqual(out.dtype, np.complex128)
+
+        # skip the filter's start up
+        settled = out[:, 100:]
+        self.assertAlmostEqual(peak_freq(settled[0], 5 * M), -0.1 * M,
+            delta=5e3)
+        self.assertAlmostEqual(peak_freq(settled[1], 5 * M), 0.2 * M,
+            delta=5e3)
+        self.assertTrue(np.allclose(np.abs(settled[0]), 1, atol=1e-3))
+        self.assertTrue(np.allclose(np.abs(settled[1]), 0.5, atol=1e-3))
+        # neither tone is in the channel at the center
+        self.assertTrue(np.max(np.abs(settled[2])) < 1e-3)
+
+    def test_chunks(self):
+        whole = DDC(RATE, [-20 * M, 30 * M], decimation=7).process(
+            self.samples)
+        ddc = DDC(RATE, [-20 * M, 30 * M], decimation=7)
+        chunks = [ddc.process(self.samples[start:start + size])
+            for start, size in ((0, 3), (3, 1000), (1003, 5),
+                (1008, 38992))]
+        self.assertTrue(np.allclose(np.concatenate(chunks, axis=1), whole))
+
+        # a filter shorter than the decimation
+        short = DDC(RATE, [0], decimation=4, taps=[0.5, 0.5])
+        out = np.concatenate([short.process(self.samples[start:start + 3])
+            for start in range(0, 12, 3)], axis=1)
+        expected = (self.samples[0:12:4] + np.concatenate(
+            ([0], self.samples[3:12:4][:-1]))) / 2
+        self.assertTrue(np.allclose(out[0], expected))
+
+        ddc.reset()
+        self.assertTrue(np.allclose(ddc.process(self.samples), whole))
+        self.assertEqual(ddc.process(self.samples[:1].astype(np.complex64)
+            ).dtype, np.complex64)
+
+    def test_lowpass_taps(self):
+        taps = lowpass_taps(101, 0.1)
+        self.assertAlmostEqual(np.sum(taps), 1)
+        response = np.abs(np.fft.rfft(taps, 1000))
+        self.assertTrue(np.all(response[:50] > 0.99))
+        self.assertTrue(np.all(response[200:] < 1e-3))
+        self.assertRaises(ValueError, DDC, RATE, [0], 0)
+
+
+class TestCaptureDDC(unittest.TestCase):
+    def test_packets(self):
+        sim = SimulatedRTSA(tones=[(2450 * M, -30), (2410 * M, -30)],
+            seed=0)
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            dut.rfe_mode('ZIF')
+            dut.freq(2440 * M)
+            # the packets of one block capture are contiguous
+            dut.capture(1280, 4)
+            packets = []
+            while len(packets) < 4:
+                packet = dut.read()
+                if packet.is_data_packet():
+                    packets.append(packet)
+            rate = dut.properties.FULL_BW['ZIF']
+            dut.disconnect()
+        finally:
+            sim.stop()
+
+        ddc = DDC(rate, [10.1 * M, -30 * M], decimation=25)
+        out = np.concatenate([ddc.process_packet(p) for p in packets],
+            axis=1)
+        samples = 4 * len(packets[0].samples())
+        self.assertEqual(out.shape[1], (samples + 24) // 25)
+        self.assertAlmostEqual(peak_freq(out[0, 40:], ddc.output_rate),
+            -0.1 * M, delta=20e3)
+        self.assertAlmostEqual(peak_freq(out[1, 40:], ddc.output_rate),
+            0, delta=20e3)
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from pyrf import fft_backend
+from pyrf.numpy_util import _compute_fft, _compute_fft_i_only, WelchEstimator
+from pyrf.units import M
+
+
+class TestFFTBackends(unittest.TestCase):
+    def setUp(self):
+        state = np.random.RandomState(0)
+        self.real = state.normal(0, 0.1, (4, 1024))
+        self.iq = self.real + 1j * state.normal(0, 0.1, (4, 1024))
+
+    def tearDown(self):
+        fft_backend.set_backend('numpy')
+
+    def check_backend(self, name):
+        backend = fft_backend.set_backend(name, workers=2)
+        self.assertTrue(fft_backend.get_backend() is backend)
+        self.assertEqual(backend.name, name)
+        self.assertTrue(np.allclose(fft_backend.fft(self.iq),
+            np.fft.fft(self.iq)))
+        self.assertTrue(np.allclose(fft_backend.ifft(self.iq, axis=0),
+            np.fft.ifft(self.iq, axis=0)))
+        self.assertTrue(np.allclose(fft_backend.rfft(self.real, axis=1),
+            np.fft.rfft(self.real, axis=1)))
+
+        i_only = _compute_fft_i_only(self.real[0], True, True)
+        iq = _compute_fft(self.iq.real[0], self.iq.imag[0], True, True,
+            True, True, True, 1, 0, 100 * M)
+        welch = WelchEstimator(256)
+        welch.add(self.iq.ravel())
+        spectrum = welch.power_spectrum()
+
+        fft_backend.set_backend('numpy')
+        self.assertTrue(np.allclose(i_only,
+            _compute_fft_i_only(self.real[0], True, True)))
+        # the image correction adds random noise, compare the tone free
+        # spectrum levels
+        self.assertAlmostEqual(np.mean(iq), np.mean(_compute_fft(
+            self.iq.real[0], self.iq.imag[0], True, True, True, True, True,
+            1, 0, 100 * M)), delta=0.5)
+        welch.reset()
+        welch.add(self.iq.ravel())
+        self.assertTrue(np.allclose(spectrum, welch.power_spectrum()))
+
+    def test_scipy(self):
+        self.check_backend('scipy')
+
+    def test_fftw(self):
+        try:
+            import pyfftw
+        except ImportError:
+            self.skipTest('pyfftw is not installed')
+        self.check_backend('fftw')
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, fft_backend.set_backend, 'mkl')
+        self.assertEqual(fft_backend.get_backend().name, 'numpy')
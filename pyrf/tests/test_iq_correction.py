@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import _compute_fft, IQCorrectionState
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.capture_device import CaptureDevice
+from pyrf.units import M
+
+POINTS = 4096
+# tone frequency as a fraction of the sample rate
+TONE = 0.1
+
+
+class TestIQCorrection(unittest.TestCase):
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def imbalanced(self, phase_deg, gain=1.05):
+        t = np.arange(POINTS)
+        start = self.random.uniform(0, 2 * np.pi)
+        phase = 2 * np.pi * TONE * t + start
+        i_data = 0.3 * np.cos(phase) + self.random.normal(0, 1e-3, POINTS)
+        q_data = (0.3 * gain * np.sin(phase + np.radians(phase_deg))
+            + self.random.normal(0, 1e-3, POINTS))
+        return i_data, q_data
+
+    def image_rejection(self, spectrum):
+        image = POINTS // 2 - int(TONE * POINTS)
+        return np.max(spectrum[image - 3:image + 4]) - np.max(spectrum)
+
+    def spectrum(self, i_data, q_data, correct_phase=True, correction=None):
+        return _compute_fft(i_data, q_data, correct_phase, True, True, True,
+            True, 1, 0, 100 * M, correction)
+
+    def test_estimates_reused(self):
+        correction = IQCorrectionState(refresh=16).lookup(2400 * M, 'ZIF')
+        for packet in range(20):
+            i_data, q_data = self.imbalanced(5)
+            self.assertAlmostEqual(self.image_rejection(
+                self.spectrum(i_data, q_data, False)), -26, delta=1)
+            corrected = self.spectrum(i_data, q_data, correction=correction)
+            self.assertTrue(self.image_rejection(corrected) < -60)
+        # full corrections for the first packet and after 16 more
+        self.assertEqual(correction.full_corrections, 2)
+        self.assertEqual(correction.packets, 2)
+        self.assertAlmostEqual(np.degrees(correction.phase), 5, delta=0.5)
+        self.assertAlmostEqual(correction.gain, 1 / 1.05, delta=0.01)
+
+    def test_drift(self):
+        correction = IQCorrectionState().lookup(2400 * M, 'ZIF')
+        self.spectrum(*self.imbalanced(5), correction=correction)
+        self.spectrum(*self.imbalanced(5), correction=correction)
+        self.assertEqual(correction.full_corrections, 1)
+        corrected = self.spectrum(*self.imbalanced(10), correction=correction)
+        self.assertEqual(correction.full_corrections, 2)
+        self.assertTrue(self.image_rejection(corrected) < -60)
+
+    def test_tunings(self):
+        state = IQCorrectionState(tunings=2)
+        first = state.lookup(2400 * M, 'ZIF', 10, 1)
+        self.assertTrue(state.lookup(2400 * M, 'ZIF', 10, 1) is first)
+        self.assertFalse(state.lookup(2400 * M, 'ZIF', 20, 1) is first)
+        state.lookup(2500 * M, 'ZIF')
+        # least recently used tuning is dropped
+        self.assertFalse(state.lookup(2400 * M, 'ZIF', 10, 1) is first)
+        state.clear()
+
+
+class TestCaptureDeviceIQCorrection(unittest.TestCase):
+    def test_repeated_captures(self):
+        sim = SimulatedRTSA(tones=[(2450 * M, -30)], seed=0)
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            cd = CaptureDevice(dut)
+            for i in range(3):
+                fstart, fstop, pow_data = cd.capture_power_spectrum('ZIF',
+                    2440 * M, 100e3)
+                self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
+            dut.disconnect()
+        finally:
+            sim.stop()
+        correction = cd._iq_corrections.lookup(2440 * M, 'ZIF')
+        self.assertEqual(correction.full_corrections, 1)
+        self.assertEqual(correction.packets, 2)
@@ -0,0 +1,94 @@
+import io
+import socket
+import unittest
+
+from pyrf.metrics import MetricsRegistry, MetricsExporter, metrics
+from pyrf.vrt import (VRT_IFDATA_I14, generate_speca_packet,
+    generate_context_packet, generate_data_packet)
+from pyrf.devices.playback import open_recording
+from pyrf.connectors.blocking import PlainSocketConnector
+
+DEVICE_ID = 'ThinkRF,R5500-408 v1,000000-000,1.5.0'
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_disabled(self):
+        registry = MetricsRegistry()
+        registry.count('packets')
+        registry.add_time('parse', 1.0)
+        with registry.timer('fft'):
+            pass
+        self.assertEqual(registry.as_dict(), {'counters': {}, 'timers': {}})
+
+    def test_counters_and_timers(self):
+        registry = MetricsRegistry(enabled=True)
+        registry.count('packets')
+        registry.count('bytes', 100)
+        registry.count('bytes', 20)
+        registry.add_time('parse', 1.0)
+        registry.add_time('parse', 3.0)
+        with registry.timer('fft'):
+            pass
+
+        result = registry.as_dict()
+        self.assertEqual(result['counters'], {'packets': 1, 'bytes': 120})
+        self.assertEqual(result['timers']['parse'], {'count': 2,
+            'total': 4.0, 'mean': 2.0, 'min': 1.0, 'max': 3.0})
+        self.assertEqual(result['timers']['fft']['count'], 1)
+
+        registry.reset()
+        self.assertEqual(registry.as_dict(), {'counters': {}, 'timers': {}})
+
+    def test_exporter(self):
+        registry = MetricsRegistry(enabled=True)
+        snapshots = []
+        exporter = MetricsExporter(snapshots.append, interval=60,
+            registry=registry, reset=True)
+        exporter.start()
+        registry.count('packets', 3)
+        exporter.stop()
+
+        self.assertEqual(snapshots[-1]['counters'], {'packets': 3})
+        self.assertEqual(registry.as_dict()['counters'], {})
+
+
+class TestPipelineMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enabled = True
+
+    def tearDown(self):
+        metrics.enabled = False
+        metrics.reset()
+
+    def test_vrt_parse(self):
+        state, _count = generate_speca_packet({
+            'device_class': 'thinkrf.WSA',
+            'device_identifier': DEVICE_ID})
+        context, _count = generate_context_packet('rffreq', 2400e6)
+        data, _count = generate_data_packet(VRT_IFDATA_I14, b'\0' * 512,
+            sample_loss=True)
+        dut = open_recording(io.BytesIO(state + context + data))
+        while dut.read() is not None:
+            pass
+
+        counters = metrics.as_dict()['counters']
+        # the state packet is read twice, when opening and replaying
+        self.assertEqual(counters['vrt.packets'], 4)
+        self.assertEqual(counters['vrt.sample_loss'], 1)
+        self.assertFalse('vrt.over_range' in counters)
+        self.assertEqual(metrics.as_dict()['timers']['vrt.parse']['count'], 4)
+
+    def test_socket_read(self):
+        connector = PlainSocketConnector()
+        connector._sock_vrt, peer = socket.socketpair()
+        peer.sendall(b'\0' * 16)
+        peer.close()
+        self.assertEqual(connector.raw_read(16), b'\0' * 16)
+        # a closed socket reads False
+        self.assertEqual(connector.raw_read(16), False)
+        connector._sock_vrt.close()
+
+        result = metrics.as_dict()
+        self.assertEqual(result['counters']['socket.bytes'], 16)
+        self.assertEqual(result['timers']['socket.read']['count'], 2)
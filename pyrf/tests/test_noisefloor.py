@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import estimate_noisefloor, noisefloor_profile
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+
+
+class TestEstimateNoisefloor(unittest.TestCase):
+    def setUp(self):
+        state = np.random.RandomState(0)
+        self.spectrum = state.normal(-100, 3, 1001)
+        self.spectrum[500] = -20
+
+    def test_trimmed_mean(self):
+        for exclude in (0, 0.2, 0.5):
+            expected = np.mean(sorted(self.spectrum)[
+                int(len(self.spectrum) * exclude):])
+            self.assertAlmostEqual(estimate_noisefloor(self.spectrum,
+                exclude), expected)
+        self.assertAlmostEqual(estimate_noisefloor([-90.0]), -90)
+        self.assertRaises(ValueError, estimate_noisefloor, [])
+
+    def test_percentile(self):
+        self.assertEqual(estimate_noisefloor(self.spectrum, percentile=50),
+            np.median(self.spectrum))
+        self.assertEqual(estimate_noisefloor(self.spectrum, percentile=100),
+            -20)
+
+
+class TestNoisefloorProfile(unittest.TestCase):
+    def setUp(self):
+        # a floor rising 10 dB every 100 bins, 0 to 1049 Hz
+        self.spectrum = np.repeat([-120.0, -110, -100, -90, -80, -70,
+            -60, -50, -40, -30, -20], 100)[:1050]
+        self.spectrum[250] = 0
+
+    def test_segment_bins(self):
+        freqs, floors = noisefloor_profile(self.spectrum, 0, 1049,
+            segment_bins=100, percentile=50)
+        self.assertEqual(list(floors), list(range(-120, -10, 10)))
+        self.assertEqual(list(freqs[:2]), [49.5, 149.5])
+        # the last segment holds the 50 bins left over
+        self.assertEqual(freqs[-1], 1024.5)
+
+        freqs, floors = noisefloor_profile(self.spectrum, 0, 1049,
+            segment_bins=100)
+        self.assertAlmostEqual(floors[2], (-100 * 79 + 0) / 80.0)
+        self.assertEqual(floors[3], -90)
+
+    def test_boundaries(self):
+        freqs, floors = noisefloor_profile(self.spectrum, 0, 1049,
+            boundaries=[100, 300, 2000], percentile=0)
+        self.assertEqual(list(floors), [-120, -110, -90])
+        self.assertEqual(list(freqs), [49.5, 199.5, 674.5])
+        self.assertRaises(ValueError, noisefloor_profile, self.spectrum,
+            0, 1049)
+        self.assertRaises(ValueError, noisefloor_profile, self.spectrum,
+            0, 1049, segment_bins=10, boundaries=[5])
+
+
+class TestDeviceNoisefloor(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(2420 * M, -30)], seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def test_sweep_profile(self):
+        sd = SweepDevice(self.dut)
+        fstart, fstop, pow_data = sd.capture_power_spectrum(2300 * M,
+            2500 * M, 100e3, {'attenuator': 0}, mode='SH')
+        boundaries = sd.step_boundaries()
+        self.assertTrue(len(boundaries) > 1)
+        self.assertEqual(boundaries[0], 0)
+
+        freqs, floors = noisefloor_profile(pow_data, fstart, fstop,
+            boundaries=boundaries, percentile=50)
+        self.assertEqual(len(floors), len(boundaries))
+        self.assertTrue(np.all(np.diff(freqs) > 0))
+        # the tone doesn't lift the median of its step
+        self.assertTrue(np.all(floors < -90))
+        self.assertTrue(estimate_noisefloor(pow_data) < -90)
+
+    def test_measure_noisefloor(self):
+        self.dut.rfe_mode('ZIF')
+        self.dut.freq(2440 * M)
+        noisefloor = self.dut.measure_noisefloor(rbw=100e3)
+        self.assertTrue(noisefloor < -60)
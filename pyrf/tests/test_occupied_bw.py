@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import calculate_occupied_bw
+
+
+class TestOccupiedBandwidth(unittest.TestCase):
+    def setUp(self):
+        # 1000 bins over 1 MHz, a 100 kHz wide signal 40 dB above the
+        # floor in the middle
+        self.spectrum = np.full(1000, -100.0)
+        self.spectrum[450:550] = -60
+
+    def test_flat(self):
+        flat = np.full(1000, -50.0)
+        self.assertAlmostEqual(calculate_occupied_bw(flat, 1e6, 99), 990e3)
+        self.assertAlmostEqual(calculate_occupied_bw(flat, 1e6, 10), 100e3,
+            delta=2e3)
+        self.assertEqual(calculate_occupied_bw(flat, 1e6, 100), 1e6)
+        # the smallest window is one bin each side
+        self.assertAlmostEqual(calculate_occupied_bw(flat, 1e6, 0.01), 2e3)
+
+    def test_signal(self):
+        obw = calculate_occupied_bw(self.spectrum, 1e6, 99)
+        self.assertAlmostEqual(obw, 100e3, delta=2e3)
+        self.assertTrue(isinstance(obw, float))
+
+    def test_centroid(self):
+        shifted = np.roll(self.spectrum, -300)
+        # centered on the middle bin the window has to reach the signal
+        self.assertTrue(calculate_occupied_bw(shifted, 1e6, 99) > 600e3)
+        self.assertAlmostEqual(calculate_occupied_bw(shifted, 1e6, 99,
+            center='centroid'), 100e3, delta=2e3)
+        # windows are cut short at the edge of the spectrum
+        edge = np.roll(self.spectrum, -450)
+        self.assertAlmostEqual(calculate_occupied_bw(edge, 1e6, 99,
+            center='centroid'), 100e3, delta=2e3)
+        self.assertRaises(ValueError, calculate_occupied_bw, shifted, 1e6,
+            99, center='peak')
+
+    def test_batch(self):
+        spectra = np.array([self.spectrum, np.full(1000, -50.0),
+            np.roll(self.spectrum, 200)])
+        obw = calculate_occupied_bw(spectra, 1e6, 99)
+        self.assertEqual(obw.shape, (3,))
+        for row, expected in zip(spectra, obw):
+            self.assertEqual(calculate_occupied_bw(row, 1e6, 99), expected)
+        self.assertEqual(list(calculate_occupied_bw(spectra, 1e6, 100)),
+            [1e6] * 3)
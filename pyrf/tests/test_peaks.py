@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import find_peaks
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+
+
+class TestFindPeaks(unittest.TestCase):
+    def setUp(self):
+        # bins every 1 kHz from 0 to 10 kHz
+        self.spectrum = np.array(
+            [-90, -60, -50, -60, -90, -80, -85, -30, -30, -40, -95])
+
+    def test_local_maxima(self):
+        peaks = find_peaks(self.spectrum, 0, 10e3, n=None)
+        # adjacent bins of a signal are not more peaks, a flat top is
+        # reported at its first bin
+        self.assertEqual(peaks, [(7e3, -30), (2e3, -50), (5e3, -80)])
+        self.assertEqual(find_peaks(self.spectrum, 0, 10e3, n=2),
+            [(7e3, -30), (2e3, -50)])
+        self.assertEqual(find_peaks(self.spectrum, 0, 10e3, n=None,
+            threshold=-60), [(7e3, -30), (2e3, -50)])
+        self.assertEqual(find_peaks([], 0, 10e3), [])
+
+    def test_excursion_and_separation(self):
+        # the -80 bump only rises 5 dB above the -85 valley
+        self.assertEqual(find_peaks(self.spectrum, 0, 10e3, n=None,
+            excursion=6), [(7e3, -30), (2e3, -50)])
+        self.assertEqual(find_peaks(self.spectrum, 0, 10e3, n=None,
+            min_separation=2.5e3), [(7e3, -30), (2e3, -50)])
+        self.assertEqual(find_peaks(self.spectrum, 0, 10e3, n=None,
+            min_separation=5.5e3), [(7e3, -30)])
+
+        rising = np.arange(10.0)
+        self.assertEqual(find_peaks(rising, 0, 9, excursion=5), [(9, 9)])
+
+    def test_excursion_with_ripple(self):
+        # a wideband signal with 1 dB of ripple and a narrow tone
+        spectrum = np.full(2001, -100.0)
+        ripple = np.arange(400)
+        spectrum[800:1200] = (-50 + 0.5 * np.sin(ripple * 0.3)
+            + 0.001 * ripple)
+        spectrum[300] = -70
+        spectrum[301] = -75
+        spectrum[302] = -72
+        peaks = find_peaks(spectrum, 0, 2000, n=3, excursion=6)
+        self.assertEqual([f for f, p in peaks],
+            [800 + np.argmax(spectrum[800:1200]), 300])
+        # the bump on the tone's skirt only rises 3 dB
+        self.assertEqual(len(find_peaks(spectrum, 0, 2000, n=None,
+            excursion=2.5)), 3)
+
+    def test_interpolate(self):
+        freqs = np.arange(100) * 1e3
+        # a parabola in dB peaking between bins
+        spectrum = -20 - 0.1 * ((freqs - 40.3e3) / 1e3) ** 2
+        (freq, power), = find_peaks(spectrum, 0, 99e3, interpolate=True)
+        self.assertAlmostEqual(freq, 40.3e3)
+        self.assertAlmostEqual(power, -20)
+        (freq, power), = find_peaks(spectrum, 0, 99e3)
+        self.assertEqual(freq, 40e3)
+
+
+class TestDevicePeaks(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(2420 * M, -30), (2470 * M, -40)],
+            seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def test_sweep_peaks(self):
+        sd = SweepDevice(self.dut)
+        fstart, fstop, pow_data = sd.capture_power_spectrum(2400 * M,
+            2500 * M, 100e3, {'attenuator': 0}, mode='SH')
+        (f1, p1), (f2, p2) = find_peaks(pow_data, fstart, fstop, n=2,
+            excursion=10, interpolate=True)
+        self.assertAlmostEqual(f1, 2420 * M, delta=100e3)
+        self.assertAlmostEqual(f2, 2470 * M, delta=100e3)
+        self.assertAlmostEqual(p1, -30, delta=2)
+        self.assertAlmostEqual(p2, -40, delta=2)
+
+    def test_peakfind(self):
+        # both tones in the usable band, away from the DC bins
+        self.dut.rfe_mode('ZIF')
+        self.dut.freq(2440 * M)
+        peaks = self.dut.peakfind(n=2, rbw=100e3)
+        self.assertEqual(len(peaks), 2)
+        self.assertAlmostEqual(peaks[0][0], 2420 * M, delta=200e3)
+        self.assertAlmostEqual(peaks[1][0], 2470 * M, delta=200e3)
@@ -0,0 +1,202 @@
+import io
+import time
+import unittest
+
+import numpy as np
+from twisted.internet.task import Clock
+
+from pyrf.vrt import (VRT_IFDATA_I14, generate_speca_packet,
+    generate_context_packet, generate_data_packet)
+from pyrf.devices.playback import Playback, open_recording
+from pyrf.capture_device import CaptureDevice
+from pyrf.sweep_device import SweepDevice, SweepPlanner
+from pyrf.units import M
+
+DEVICE_ID = 'ThinkRF,R5500-408 v1,000000-000,1.5.0'
+TONE = 2450 * M
+
+
+def sh_capture(properties, freq, spp, tone, state):
+    """
+    Return the I14 payload of an SH capture at *freq* with a -30 dBm
+    tone at *tone* Hz, on top of a little noise
+    """
+    full_bw = properties.FULL_BW['SH']
+    offset = full_bw * (0.5 - properties.PASS_BAND_CENTER['SH'])
+    baseband = tone - (freq - full_bw / 2.0 + offset)
+    n = np.arange(spp)
+    samples = state.normal(0, 2 ** -10, spp)
+    if 0 < baseband < full_bw:
+        # a hanning windowed real FFT bin of a cosine is amplitude / 4
+        amplitude = 4 * 10 ** ((-30 - properties.REFLEVEL_ERROR) / 20.0)
+        samples += amplitude * np.cos(2 * np.pi * baseband * n / (2 * full_bw))
+    return np.round(samples * 2 ** 13).astype('>i2').tobytes()
+
+
+class RecordingWriter(object):
+    def __init__(self):
+        self.data = []
+        self.count = 0
+        self.context_count = 0
+        self.timestamp = 0.0
+
+    def context(self, field, value):
+        data, self.context_count = generate_context_packet(field, value,
+            self.context_count)
+        self.data.append(data)
+
+    def samples(self, payload, period=0.0):
+        tsi = int(self.timestamp)
+        tsf = int(round((self.timestamp - tsi) * 1e12))
+        data, self.count = generate_data_packet(VRT_IFDATA_I14, payload,
+            self.count, tsi, tsf)
+        self.data.append(data)
+        self.timestamp += period
+
+    def recording(self):
+        state, _count = generate_speca_packet({
+            'device_class': 'thinkrf.WSA',
+            'device_identifier': DEVICE_ID})
+        return io.BytesIO(b''.join([state] + self.data))
+
+
+class TestPlayback(unittest.TestCase):
+    def setUp(self):
+        self.properties = Playback('thinkrf.WSA', DEVICE_ID).properties
+        self.state = np.random.RandomState(0)
+
+    def test_open_recording(self):
+        writer = RecordingWriter()
+        writer.context('rffreq', 2400 * M)
+        dut = open_recording(writer.recording())
+
+        self.assertEqual(dut.device_id, DEVICE_ID)
+        packet = dut.read()
+        self.assertEqual(packet.fields['speca']['device_identifier'],
+            DEVICE_ID)
+        self.assertEqual(dut.read().fields['rffreq'], 2400 * M)
+        self.assertEqual(dut.read(), None)
+        self.assertTrue(dut.eof())
+
+    def test_loop(self):
+        writer = RecordingWriter()
+        writer.context('rffreq', 2400 * M)
+        dut = open_recording(writer.recording(), loop=True)
+        packets = [dut.read() for i in range(5)]
+        self.assertEqual([p.fields.get('rffreq') for p in packets],
+            [None, 2400 * M, None, 2400 * M, None])
+        self.assertFalse(dut.eof())
+
+    def test_real_time_speed(self):
+        writer = RecordingWriter()
+        for i in range(3):
+            writer.samples(b'\0' * 512, period=0.05)
+
+        dut = open_recording(writer.recording())
+        start = time.time()
+        while dut.read() is not None:
+            pass
+        self.assertTrue(time.time() - start < 0.05)
+
+        dut = open_recording(writer.recording(), speed=1.0)
+        start = time.time()
+        while dut.read() is not None:
+            pass
+        self.assertTrue(time.time() - start >= 0.09)
+
+        dut = open_recording(writer.recording(), speed=2.0)
+        start = time.time()
+        while dut.read() is not None:
+            pass
+        self.assertTrue(0.045 <= time.time() - start < 0.09)
+
+    def test_capture_device(self):
+        freq = 2400 * M
+        writer = RecordingWriter()
+        writer.context('reflevel', 0)
+        writer.context('rffreq', freq)
+        writer.samples(sh_capture(self.properties, freq, 1024, TONE,
+            self.state))
+
+        capture = CaptureDevice(open_recording(writer.recording()))
+        fstart, fstop, data = capture.capture_time_domain('SH', freq,
+            self.properties.FULL_BW['SH'] / 512)
+
+        self.assertEqual(len(data['data_pkt'].data), 1024)
+        self.assertEqual(data['context_pkt']['rffreq'], freq)
+        self.assertTrue(fstart < freq < fstop)
+
+    def test_async_capture_device(self):
+        freq = 2400 * M
+        writer = RecordingWriter()
+        for i in range(2):
+            writer.context('reflevel', 0)
+            writer.context('rffreq', freq)
+            writer.samples(sh_capture(self.properties, freq, 1024, TONE,
+                self.state))
+
+        clock = Clock()
+        results = []
+        capture = CaptureDevice(open_recording(writer.recording(),
+            reactor=clock), lambda *args: results.append(args))
+        capture.capture_time_domain('SH', freq,
+            self.properties.FULL_BW['SH'] / 512)
+        clock.advance(0)
+        self.assertEqual(len(results), 1)
+
+        # the second capture is only replayed when requested
+        clock.advance(1)
+        self.assertEqual(len(results), 1)
+        capture.capture_time_domain('SH', freq,
+            self.properties.FULL_BW['SH'] / 512)
+        clock.advance(0)
+        self.assertEqual(len(results), 2)
+
+    def test_sweep_device(self):
+        planner = SweepPlanner(self.properties)
+        plan = planner.plan_sweep(2400 * M, 2500 * M, 100e3, 'SH')
+
+        writer = RecordingWriter()
+        writer.context('sweepid', 1234)
+        for step in range(int(plan.step_count)):
+            freq = plan.fstart + step * plan.fstep
+            writer.context('reflevel', 0)
+            writer.context('rffreq', freq)
+            writer.samples(sh_capture(self.properties, freq, plan.spp, TONE,
+                self.state))
+
+        sd = SweepDevice(open_recording(writer.recording()))
+        fstart, fstop, pow_data = sd.capture_power_spectrum(2400 * M,
+            2500 * M, 100e3, {'attenuator': 0}, mode='SH')
+
+        self.assertEqual(len(pow_data), plan.spectral_points)
+        peak = fstart + np.argmax(pow_data) * (fstop - fstart) / len(pow_data)
+        self.assertAlmostEqual(peak, TONE, delta=4 * plan.rbw)
+        self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
+
+    def test_async_sweep_device(self):
+        planner = SweepPlanner(self.properties)
+        plan = planner.plan_sweep(2400 * M, 2500 * M, 100e3, 'SH')
+
+        writer = RecordingWriter()
+        writer.context('sweepid', 1234)
+        for step in range(int(plan.step_count)):
+            freq = plan.fstart + step * plan.fstep
+            writer.context('reflevel', 0)
+            writer.context('rffreq', freq)
+            writer.samples(sh_capture(self.properties, freq, plan.spp, TONE,
+                self.state))
+
+        clock = Clock()
+        results = []
+        sd = SweepDevice(open_recording(writer.recording(), reactor=clock),
+            lambda *args: results.append(args))
+        sd.capture_power_spectrum(2400 * M, 2500 * M, 100e3,
+            {'attenuator': 0}, mode='SH')
+        clock.advance(0)
+        self.assertEqual(len(results), 1)
+
+        fstart, fstop, pow_data = results[0][:3]
+        self.assertEqual(len(pow_data), plan.spectral_points)
+        peak = fstart + np.argmax(pow_data) * (fstop - fstart) / len(pow_data)
+        self.assertAlmostEqual(peak, TONE, delta=4 * plan.rbw)
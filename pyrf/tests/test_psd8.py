@@ -0,0 +1,127 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import compute_fft, psd8_to_dbm
+from pyrf.vrt import DataPacket, VRT_IFDATA_PSD8
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.sweep_device import SweepDevice, SweepDeviceError
+from pyrf.devices.thinkrf_properties import wsa_properties
+from pyrf.units import M
+
+TONE = 2450 * M
+
+# spectral inversion enable and indicator trailer bits
+SPEC_INV = (1 << 26) | (1 << 14)
+
+
+class FakeProperties(object):
+    REFLEVEL_ERROR = 10
+
+
+class FakeDevice(object):
+    properties = FakeProperties()
+
+
+class TestPSD8Decoding(unittest.TestCase):
+    def test_scaling(self):
+        packet = DataPacket(0, 0, VRT_IFDATA_PSD8, 0, 0,
+            np.array([-100, -50, 0, 20], dtype=np.int8).tobytes(), SPEC_INV)
+        context = {'reflevel': -5}
+        self.assertEqual(list(psd8_to_dbm(FakeDevice(), packet, context)),
+            [25, 5, -45, -95])
+        self.assertEqual(list(psd8_to_dbm(FakeDevice(), packet, context,
+            apply_spec_inv=False, apply_reference=False)),
+            [-100, -50, 0, 20])
+        self.assertEqual(list(compute_fft(FakeDevice(), packet, context)),
+            [25, 5, -45, -95])
+        self.assertTrue(np.allclose(compute_fft(FakeDevice(), packet,
+            context, convert_to_dbm=False, apply_reference=False),
+            [10, 1, 10 ** -2.5, 1e-5]))
+
+
+class TestPSD8Capture(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(TONE, -30)], seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def _capture(self, spp):
+        self.dut.capture(spp, 1)
+        context = {}
+        while True:
+            packet = self.dut.read()
+            if packet.is_data_packet():
+                return packet, context
+            context.update(packet.fields)
+
+    def test_block_capture(self):
+        for mode, bins in (('ZIF', 1024), ('SH', 512)):
+            self.dut.rfe_mode(mode)
+            self.dut.freq(TONE - 10 * M)
+            self.dut.trace_format('SAMPLES')
+            packet, context = self._capture(1024)
+            samples = compute_fft(self.dut, packet, context)
+
+            self.assertEqual(self.dut.trace_format(), 'SAMPLES')
+            self.dut.trace_format('PSD8')
+            self.assertEqual(self.dut.trace_format(), 'PSD8')
+            packet, context = self._capture(1024)
+            self.assertEqual(packet.stream_id, VRT_IFDATA_PSD8)
+            self.assertEqual(len(packet.data), bins)
+            psd8 = psd8_to_dbm(self.dut, packet, context)
+
+            self.assertEqual(np.argmax(psd8), np.argmax(samples[:bins]))
+            self.assertAlmostEqual(np.max(psd8), np.max(samples), delta=1)
+
+    def test_sweep(self):
+        sd = SweepDevice(self.dut)
+        fstart, fstop, samples = sd.capture_power_spectrum(2300 * M,
+            2600 * M, 100e3, {'attenuator': 0}, mode='SH')
+        fstart8, fstop8, psd8 = sd.capture_power_spectrum(2300 * M,
+            2600 * M, 100e3, {'attenuator': 0}, mode='SH', psd8=True)
+        self.assertTrue(sd._sweep_settings.assembly is not None)
+        self.assertEqual((fstart8, fstop8, len(psd8)),
+            (fstart, fstop, len(samples)))
+        self.assertTrue(abs(np.argmax(psd8) - np.argmax(samples)) <= 1)
+        self.assertAlmostEqual(np.max(psd8), -30, delta=1.5)
+        self.assertAlmostEqual(np.median(psd8), np.median(samples), delta=1)
+
+        # the format is switched back for sample sweeps
+        sd.capture_power_spectrum(2300 * M, 2600 * M, 100e3,
+            {'attenuator': 0}, mode='SH')
+        self.assertEqual(self.dut.trace_format(), 'SAMPLES')
+
+
+class TestPSD8Experimental(unittest.TestCase):
+    def test_properties(self):
+        self.assertTrue(wsa_properties(
+            'ThinkRF,R5500-408 v1,SIM-000001,1.5.0').PSD8_TRACE)
+        self.assertFalse(wsa_properties(
+            'ThinkRF,R5500-408 v1,000000-000,1.5.0').PSD8_TRACE)
+
+    def test_real_device(self):
+        sim = SimulatedRTSA(device_id='ThinkRF,R5500-408 v1,000000-000,1.5.0')
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            self.assertRaises(ValueError, dut.trace_format, 'PSD8')
+            self.assertEqual(dut.trace_format('SAMPLES'), 'SAMPLES')
+            sd = SweepDevice(dut)
+            self.assertRaises(SweepDeviceError, sd.capture_power_spectrum,
+                2300 * M, 2600 * M, 100e3, {'attenuator': 0}, mode='SH',
+                psd8=True)
+            # a refused sweep doesn't block the next one
+            fstart, fstop, pow_data = sd.capture_power_spectrum(2300 * M,
+                2600 * M, 100e3, {'attenuator': 0}, mode='SH')
+            self.assertTrue(len(pow_data))
+            dut.disconnect()
+        finally:
+            sim.stop()
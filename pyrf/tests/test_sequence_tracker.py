@@ -0,0 +1,93 @@
+import unittest
+
+from pyrf.vrt import (SequenceTracker, DataPacket, ContextPacket,
+    VRT_IFDATA_I14Q14)
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.units import M
+
+# trailer enable and indicator bits
+SAMPLE_LOSS = (1 << 24) | (1 << 12)
+OVER_RANGE = (1 << 25) | (1 << 13)
+VALID_DATA_ENABLE = 1 << 30
+VALID_DATA = VALID_DATA_ENABLE | (1 << 18)
+
+
+def data_packet(count, trailer=VALID_DATA):
+    return DataPacket(count, 0, VRT_IFDATA_I14Q14, 0, 0, b'\0' * 16, trailer)
+
+
+# a context stream without a parser
+CONTEXT_STREAM = 0x90000010
+
+
+def context_packet(count):
+    return ContextPacket(4, count, 0, b'\x90\x00\x00\x10', False)
+
+
+class TestSequenceTracker(unittest.TestCase):
+    def test_gaps(self):
+        events = []
+        tracker = SequenceTracker(lambda event, packet, lost:
+            events.append((event, packet.count, lost)))
+        for count in (14, 15, 0, 3, 4):
+            tracker.update(data_packet(count))
+        self.assertEqual(events, [('gap', 3, 2)])
+        stats = tracker.stats(VRT_IFDATA_I14Q14)
+        self.assertEqual((stats['packets'], stats['gaps'],
+            stats['lost_packets']), (5, 1, 2))
+
+    def test_streams_counted_separately(self):
+        tracker = SequenceTracker()
+        tracker.update(data_packet(0))
+        tracker.update(context_packet(7))
+        tracker.update(data_packet(1))
+        tracker.update(context_packet(8))
+        self.assertEqual(sorted(tracker.streams()),
+            sorted([VRT_IFDATA_I14Q14, CONTEXT_STREAM]))
+        self.assertEqual(tracker.stats()['packets'], 4)
+        self.assertEqual(tracker.stats()['gaps'], 0)
+
+    def test_trailer_flags(self):
+        events = []
+        tracker = SequenceTracker(lambda event, packet, lost:
+            events.append(event))
+        tracker.update(data_packet(0, VALID_DATA | SAMPLE_LOSS))
+        tracker.update(data_packet(1, VALID_DATA | OVER_RANGE))
+        tracker.update(data_packet(2, VALID_DATA_ENABLE))
+        # no valid data indicator at all is not invalid data
+        tracker.update(data_packet(3, 0))
+        self.assertEqual(events, ['sample_loss', 'over_range',
+            'invalid_data'])
+        stats = tracker.stats()
+        self.assertEqual((stats['sample_loss'], stats['over_range'],
+            stats['invalid_data']), (1, 1, 1))
+
+        tracker.reset()
+        self.assertEqual(tracker.streams(), [])
+        self.assertEqual(tracker.stats(VRT_IFDATA_I14Q14)['packets'], 0)
+
+
+class TestTrackSequences(unittest.TestCase):
+    def test_sim_packet_loss(self):
+        sim = SimulatedRTSA(seed=0, packet_loss=0.2)
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            dut.rfe_mode('ZIF')
+            dut.freq(2400 * M)
+            dut.spp(1024)
+            tracker = dut.track_sequences()
+            dut.stream_start()
+            for i in range(100):
+                dut.read()
+            dut.stream_stop()
+            dut.disconnect()
+        finally:
+            sim.stop()
+
+        stats = tracker.stats(VRT_IFDATA_I14Q14)
+        self.assertTrue(stats['packets'] > 0)
+        self.assertTrue(stats['gaps'] > 0)
+        self.assertTrue(stats['lost_packets'] >= stats['gaps'])
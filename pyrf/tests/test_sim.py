@@ -0,0 +1,87 @@
+import struct
+import unittest
+
+import numpy as np
+
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.capture_device import CaptureDevice
+from pyrf.sweep_device import SweepDevice
+from pyrf.numpy_util import compute_fft
+from pyrf.units import M
+
+TONE = 2450 * M
+
+
+class TestSimulatedRTSA(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(TONE, -30)], seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def test_settings(self):
+        self.assertEqual(self.dut.device_id.strip(), self.sim.device_id)
+        self.dut.freq(2500 * M)
+        self.dut.spp(2048)
+        self.assertEqual(self.dut.freq(), 2500 * M)
+        self.assertEqual(self.dut.spp(), 2048)
+        self.assertEqual(self.dut.errors(), [])
+
+    def test_unknown_command(self):
+        self.dut.scpiset(':NOT:A:COMMAND 1')
+        self.assertEqual(self.dut.errors(), [(-113, 'Undefined header')])
+
+    def test_block_capture(self):
+        self.dut.freq(TONE)
+        self.dut.capture(1024, 2)
+        context = {}
+        packets = []
+        while len(packets) < 2:
+            packet = self.dut.read()
+            if packet.is_context_packet():
+                context.update(packet.fields)
+            else:
+                packets.append(packet)
+        self.assertEqual(context['rffreq'], TONE)
+        self.assertEqual([len(p.data) for p in packets], [1024, 1024])
+        self.assertEqual(packets[1].count, (packets[0].count + 1) & 0x0f)
+
+        pow_data = compute_fft(self.dut, packets[0], context)
+        self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
+
+    def test_sweep(self):
+        sd = SweepDevice(self.dut)
+        for mode in ('SH', 'ZIF'):
+            fstart, fstop, pow_data = sd.capture_power_spectrum(2300 * M,
+                2600 * M, 100e3, {'attenuator': 0}, mode=mode)
+            peak = fstart + np.argmax(pow_data) * (fstop - fstart) / len(pow_data)
+            self.assertAlmostEqual(peak, TONE, delta=1 * M)
+            self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
+
+    def test_packet_loss(self):
+        self.sim.packet_loss = 0.5
+        counts = []
+        for data, is_data in self.sim._capture('SH', TONE, 256, 16, 1):
+            if is_data:
+                counts.append((struct.unpack('>I', data[:4])[0] >> 16) & 0x0f)
+        self.assertTrue(len(counts) < 16)
+        self.assertEqual(counts, sorted(counts))
+
+
+class TestSimulatedRTSACapture(unittest.TestCase):
+    def test_spec_inv(self):
+        with SimulatedRTSA(tones=[(TONE, -30)], spec_inv=True, seed=0):
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            fstart, fstop, data = CaptureDevice(dut).capture_time_domain(
+                'SH', TONE, 100e3)
+            pow_data = compute_fft(dut, data['data_pkt'], data['context_pkt'])
+            dut.disconnect()
+        self.assertTrue(data['data_pkt'].spec_inv)
+        peak = fstart + np.argmax(pow_data) * (fstop - fstart) / len(pow_data)
+        self.assertAlmostEqual(peak, TONE, delta=1 * M)
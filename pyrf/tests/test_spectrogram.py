@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import Spectrogram, WelchEstimator, _segment_parts
+
+
+class TestSpectrogram(unittest.TestCase):
+    def setUp(self):
+        state = np.random.RandomState(0)
+        self.real = state.normal(0, 0.01, 8192)
+        self.iq = self.real + 1j * state.normal(0, 0.01, 8192)
+        # a burst at 1/8 of the sample rate in samples 4096 to 5119
+        burst = np.arange(4096, 5120)
+        self.iq[burst] += 0.5 * np.exp(2j * np.pi * burst / 8.0)
+
+    def test_matches_welch(self):
+        for samples in (self.real, self.iq):
+            sg = Spectrogram(256, hop=100)
+            frames = sg.add(samples)
+            self.assertEqual(frames.shape, (80, sg.bins))
+            self.assertEqual(sg.frames, 80)
+            welch = WelchEstimator(256, overlap=0)
+            welch.add(samples[700:956])
+            self.assertTrue(np.allclose(frames[7], welch.power_spectrum()))
+        self.assertEqual(sg.bins, 256)
+        self.assertEqual(Spectrogram(256, batch=3).add(self.real).shape[1],
+            129)
+
+    def test_chunks(self):
+        for hop in (64, 256, 300):
+            whole = Spectrogram(256, hop=hop).add(self.iq)
+            sg = Spectrogram(256, hop=hop, batch=5)
+            chunks = []
+            for start in range(0, 8192, 1000):
+                block = self.iq[start:start + 1000]
+                expected = sg.pending_frames(len(block))
+                chunks.append(sg.add(block))
+                self.assertEqual(len(chunks[-1]), expected)
+            self.assertTrue(np.allclose(np.concatenate(chunks), whole))
+        sg.reset()
+        self.assertEqual((sg.frames, sg.bins), (0, None))
+        self.assertRaises(ValueError, Spectrogram, 256, 0)
+
+        # packets shorter than the gap between frames
+        whole = Spectrogram(64, hop=300).add(self.iq)
+        sg = Spectrogram(64, hop=300)
+        chunks = [sg.add(self.iq[start:start + 100])
+            for start in range(0, 8192, 100)]
+        self.assertTrue(np.allclose(np.concatenate(chunks), whole))
+
+    def test_boundary_copy(self):
+        tail = self.iq[:200]
+        samples = self.iq[200:4096]
+        parts, count, rest, skip = _segment_parts(tail, samples, 256, 100)
+        self.assertEqual(count, (4096 - 256) // 100 + 1)
+        self.assertEqual((len(rest), skip), (4096 - count * 100, 0))
+        # only the two frames starting in the tail are copied
+        self.assertEqual(len(parts[0]), 2)
+        self.assertFalse(np.shares_memory(parts[0], samples))
+        self.assertTrue(np.shares_memory(parts[1], samples))
+        frames = np.concatenate(parts)
+        self.assertTrue(np.array_equal(frames[5], self.iq[500:756]))
+
+    def test_burst(self):
+        frames = Spectrogram(512).add(self.iq)
+        # frames every 256 samples, tone bin 512 / 8 above the center
+        loudest = np.argmax(frames, axis=1)
+        self.assertEqual(list(loudest[16:19]), [256 + 64] * 3)
+        self.assertTrue(np.all(frames[:14, 256 + 64] < -30))
+        self.assertTrue(np.all(frames[16:19, 256 + 64] > -20))
+
+    def test_out(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            sg = Spectrogram(1024)
+            rows = sg.pending_frames(len(self.iq))
+            archive = np.memmap(os.path.join(tmp, 'spectrogram.dat'),
+                dtype=np.float32, mode='w+', shape=(rows + 1, 1024))
+            frames = sg.add(self.iq, out=archive[1:])
+            self.assertEqual(len(frames), rows)
+            self.assertTrue(np.shares_memory(frames, archive))
+            expected = Spectrogram(1024).add(self.iq)
+            self.assertTrue(np.allclose(archive[1:], expected, atol=1e-4))
+            del frames, archive
+
+            sg.reset()
+            self.assertRaises(ValueError, sg.add, self.iq,
+                np.zeros((2, 1024)))
+        finally:
+            shutil.rmtree(tmp)
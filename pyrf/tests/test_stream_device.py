@@ -0,0 +1,110 @@
+import time
+import unittest
+
+import numpy as np
+
+from pyrf.stream_device import SampleRing, StreamDevice, StreamDeviceError
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.units import M
+
+
+class TestSampleRing(unittest.TestCase):
+    def test_wrap(self):
+        ring = SampleRing(8, np.complex64)
+        iq = np.array([[1, -1], [2, -2], [3, -3], [4, -4], [5, -5]],
+            dtype='>i2')
+        self.assertTrue(ring.write(iq, 2.0))
+        self.assertEqual(list(ring.read(3)), [0.5 - 0.5j, 1 - 1j, 1.5 - 1.5j])
+        # wraps around the end of the buffer
+        self.assertTrue(ring.write(iq))
+        self.assertEqual(ring.available(), 7)
+        self.assertEqual(list(ring.read(7).real), [2, 2.5, 1, 2, 3, 4, 5])
+
+    def test_full(self):
+        ring = SampleRing(4, np.float32)
+        self.assertTrue(ring.write(np.arange(3)))
+        self.assertFalse(ring.write(np.arange(2)))
+        self.assertEqual(ring.available(), 3)
+        out = np.zeros(3, dtype=np.float32)
+        self.assertTrue(ring.read(3, out) is out)
+        self.assertEqual(list(out), [0, 1, 2])
+
+
+class TestStreamDevice(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(2450 * M, -30)], seed=0, rate=500)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+        self.dut.rfe_mode('ZIF')
+        self.dut.freq(2440 * M)
+        self.dut.spp(1024)
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def test_frames(self):
+        stream = StreamDevice(self.dut, buffer_samples=2 ** 16)
+        for repeat in range(2):
+            stream.start()
+            frames = []
+            for frame in stream.frames(4096, timeout=5):
+                frames.append(frame)
+                if len(frames) == 4:
+                    break
+            stream.stop()
+            self.assertEqual(len(frames), 4)
+            self.assertEqual(frames[0].dtype, np.complex64)
+            self.assertEqual(stream.position, 4 * 4096)
+            self.assertEqual(stream.gaps, [])
+
+            # the 10 MHz tone shows up in each frame
+            spectrum = np.abs(np.fft.fftshift(np.fft.fft(frames[-1])))
+            sample_rate = self.dut.properties.FULL_BW['ZIF']
+            offset = (np.argmax(spectrum) - 2048) * sample_rate / 4096
+            self.assertAlmostEqual(offset, 10 * M, delta=100e3)
+
+            tsi, tsf, offset = stream.timestamp(4 * 4096 - 1)
+            self.assertEqual(offset, 1023)
+        stream.close()
+
+    def test_close(self):
+        stream = StreamDevice(self.dut, buffer_samples=2 ** 16)
+        for repeat in range(2):
+            stream.start()
+            reader = stream._reader
+            self.assertEqual(len(stream.read(4096, timeout=5)), 4096)
+            stream.close()
+            self.assertFalse(reader.is_alive())
+            self.assertEqual(self.dut.connector._reader, None)
+
+        # the device can be read directly once the stream is closed
+        self.dut.capture(1024, 2)
+        counts = []
+        while len(counts) < 2:
+            packet = self.dut.read()
+            if packet.is_data_packet():
+                counts.append(packet.count)
+        self.assertEqual(counts[1], (counts[0] + 1) & 0x0f)
+
+    def test_gaps_and_callback(self):
+        self.sim.packet_loss = 0.2
+        frames = []
+        stream = StreamDevice(self.dut,
+            frame_callback=lambda samples, index: frames.append(index),
+            frame_size=2048)
+        self.assertRaises(StreamDeviceError, stream.read, 10)
+        stream.start()
+        deadline = time.time() + 5
+        while len(frames) < 20 and time.time() < deadline:
+            time.sleep(0.01)
+        stream.close()
+
+        self.assertEqual(frames[:20], list(range(0, 20 * 2048, 2048)))
+        self.assertTrue(stream.gaps)
+        for gap in stream.gaps:
+            self.assertEqual(gap.reason, 'count')
+            self.assertEqual(gap.index % 1024, 0)
+            self.assertTrue(gap.packets >= 1)
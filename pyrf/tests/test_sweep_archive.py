@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyrf.sweep_archive import (SweepArchiveWriter, SweepArchive,
+    SweepArchiveError, HEADER_SIZE)
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+
+
+class TestSweepArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp, 'sweeps.dat')
+        # 11 points from 1 to 2 GHz, sweeps every 10 s from t=1000
+        self.sweeps = [np.arange(11.0) - 100 + i for i in range(5)]
+        writer = SweepArchiveWriter(self.filename, metadata={'site': 'a'})
+        for i, sweep in enumerate(self.sweeps):
+            writer.add(1e9, 2e9, sweep, timestamp=1000 + 10 * i)
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_read(self):
+        archive = SweepArchive(self.filename)
+        self.assertEqual(len(archive), 5)
+        self.assertEqual(archive.metadata['site'], 'a')
+        self.assertEqual((archive.fstart, archive.fstop, archive.points),
+            (1e9, 2e9, 11))
+        timestamp, power = archive[3]
+        self.assertEqual(timestamp, 1030)
+        self.assertEqual(power.dtype, np.float32)
+        self.assertEqual(list(power), list(self.sweeps[3]))
+        self.assertEqual(list(archive.times), [1000, 1010, 1020, 1030, 1040])
+
+        times, freqs, power = archive.read(1005, 1030, 1.2e9, 1.4e9)
+        self.assertEqual(list(times), [1010, 1020])
+        self.assertTrue(np.allclose(freqs, [1.2e9, 1.3e9, 1.4e9]))
+        self.assertEqual(power.shape, (2, 3))
+        self.assertEqual(list(power[1]), list(self.sweeps[2][2:5]))
+        self.assertTrue(isinstance(power.base, np.memmap)
+            or isinstance(power, np.memmap))
+
+        times, freqs, power = archive.read()
+        self.assertEqual(power.shape, (5, 11))
+        self.assertEqual(archive.time_range(2000), slice(5, 5))
+
+    def test_append_and_crash(self):
+        archive = SweepArchive(self.filename)
+        # a sweep half written when the writer crashed
+        with open(self.filename, 'ab') as f:
+            f.write(b'\0' * 20)
+        archive.refresh()
+        self.assertEqual(len(archive), 5)
+
+        writer = SweepArchiveWriter(self.filename, dtype='<f8')
+        self.assertEqual(os.path.getsize(self.filename),
+            HEADER_SIZE + 5 * (8 + 11 * 4))
+        writer.add(1e9, 2e9, self.sweeps[0], timestamp=1050)
+        self.assertRaises(SweepArchiveError, writer.add, 1e9, 2e9,
+            np.zeros(12))
+        self.assertRaises(SweepArchiveError, writer.add, 1e9, 3e9,
+            np.zeros(11))
+        writer.close()
+
+        archive.refresh()
+        self.assertEqual(len(archive), 6)
+        self.assertEqual(archive[5][0], 1050)
+        self.assertEqual(archive.metadata['dtype'], '<f4')
+
+    def test_not_an_archive(self):
+        with open(self.filename, 'r+b') as f:
+            f.write(b'EOF')
+        self.assertRaises(SweepArchiveError, SweepArchive, self.filename)
+        self.assertRaises(SweepArchiveError, SweepArchiveWriter,
+            self.filename)
+
+    def test_sweep_device(self):
+        os.remove(self.filename)
+        sim = SimulatedRTSA(tones=[(2420 * M, -30)], seed=0)
+        sim.start()
+        try:
+            dut = WSA()
+            dut.connect('127.0.0.1')
+            sd = SweepDevice(dut)
+            writer = SweepArchiveWriter(self.filename)
+            for i in range(2):
+                fstart, fstop, pow_data = sd.capture_power_spectrum(
+                    2400 * M, 2500 * M, 100e3, {'attenuator': 0},
+                    mode='SH', archive=writer)
+            writer.close()
+            dut.disconnect()
+        finally:
+            sim.stop()
+
+        archive = SweepArchive(self.filename)
+        self.assertEqual(len(archive), 2)
+        self.assertEqual((archive.fstart, archive.fstop), (fstart, fstop))
+        self.assertEqual(archive.metadata['rfe_mode'], 'SH')
+        self.assertTrue(archive.metadata['device_id'])
+        self.assertTrue(np.allclose(archive[1][1], pow_data, atol=1e-4))
+        self.assertTrue(archive.times[0] <= archive.times[1])
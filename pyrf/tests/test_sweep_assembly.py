@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from pyrf.devices.playback import Playback
+from pyrf.sweep_device import SweepDevice, SweepPlanner, copy_bins
+from pyrf.units import M
+
+DEVICE_ID = 'ThinkRF,R5500-408 v1,000000-000,1.5.0'
+
+
+class FakePacket(object):
+    def __init__(self, spec_inv):
+        self.spec_inv = spec_inv
+
+
+class TestSweepAssembly(unittest.TestCase):
+    def setUp(self):
+        self.sd = SweepDevice(Playback('thinkrf.WSA', DEVICE_ID))
+        self.planner = SweepPlanner(self.sd.dev_properties)
+
+    def assert_matches_legacy(self, fstart, fstop, rbw, mode):
+        settings = self.planner.plan_sweep(fstart, fstop, rbw, mode,
+            {'attenuator': 0})
+        assembly = settings.assembly
+        self.assertNotEqual(assembly, None)
+        self.assertEqual(len(assembly.freqs), settings.step_count)
+
+        self.sd._sweep_settings = settings
+        for spec_inv in (False, True):
+            legacy = np.zeros(settings.spectral_points)
+            planned = np.zeros(settings.spectral_points)
+            self.sd.spectral_data = legacy
+            for step, (freq, bins) in enumerate(zip(assembly.freqs,
+                    assembly.bins)):
+                # distinct values show which bins were copied where
+                pow_data = np.arange(1, bins + 1) + step * 100000.0
+                self.sd.packet_count = step + 1
+                self.sd._stitch(FakePacket(spec_inv), freq, pow_data)
+
+                src, dst = assembly.lookup(step, freq or 0, bins, spec_inv)
+                planned[dst] = pow_data[src]
+            self.assertTrue(np.array_equal(legacy, planned),
+                '%s %s-%s spec_inv=%s' % (mode, fstart, fstop, spec_inv))
+
+    def test_modes(self):
+        for mode in ('SH', 'SHN', 'ZIF'):
+            self.assert_matches_legacy(2300 * M, 2600 * M, 100e3, mode)
+            self.assert_matches_legacy(1000 * M, 4000 * M, 500e3, mode)
+
+    def test_dd_steps(self):
+        self.assert_matches_legacy(0, 40 * M, 100e3, 'SH')
+        self.assert_matches_legacy(10 * M, 300 * M, 100e3, 'SH')
+        self.assert_matches_legacy(10 * M, 300 * M, 100e3, 'ZIF')
+
+    def test_end_entry(self):
+        prop = self.sd.dev_properties
+        fstop = prop.MAX_TUNABLE['SH']
+        for mode in ('SH', 'ZIF'):
+            settings = self.planner.plan_sweep(fstop - 1000 * M, fstop,
+                100e3, mode, {'attenuator': 0})
+            self.assertTrue(settings.make_end_entry)
+            self.assert_matches_legacy(fstop - 1000 * M, fstop, 100e3, mode)
+
+    def test_mismatched_packet(self):
+        settings = self.planner.plan_sweep(2300 * M, 2600 * M, 100e3, 'SH',
+            {'attenuator': 0})
+        assembly = settings.assembly
+        freq = assembly.freqs[0]
+        bins = assembly.bins[0]
+        self.assertNotEqual(assembly.lookup(0, freq, bins, False), None)
+        self.assertEqual(assembly.lookup(0, freq + 1 * M, bins, False), None)
+        self.assertEqual(assembly.lookup(0, freq, bins * 2, False), None)
+        self.assertEqual(assembly.lookup(len(assembly.freqs), freq, bins,
+            False), None)
+
+    def test_rounded_frequency(self):
+        settings = self.planner.plan_sweep(2300 * M, 2600 * M, 100e3, 'SH',
+            {'attenuator': 0})
+        assembly = settings.assembly
+        resolution = self.sd.dev_properties.TUNING_RESOLUTION
+        self.assertEqual(assembly.tolerance, resolution)
+        freq = assembly.freqs[1]
+        bins = assembly.bins[1]
+        # the device reports the frequency it tuned to after rounding
+        expected = assembly.lookup(1, freq, bins, False)
+        for tuned in (freq - resolution, freq + resolution / 2.0,
+                freq + 0.4):
+            self.assertEqual(assembly.lookup(1, tuned, bins, False),
+                expected)
+        self.assertEqual(assembly.lookup(1, freq + resolution + 1, bins,
+            False), None)
+
+    def test_copy_bins(self):
+        # source is half inside the destination range
+        self.assertEqual(copy_bins(0, 100, 100, 50, 150, 100),
+            (50, 100, 0, 50))
+        self.assertEqual(copy_bins(100, 200, 100, 50, 150, 100),
+            (0, 50, 50, 100))
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from pyrf.devices.playback import open_recording
+from pyrf.numpy_util import frequency_axis
+from pyrf.sweep_device import (SweepBufferPool, SweepResult, SweepDevice,
+    SweepPlanner)
+from pyrf.tests.test_playback import RecordingWriter, sh_capture, TONE
+from pyrf.units import M
+
+
+class TestSweepBufferPool(unittest.TestCase):
+    def test_reuse(self):
+        pool = SweepBufferPool(10, 2)
+        a = pool.acquire()
+        b = pool.acquire()
+        # exhausted pools allocate instead of blocking
+        c = pool.acquire()
+        self.assertEqual(len(set(id(x) for x in (a, b, c))), 3)
+
+        a[:] = 5
+        pool.release(a)
+        pool.release(b)
+        pool.release(c)
+        d = pool.acquire()
+        self.assertTrue(d is b or d is a)
+        self.assertFalse(np.any(d))
+
+    def test_result(self):
+        pool = SweepBufferPool(5, 1)
+        data = pool.acquire()
+        data[:] = np.arange(5)
+        result = SweepResult(100, 200, data, pool)
+
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result[2], 2)
+        self.assertEqual(np.argmax(result), 4)
+        self.assertTrue(result.frequencies is frequency_axis(100, 200, 5))
+        self.assertEqual(list(result.frequencies), [100, 125, 150, 175, 200])
+        self.assertFalse(result.frequencies.flags.writeable)
+
+        result.release()
+        self.assertTrue(pool.acquire() is data)
+
+
+class TestSweepDeviceBuffers(unittest.TestCase):
+    def test_sweeps(self):
+        writer = RecordingWriter()
+        state = np.random.RandomState(0)
+        properties = open_recording(writer.recording()).properties
+        plan = SweepPlanner(properties).plan_sweep(2400 * M, 2500 * M,
+            100e3, 'SH')
+        writer.context('sweepid', 1)
+        for step in range(int(plan.step_count)):
+            freq = plan.fstart + step * plan.fstep
+            writer.context('reflevel', 0)
+            writer.context('rffreq', freq)
+            writer.samples(sh_capture(properties, freq, plan.spp, TONE,
+                state))
+
+        sd = SweepDevice(open_recording(writer.recording(), loop=True),
+            buffers=2)
+        results = []
+        axes = []
+        for i in range(3):
+            fstart, fstop, result = sd.capture_power_spectrum(2400 * M,
+                2500 * M, 100e3, {'attenuator': 0}, mode='SH')
+            results.append(result)
+            self.assertAlmostEqual(np.max(result), -30, delta=3)
+            peak = result.frequencies[np.argmax(result)]
+            self.assertAlmostEqual(peak, TONE, delta=4 * plan.rbw)
+            axes.append(result.frequencies)
+            result.release()
+
+        self.assertTrue(results[0].data is None)
+        self.assertTrue(axes[0] is axes[1] is axes[2])
@@ -0,0 +1,89 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyrf.sweep_file import (SweepFileWriter, SweepFileReader,
+    SweepFileError, csv_to_sweep_file)
+
+DEVICE_ID = 'ThinkRF,R5500-408 v1,000000-000,1.5.0'
+
+
+class TestSweepFile(unittest.TestCase):
+    def setUp(self):
+        state = np.random.RandomState(0)
+        self.sweeps = [(2400e6 + i * 1e6, 2500e6, state.normal(-100, 3,
+            100 + i)) for i in range(10)]
+
+    def write(self, **kwargs):
+        output = io.BytesIO()
+        writer = SweepFileWriter(output, DEVICE_ID + '\n', chunk_sweeps=4,
+            **kwargs)
+        for i, (fstart, fstop, data) in enumerate(self.sweeps):
+            writer.add(fstart, fstop, data, mode='ZIF', timestamp=1000 + i)
+        writer.close()
+        self.assertEqual(writer.count, 10)
+        output.seek(0)
+        return output
+
+    def test_float32(self):
+        reader = SweepFileReader(self.write(metadata={'site': 'a'}))
+        self.assertEqual(reader.device_id, DEVICE_ID)
+        self.assertEqual(reader.metadata['site'], 'a')
+        self.assertEqual([len(c) for c in reader.chunks()], [4, 4, 2])
+        sweeps = list(reader)
+        self.assertEqual(len(sweeps), 10)
+        for i, sweep in enumerate(sweeps):
+            fstart, fstop, data = self.sweeps[i]
+            self.assertEqual((sweep.mode, sweep.fstart, sweep.fstop,
+                sweep.timestamp), ('ZIF', fstart, fstop, 1000 + i))
+            self.assertTrue(np.allclose(sweep.data, data, atol=1e-4))
+
+    def test_int16(self):
+        compressed = self.write(dtype='int16').getvalue()
+        raw = self.write(dtype='int16', compress=False).getvalue()
+        self.assertTrue(len(raw) < len(self.write().getvalue()))
+        for output in (compressed, raw):
+            sweeps = list(SweepFileReader(io.BytesIO(output)))
+            for sweep, (fstart, fstop, data) in zip(sweeps, self.sweeps):
+                self.assertTrue(np.all(np.abs(sweep.data - data) <= 0.005))
+        self.assertRaises(ValueError, SweepFileWriter, io.BytesIO(),
+            dtype='int8')
+
+    def test_truncated(self):
+        output = self.write().getvalue()
+        sweeps = list(SweepFileReader(io.BytesIO(output[:-10])))
+        self.assertEqual(len(sweeps), 8)
+        self.assertRaises(SweepFileError, SweepFileReader,
+            io.BytesIO(b'EOF'))
+
+    def test_csv(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            csv_name = os.path.join(tmp, 'sweeps.csv')
+            with open(csv_name, 'w') as f:
+                f.write('# sweeps\n%s\n' % DEVICE_ID)
+                f.write('Sweep,Mode,Start,Stop,Points,Timestamp\n')
+                for i, (fstart, fstop, data) in enumerate(self.sweeps):
+                    f.write('%d,SH,%r,%r,%d,%d\n' % (i, fstart, fstop,
+                        len(data) + 1, 1000 + i))
+                    f.write(''.join('%r\n' % v for v in data.tolist()))
+                f.write('EOF\n')
+
+            output = os.path.join(tmp, 'sweeps.pyrfs')
+            self.assertEqual(csv_to_sweep_file(csv_name, output), 10)
+            reader = SweepFileReader(output)
+            sweeps = list(reader)
+            reader.close()
+            self.assertEqual(reader.device_id, DEVICE_ID)
+            self.assertEqual(sweeps[3].mode, 'SH')
+            self.assertEqual(sweeps[3].timestamp, 1003)
+            self.assertTrue(np.allclose(sweeps[3].data, self.sweeps[3][2],
+                atol=1e-4))
+            self.assertTrue(os.path.getsize(output)
+                < os.path.getsize(csv_name) / 2)
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+
+from pyrf.traces import (TraceAccumulator, AVERAGE, EXPONENTIAL, MAX_HOLD,
+    MIN_HOLD)
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.capture_device import CaptureDevice
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+
+TONE = 2450 * M
+
+
+class TestTraceAccumulator(unittest.TestCase):
+    def test_average_window(self):
+        trace = TraceAccumulator(AVERAGE, count=3)
+        results = [list(trace.update([value, -value]))
+            for value in (1, 2, 3, 4, 5, 6, 7)]
+        self.assertEqual(results[0], [1, -1])
+        self.assertEqual(results[1], [1.5, -1.5])
+        # only the last 3 spectra are averaged
+        self.assertEqual(results[3], [3, -3])
+        self.assertEqual(results[6], [6, -6])
+
+    def test_linear_average(self):
+        trace = TraceAccumulator(AVERAGE, count=2, linear=True)
+        trace.update([0, -10])
+        result = trace.update([-10, -10])
+        self.assertAlmostEqual(result[0], 10 * np.log10(0.55))
+        self.assertAlmostEqual(result[1], -10)
+
+    def test_exponential(self):
+        trace = TraceAccumulator(EXPONENTIAL, alpha=0.25)
+        trace.update([0, 8])
+        self.assertEqual(list(trace.update([8, 0])), [2, 6])
+
+    def test_holds(self):
+        high = TraceAccumulator(MAX_HOLD)
+        low = TraceAccumulator(MIN_HOLD)
+        for data in ([1, 5, 3], [4, 2, 6], [0, 0, 0]):
+            high.update(data)
+            low.update(data)
+        self.assertEqual(list(high.trace()), [4, 5, 6])
+        self.assertEqual(list(low.trace()), [0, 0, 0])
+
+    def test_emit_every_and_reset(self):
+        trace = TraceAccumulator(MAX_HOLD, emit_every=3)
+        self.assertEqual(trace.update([1]), None)
+        self.assertEqual(trace.update([3]), None)
+        self.assertEqual(list(trace.update([2])), [3])
+        # a different length restarts the trace
+        self.assertEqual(trace.update([1, 1]), None)
+        self.assertEqual(trace.updates, 1)
+        trace.reset()
+        self.assertEqual(trace.trace(), None)
+
+    def test_bad_parameters(self):
+        self.assertRaises(ValueError, TraceAccumulator, 'clear_write')
+        self.assertRaises(ValueError, TraceAccumulator, AVERAGE, count=0)
+        self.assertRaises(ValueError, TraceAccumulator, EXPONENTIAL,
+            alpha=2)
+
+
+class TestDeviceTraces(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(TONE, -30)], seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def test_sweep_average(self):
+        sd = SweepDevice(self.dut)
+        trace = TraceAccumulator(AVERAGE, count=4, emit_every=4)
+        fstart, fstop, pow_data = sd.capture_power_spectrum(2400 * M,
+            2500 * M, 100e3, {'attenuator': 0}, mode='SH', trace=trace)
+        self.assertEqual(trace.updates, 4)
+        self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
+        self.assertFalse(pow_data is trace.trace())
+
+    def test_capture_max_hold(self):
+        cd = CaptureDevice(self.dut)
+        trace = TraceAccumulator(MAX_HOLD, emit_every=3)
+        # keep the tone away from the DC bins
+        fstart, fstop, pow_data = cd.capture_power_spectrum('ZIF',
+            TONE - 20 * M, 100e3, trace=trace)
+        self.assertEqual(trace.updates, 3)
+        self.assertTrue(fstart < TONE < fstop)
+        peak = fstart + (fstop - fstart) * np.argmax(pow_data) / len(pow_data)
+        self.assertAlmostEqual(peak, TONE, delta=1 * M)
+        self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
@@ -0,0 +1,116 @@
+import logging
+import socket
+import time
+import unittest
+
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.connectors.blocking import DROP, PlainSocketConnector
+from pyrf.sweep_device import SweepDevice
+from pyrf.units import M
+from pyrf.vrt import VRT_IFDATA_I14, generate_data_packet
+
+import numpy as np
+
+
+class TestVRTReader(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(2450 * M, -30)], seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def read_data(self, count):
+        packets = []
+        while len(packets) < count:
+            packet = self.dut.read()
+            if packet.is_data_packet():
+                packets.append(packet)
+        return packets
+
+    def test_sweep(self):
+        self.dut.start_vrt_reader()
+        sd = SweepDevice(self.dut)
+        for i in range(3):
+            fstart, fstop, pow_data = sd.capture_power_spectrum(2300 * M,
+                2600 * M, 100e3, {'attenuator': 0}, mode='SH')
+            self.assertAlmostEqual(np.max(pow_data), -30, delta=3)
+        self.dut.stop_vrt_reader()
+
+    def test_stop_and_read_directly(self):
+        self.dut.start_vrt_reader()
+        self.dut.capture(1024, 4)
+        packets = self.read_data(2)
+        self.dut.stop_vrt_reader()
+        # queued packets come first, then reading the socket continues
+        # on a packet boundary
+        packets += self.read_data(2)
+        counts = [p.count for p in packets]
+        self.assertEqual(counts, [(counts[0] + i) & 0x0f for i in range(4)])
+
+    def test_stop_with_full_queue(self):
+        reader = self.dut.start_vrt_reader(queue_size=1)
+        self.dut.capture(1024, 4)
+        deadline = time.time() + 5
+        while not reader.queue.full() and time.time() < deadline:
+            time.sleep(0.01)
+        # let the thread read the next packet and wait for room
+        time.sleep(0.1)
+        self.dut.stop_vrt_reader()
+        self.assertNotEqual(reader.held, None)
+        # the packet the thread was holding isn't lost
+        packets = self.read_data(4)
+        counts = [p.count for p in packets]
+        self.assertEqual(counts, [(counts[0] + i) & 0x0f for i in range(4)])
+
+    def test_drop(self):
+        reader = self.dut.start_vrt_reader(queue_size=2, policy=DROP)
+        self.dut.spp(1024)
+        self.dut.stream_start()
+        deadline = time.time() + 5
+        while reader.dropped < 10 and time.time() < deadline:
+            time.sleep(0.01)
+        self.dut.stream_stop()
+        self.assertTrue(reader.dropped >= 10)
+        self.dut.stop_vrt_reader()
+
+    def test_disconnect(self):
+        reader = self.dut.start_vrt_reader()
+        self.dut.disconnect()
+        self.assertFalse(reader._thread.is_alive())
+        self.dut.connect('127.0.0.1')
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestVRTReaderClosed(unittest.TestCase):
+    def test_closed_mid_packet(self):
+        connector = PlainSocketConnector()
+        connector._sock_vrt, peer = socket.socketpair()
+        data, _count = generate_data_packet(VRT_IFDATA_I14, b'\0' * 64)
+        peer.sendall(data[:10])
+        peer.close()
+
+        records = _Records()
+        logger = logging.getLogger('pyrf.connectors.blocking')
+        logger.addHandler(records)
+        try:
+            reader = connector.start_reader()
+            self.assertEqual(connector.read_packet(timeout=5), None)
+            reader._thread.join()
+        finally:
+            logger.removeHandler(records)
+            connector._sock_vrt.close()
+        self.assertEqual([r for r in records.records
+            if r.levelno >= logging.WARNING], [])
@@ -0,0 +1,113 @@
+import unittest
+
+import numpy as np
+
+from pyrf.numpy_util import WelchEstimator, _compute_fft, _compute_fft_i_only
+from pyrf.sim import SimulatedRTSA
+from pyrf.devices.thinkrf import WSA
+from pyrf.capture_device import CaptureDevice
+from pyrf.units import M
+from pyrf.metrics import metrics
+
+TONE = 2450 * M
+
+
+class TestWelchEstimator(unittest.TestCase):
+    def setUp(self):
+        state = np.random.RandomState(0)
+        self.real = state.normal(0, 0.1, 4096)
+        self.iq = self.real + 1j * state.normal(0, 0.1, 4096)
+
+    def test_matches_compute_fft(self):
+        welch = WelchEstimator(1024, overlap=0)
+        welch.add(self.real[:1024])
+        self.assertTrue(np.allclose(welch.power_spectrum(),
+            _compute_fft_i_only(self.real[:1024], True, True)))
+
+        welch = WelchEstimator(1024, overlap=0)
+        welch.add(self.iq[:1024])
+        expected = _compute_fft(self.iq.real[:1024], self.iq.imag[:1024],
+            False, True, True, True, True, 1, 0, 100 * M)
+        self.assertTrue(np.allclose(welch.power_spectrum(), expected))
+
+    def test_segments_span_packets(self):
+        whole = WelchEstimator(1000, overlap=0.5)
+        whole.add(self.iq)
+        self.assertEqual(whole.segments, 7)
+
+        # uneven packets so segments span packet boundaries
+        packets = WelchEstimator(1000, overlap=0.5)
+        for start in range(0, 4096, 300):
+            packets.add(self.iq[start:start + 300])
+        self.assertEqual(packets.segments, 7)
+        self.assertTrue(np.allclose(whole.power_spectrum(),
+            packets.power_spectrum()))
+
+    def test_reset(self):
+        welch = WelchEstimator(1024)
+        welch.add(self.real[:1000])
+        self.assertEqual(welch.power_spectrum(), None)
+        welch.add(self.real[1000:2000])
+        self.assertEqual(welch.segments, 2)
+        welch.reset()
+        self.assertEqual(welch.segments, 0)
+        welch.add(self.iq)
+        self.assertEqual(len(welch.power_spectrum()), 1024)
+        self.assertRaises(ValueError, WelchEstimator, 1024, 1)
+
+    def test_skip(self):
+        welch = WelchEstimator(1000, overlap=0)
+        welch.add(self.iq[:1500])
+        welch.skip()
+        welch.add(self.iq[2000:3000])
+        self.assertEqual(welch.segments, 2)
+        expected = WelchEstimator(1000, overlap=0)
+        expected.add(self.iq[:1000])
+        expected.add(self.iq[2000:3000])
+        self.assertTrue(np.allclose(welch.power_spectrum(),
+            expected.power_spectrum()))
+
+
+class TestCaptureWelchSpectrum(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedRTSA(tones=[(TONE, -30)], seed=0)
+        self.sim.start()
+        self.dut = WSA()
+        self.dut.connect('127.0.0.1')
+
+    def tearDown(self):
+        self.dut.disconnect()
+        self.sim.stop()
+
+    def test_capture(self):
+        cd = CaptureDevice(self.dut)
+        for mode in ('SH', 'ZIF'):
+            fstart, fstop, single = cd.capture_power_spectrum(mode,
+                TONE - 10 * M, 100e3)
+            fstart, fstop, welch = cd.capture_welch_spectrum(mode,
+                TONE - 10 * M, 100e3, segments=32)
+            self.assertEqual(cd.packets_per_block, 1)
+            self.assertAlmostEqual(np.max(welch), -30, delta=1)
+            peak = fstart + (fstop - fstart) * np.argmax(welch) / len(welch)
+            self.assertAlmostEqual(peak, TONE, delta=1 * M)
+            # averaging lowers the variance of the noise floor
+            self.assertTrue(np.std(welch[:100]) < np.std(single[:100]) / 2)
+
+    def test_lost_packet(self):
+        # a packet before the last of the block is lost with this seed
+        self.sim.packet_loss = 0.3
+        metrics.reset()
+        metrics.enabled = True
+        try:
+            cd = CaptureDevice(self.dut)
+            fstart, fstop, welch = cd.capture_welch_spectrum('SH',
+                TONE - 10 * M, 100e3, segments=256)
+            counters = metrics.as_dict()['counters']
+        finally:
+            metrics.enabled = False
+            metrics.reset()
+
+        self.assertTrue(cd.packets_per_block > 1)
+        self.assertEqual(counters['capture.lost_packets'], 1)
+        self.assertEqual(counters['capture.mismatched_packets'], 0)
+        self.assertAlmostEqual(np.max(welch), -30, delta=1)
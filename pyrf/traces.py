@@ -0,0 +1,151 @@
+"""
+Trace accumulators for combining successive power spectra the way a
+spectrum analyzer's trace modes do, e.g. averaging or max-hold.
+
+All accumulation is done in place on arrays allocated when the first
+spectrum arrives, so a long running average or hold costs no
+allocations per spectrum.  An accumulator can also decimate its output
+so that callers only see one trace every *emit_every* spectra::
+
+    from pyrf.traces import TraceAccumulator, AVERAGE
+    trace = TraceAccumulator(AVERAGE, count=10, emit_every=10)
+    fstart, fstop, pow_data = sd.capture_power_spectrum(
+        2400e6, 2500e6, 100e3, trace=trace)
+"""
+
+import numpy as np
+
+#: mean of the last *count* spectra
+AVERAGE = 'average'
+#: exponentially weighted moving average
+EXPONENTIAL = 'exponential'
+#: largest value seen in each bin
+MAX_HOLD = 'max_hold'
+#: smallest value seen in each bin
+MIN_HOLD = 'min_hold'
+
+TRACE_MODES = (AVERAGE, EXPONENTIAL, MAX_HOLD, MIN_HOLD)
+
+
+class TraceAccumulator(object):
+    """
+    Accumulate power spectra in dBm into a single trace.
+
+    :param str mode: one of :data:`AVERAGE`, :data:`EXPONENTIAL`,
+                     :data:`MAX_HOLD` or :data:`MIN_HOLD`
+    :param int count: number of spectra averaged in :data:`AVERAGE` mode,
+                      and the default time constant in
+                      :data:`EXPONENTIAL` mode
+    :param int emit_every: only return a trace from :meth:`update` once
+                           every *emit_every* spectra
+    :param bool linear: average in linear power (mW) instead of dB;
+                        holds are the same either way
+    :param float alpha: weight of each new spectrum in
+                        :data:`EXPONENTIAL` mode, default ``1.0 / count``
+    """
+    def __init__(self, mode=AVERAGE, count=1, emit_every=1, linear=False,
+            alpha=None):
+        if mode not in TRACE_MODES:
+            raise ValueError("unknown trace mode %r" % (mode,))
+        if count < 1 or emit_every < 1:
+            raise ValueError("count and emit_every must be at least 1")
+        if alpha is None:
+            alpha = 1.0 / count
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+
+        self.mode = mode
+        self.count = count
+        self.emit_every = emit_every
+        self.linear = linear and mode in (AVERAGE, EXPONENTIAL)
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all accumulated spectra
+        """
+        self.updates = 0
+        self._points = None
+        self._acc = None
+        self._window = None
+        self._scratch = None
+        self._out = None
+
+    def _allocate(self, points):
+        self._points = points
+        self._acc = np.zeros(points)
+        self._out = np.zeros(points)
+        if self.linear or self.mode == EXPONENTIAL:
+            self._scratch = np.zeros(points)
+        if self.mode == AVERAGE:
+            self._window = np.zeros((self.count, points))
+        self.updates = 0
+
+    def update(self, pow_data):
+        """
+        Add one spectrum to the trace.  Spectra of a different length
+        than the last one restart accumulation.
+
+        :param pow_data: power spectrum in dBm
+        :returns: the accumulated trace in dBm every *emit_every*
+                  updates, otherwise *None*.  The returned array is
+                  reused by the next emitted trace; copy it to keep it.
+        """
+        pow_data = np.asarray(pow_data, dtype=float)
+        if len(pow_data) != self._points:
+            self._allocate(len(pow_data))
+
+        data = pow_data
+        if self.linear:
+            data = self._scratch
+            np.multiply(pow_data, 0.1, out=data)
+            np.power(10.0, data, out=data)
+
+        first = self.updates == 0
+        if self.mode == AVERAGE:
+            slot = self.updates % self.count
+            if self.updates >= self.count:
+                self._acc -= self._window[slot]
+            self._window[slot] = data
+            if slot == self.count - 1:
+                # re-sum the window once per pass to stop rounding
+                # errors from the running sum building up
+                self._window.sum(axis=0, out=self._acc)
+            else:
+                self._acc += data
+        elif first:
+            self._acc[:] = data
+        elif self.mode == EXPONENTIAL:
+            self._acc *= 1.0 - self.alpha
+            if data is not self._scratch:
+                self._scratch[:] = data
+            self._scratch *= self.alpha
+            self._acc += self._scratch
+        elif self.mode == MAX_HOLD:
+            np.maximum(self._acc, data, out=self._acc)
+        else:
+            np.minimum(self._acc, data, out=self._acc)
+        self.updates += 1
+
+        if self.updates % self.emit_every:
+            return None
+        return self.trace()
+
+    def trace(self):
+        """
+        :returns: the current trace in dBm or *None* if no spectra have
+                  been accumulated.  The returned array is reused by
+                  later calls; copy it to keep it.
+        """
+        if not self.updates:
+            return None
+        out = self._out
+        if self.mode == AVERAGE:
+            np.divide(self._acc, min(self.updates, self.count), out=out)
+        else:
+            out[:] = self._acc
+        if self.linear:
+            np.log10(out, out=out)
+            out *= 10.0
+        return out
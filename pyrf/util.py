@@ -4,6 +4,7 @@ from pyrf.vrt import I_ONLY
 import itertools
 from ast import literal_eval
 from pyrf.numpy_util import  compute_fft
+from pyrf.traces import TraceAccumulator, AVERAGE
 import numpy as np
 
 def capture_spectrum(dut, rbw = None, average=1, dec=1, fshift=0):
@@ -52,17 +53,12 @@ def capture_spectrum(dut, rbw = None, average=1, dec=1, fshift=0):
     fstop = freq + bandwidth/ 2
     usable_bins = compute_usable_bins(dut.properties, mode, points, dec, fshift)
 
-    total_pow = []
+    trace = TraceAccumulator(AVERAGE, count=average, emit_every=average)
+    assembler = BlockAssembler(samples, packets)
     for v in range(average):
         dut.capture(samples, packets)
         # read data
-        for p in range(packets):
-            if p == 0:
-                data, context = collect_data_and_context(dut)
-
-            else:
-                d, c = collect_data_and_context(dut)
-                data.data.np_array = np.concatenate([data.data.np_array, d.data.np_array])
+        data, context = collect_block(dut, assembler)
 
         # adjust fstart and fstop based on the spectral inversion
         usable_bins, fstart, fstop = adjust_usable_fstart_fstop(
@@ -74,12 +70,7 @@ def capture_spectrum(dut, rbw = None, average=1, dec=1, fshift=0):
             data.spec_inv,
             usable_bins)
         # compute fft
-        pow_data = compute_fft(dut, data, context)
-        if not len(total_pow):
-            total_pow = pow_data
-        else:
-            total_pow = np.add(total_pow, pow_data)
-    pow_data = total_pow / average
+        pow_data = trace.update(compute_fft(dut, data, context))
     # trim FFT
     pow_data, usable_bins, fstart, fstop = trim_to_usable_fstart_fstop(pow_data,
                                                                     usable_bins,
@@ -123,6 +114,129 @@ def collect_data_and_context(dut):
 read_data_and_reflevel = read_data_and_context
 
 
+class BlockAssembler(object):
+    """
+    Assemble the data packets of a block capture into a single
+    contiguous array allocated for the whole block up front.
+
+    Each packet's samples are copied once, straight from its receive
+    buffer, into the packet's slot in the block.  Packets missing from
+    the VRT packet count sequence leave their slot zeroed and are
+    counted in :attr:`lost`.  Packets with a different stream or number
+    of samples than the first packet are dropped, leaving their slot
+    zeroed, and counted in :attr:`mismatched`.
+
+    :param int spp: samples per packet
+    :param int ppb: packets per block
+    """
+    def __init__(self, spp, ppb):
+        self.spp = int(spp)
+        self.ppb = int(ppb)
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new block
+        """
+        self.slots = 0
+        self.lost = 0
+        self.mismatched = 0
+        self._first = None
+        self._block = None
+        self._next_count = None
+
+    def place(self, packet):
+        """
+        Account for the next data packet of the block without copying
+        its samples, for callers that consume the samples themselves
+
+        :param packet: a data packet
+        :type packet: pyrf.vrt.DataPacket
+        :returns: the slot of the block *packet* fills, or *None* if it
+                  was dropped as mismatched or because packets lost
+                  before it completed the block
+        """
+        if self._next_count is not None and packet.count != self._next_count:
+            # vrt packet counts are 4 bits
+            missing = min((packet.count - self._next_count) & 0x0f,
+                self.ppb - self.slots)
+            self.lost += missing
+            self.slots += missing
+            if self.slots == self.ppb:
+                return None
+        self._next_count = (packet.count + 1) & 0x0f
+
+        if self._first is None:
+            self._first = packet
+        slot = self.slots
+        self.slots += 1
+        if (packet.stream_id != self._first.stream_id
+                or len(packet.data.numpy_array()) != self.spp):
+            self.mismatched += 1
+            return None
+        return slot
+
+    def complete(self):
+        """
+        :returns: True once every slot in the block has been filled or
+                  accounted for as lost
+        """
+        return self.slots == self.ppb
+
+    def add(self, packet):
+        """
+        Add the next data packet of the block.
+
+        A packet revealing lost packets that fill the rest of the block
+        is dropped, not carried over to the next block, so a block
+        never mixes samples of two captures.
+
+        :param packet: a data packet
+        :type packet: pyrf.vrt.DataPacket
+        :returns: True once every slot in the block has been filled or
+                  accounted for as lost
+        """
+        slot = self.place(packet)
+        if self._block is None and self._first is not None and self.ppb > 1:
+            samples = self._first.data.numpy_array()
+            self._block = np.zeros((self.spp * self.ppb,)
+                + samples.shape[1:], dtype=samples.dtype)
+        if slot is not None and self._block is not None:
+            start = slot * self.spp
+            self._block[start:start + self.spp] = packet.data.numpy_array()
+        return self.complete()
+
+    def packet(self):
+        """
+        :returns: the first data packet of the block with its data
+                  replaced by the samples of the whole block, ready for
+                  :func:`pyrf.numpy_util.compute_fft`
+        """
+        if self._block is not None:
+            self._first.data.np_array = self._block
+            # drop any samples decoded from the first packet alone
+            self._first._samples = None
+        return self._first
+
+
+def collect_block(dut, assembler):
+    """
+    Wait for and return a block of data packets assembled into one
+    data packet and the values of the context packets received.
+
+    :param assembler: the :class:`BlockAssembler` to use, it is reset first
+
+    :returns: (data_pkt, context_values)
+    """
+    assembler.reset()
+    context_values = {}
+    while True:
+        data, context = collect_data_and_context(dut)
+        context_values.update(context)
+        if assembler.add(data):
+            return assembler.packet(), context_values
+
+
 def compute_usable_bins(dut_prop, rfe_mode, points, decimation, fshift):
     """
     Return a list of usable bin ranges for the given capture configuration
@@ -275,16 +389,9 @@ def capture_sweep_spectrum(dut, mode, points, dec = 1, fshift = 0, packets = 1):
 
     usable_bins = compute_usable_bins(dut.properties, mode, points, dec, fshift)
 
-    total_pow = []
     samples = int(points / packets)
     # read data
-    for p in range(packets):
-        if p == 0:
-            data, context = collect_data_and_context(dut)
-
-        else:
-            d, c = collect_data_and_context(dut, samples)
-            data.data.np_array = np.concatenate([data.data.np_array, d.data.np_array])
+    data, context = collect_block(dut, BlockAssembler(samples, packets))
 
     # adjust fstart and fstop based on the spectral inversion
     usable_bins, fstart, fstop = adjust_usable_fstart_fstop(
@@ -297,11 +404,6 @@ def capture_sweep_spectrum(dut, mode, points, dec = 1, fshift = 0, packets = 1):
         usable_bins)
     # compute fft
     pow_data = compute_fft(dut, data, context)
-    if not len(total_pow):
-        total_pow = pow_data
-    else:
-        total_pow = np.add(total_pow, pow_data)
-    pow_data = total_pow
     # trim FFT
     pow_data, usable_bins, fstart, fstop = trim_to_usable_fstart_fstop(pow_data,
                                                                     usable_bins,
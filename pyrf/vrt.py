@@ -5,6 +5,8 @@ import zlib
 import json
 import numpy as np
 
+from pyrf.metrics import metrics, monotonic
+
 # VRT Packet Type
 VRTDATA = 1
 VRTCONTEXT = 4
@@ -19,6 +21,13 @@ VRT_IFDATA_I14 = 0x90000005
 VRT_IFDATA_I24 = 0x90000006
 VRT_IFDATA_PSD8 = 0x90000007
 
+# full scale of the samples of each data stream
+SAMPLE_FULL_SCALE = {
+    VRT_IFDATA_I14Q14: 2 ** 13,
+    VRT_IFDATA_I14: 2 ** 13,
+    VRT_IFDATA_I24: 2 ** 23,
+    }
+
 # Digitizer Context Indicator Field Bit Positions
 CTX_BANDWIDTH = (1 << 29)
 CTX_RFOFFSET = (1 << 26)
@@ -66,8 +75,15 @@ def vrt_packet_reader(raw_read):
     if packet_type in (VRTCONTEXT, VRTCUSTOMCONTEXT):
         packet_size = (size - 1) * 4
         context_data = yield raw_read(packet_size)
-        yield ContextPacket(packet_type, count, size, context_data,
+        if not metrics.enabled:
+            yield ContextPacket(packet_type, count, size, context_data,
+                has_timestamp)
+            return
+        start = monotonic()
+        packet = ContextPacket(packet_type, count, size, context_data,
             has_timestamp)
+        _packet_metrics(packet, start)
+        yield packet
 
     elif packet_type == VRTDATA:
         data_header = yield raw_read(16)
@@ -76,11 +92,27 @@ def vrt_packet_reader(raw_read):
         payload = yield raw_read(payload_size)
         trailer = yield raw_read(4)
         trailer = struct.unpack(">I", trailer)[0]
-        yield DataPacket(count, size, stream_id, tsi, tsf, payload, trailer)
+        if not metrics.enabled:
+            yield DataPacket(count, size, stream_id, tsi, tsf, payload,
+                trailer)
+            return
+        start = monotonic()
+        packet = DataPacket(count, size, stream_id, tsi, tsf, payload, trailer)
+        _packet_metrics(packet, start)
+        if packet.sample_loss:
+            metrics.count('vrt.sample_loss')
+        if packet.over_range:
+            metrics.count('vrt.over_range')
+        yield packet
 
     else:
         raise InvalidDataReceived("unknown packet type: %s" % packet_type)
 
+def _packet_metrics(packet, start):
+    metrics.add_time('vrt.parse', monotonic() - start)
+    metrics.count('vrt.packets')
+    metrics.count('vrt.bytes', packet.size * 4)
+
 class ContextPacket(object):
     """
     A Context Packet received from :meth:`pyrf.devices.thinkrf.WSA.read`.
@@ -422,6 +454,7 @@ class DataPacket(object):
     """
 
     def __init__(self, count, size, stream_id, tsi, tsf, payload, trailer):
+        self._samples = None
         self.ptype = 1
         self.count = count
         self.size = size
@@ -440,6 +473,8 @@ class DataPacket(object):
             self.data = IQData(payload)
 
         self.valid_data = bool((trailer >> 18) & (trailer >> 30) & 1)
+        # valid data indicator enabled but not set
+        self.invalid_data = bool((trailer >> 30) & 1 and not (trailer >> 18) & 1)
         self.reference_lock = bool((trailer >> 17) & (trailer >> 29) & 1)
         self.spec_inv = bool((trailer >> 14) & (trailer >> 26) & 1)
         self.over_range = bool((trailer >> 13) & (trailer >> 25) & 1)
@@ -452,6 +487,38 @@ class DataPacket(object):
         """
         return True
 
+    def samples(self, dtype=np.float64):
+        """
+        Return the samples of this packet scaled to full scale, as a
+        complex array for I14Q14 data or a real array for I14 and I24
+        data.  The samples are decoded from the packet's big-endian
+        payload in one conversion the first time they're needed in each
+        precision, and the same read-only array is returned to every
+        caller after that.
+
+        :param dtype: np.float64 or np.float32, the precision of the
+                      samples, or of their real and imaginary parts
+        :returns: a read-only numpy array
+        """
+        dtype = np.dtype(dtype)
+        if self._samples is None:
+            self._samples = {}
+        samples = self._samples.get(dtype)
+        if samples is not None:
+            return samples
+
+        scale = SAMPLE_FULL_SCALE.get(self.stream_id)
+        if scale is None:
+            raise ValueError("stream 0x%08x has no samples" % self.stream_id)
+        samples = self.data.numpy_array().astype(dtype)
+        samples *= 1.0 / scale
+        if samples.ndim == 2:
+            # interleaved I, Q pairs are already complex values in memory
+            samples = samples.view(np.result_type(dtype, np.complex64))[:, 0]
+        samples.flags.writeable = False
+        self._samples[dtype] = samples
+        return samples
+
 
     def is_context_packet(self, ptype=None):
         """
@@ -464,6 +531,93 @@ class DataPacket(object):
         return ("Data #%02d [%d.%012d, %d samples]" % (self.count, self.tsi, self.tsf, len(self.data)))
 
 
+class SequenceTracker(object):
+    """
+    Check the VRT packet count sequence of each stream and tally lost
+    packets and the sample loss, over range and invalid data flags of
+    data packets.  Assign one to a connector's *sequence_tracker*, e.g.
+    with :meth:`pyrf.devices.thinkrf.WSA.track_sequences`, to check
+    every packet received.
+
+    :param callback: optional function called with (event, packet, lost)
+                     for each 'gap', 'sample_loss', 'over_range' or
+                     'invalid_data' event, where *lost* is the number of
+                     packets missing before *packet* for a 'gap' and 0
+                     otherwise
+    """
+    #: names of the tallies kept for each stream
+    STAT_NAMES = ('packets', 'gaps', 'lost_packets', 'sample_loss',
+        'over_range', 'invalid_data')
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all streams and clear the tallies
+        """
+        self._next_count = {}
+        self._stats = {}
+
+    def update(self, packet):
+        """
+        Check a received packet
+        """
+        stream_id = packet.stream_id
+        stats = self._stats.get(stream_id)
+        if stats is None:
+            stats = self._stats[stream_id] = dict.fromkeys(self.STAT_NAMES, 0)
+        stats['packets'] += 1
+
+        expected = self._next_count.get(stream_id)
+        self._next_count[stream_id] = (packet.count + 1) & 0x0f
+        if expected is not None and packet.count != expected:
+            # the 4 bit count can't tell how many times it wrapped
+            lost = (packet.count - expected) & 0x0f
+            stats['gaps'] += 1
+            stats['lost_packets'] += lost
+            metrics.count('vrt.lost_packets', lost)
+            self._event('gap', packet, lost)
+
+        if packet.is_data_packet():
+            if packet.sample_loss:
+                stats['sample_loss'] += 1
+                self._event('sample_loss', packet, 0)
+            if packet.over_range:
+                stats['over_range'] += 1
+                self._event('over_range', packet, 0)
+            if packet.invalid_data:
+                stats['invalid_data'] += 1
+                self._event('invalid_data', packet, 0)
+
+    def _event(self, event, packet, lost):
+        if self.callback:
+            self.callback(event, packet, lost)
+
+    def stats(self, stream_id=None):
+        """
+        :param stream_id: the stream to return, or *None* for the totals
+                          of all streams
+        :returns: a dict of 'packets', 'gaps', 'lost_packets',
+                  'sample_loss', 'over_range' and 'invalid_data' counts
+        """
+        if stream_id is not None:
+            return dict(self._stats.get(stream_id,
+                dict.fromkeys(self.STAT_NAMES, 0)))
+        totals = dict.fromkeys(self.STAT_NAMES, 0)
+        for stats in self._stats.values():
+            for name in self.STAT_NAMES:
+                totals[name] += stats[name]
+        return totals
+
+    def streams(self):
+        """
+        :returns: the stream ids seen
+        """
+        return list(self._stats)
+
+
 def generate_speca_packet(data, count=0):
     """
     :param data: a python dict that can be serialized as JSON
@@ -480,3 +634,88 @@ def generate_speca_packet(data, count=0):
         VRTSPECA,
         )
     return ''.join((header, payload, padding)), (count + 1) & 0x0f
+
+
+# timestamp fields included in generated packets: TSI = UTC, TSF = real-time
+_TIMESTAMP_HEADER = (1 << 22) | (2 << 20)
+
+def _encode_fixed(fmt, radix_bits):
+    return lambda value: struct.pack(fmt, int(round(value * 2.0 ** radix_bits)))
+
+_CONTEXT_FIELDS = {
+    'rffreq': (VRTRECEIVER, CTX_RFFREQ, _encode_fixed(">Q", 20)),
+    'gain': (VRTRECEIVER, CTX_GAIN, lambda value: struct.pack(">hh",
+        int(round(value[0] * 2 ** 7)), int(round(value[1] * 2 ** 7)))),
+    'temperature': (VRTRECEIVER, CTX_TEMPERATURE, _encode_fixed(">I", 0)),
+    'bandwidth': (VRTDIGITIZER, CTX_BANDWIDTH, _encode_fixed(">Q", 20)),
+    'rfoffset': (VRTDIGITIZER, CTX_RFOFFSET, _encode_fixed(">q", 20)),
+    'reflevel': (VRTDIGITIZER, CTX_REFERENCELEVEL, lambda value: struct.pack(
+        ">hh", 0, int(round(value * 2 ** 7)))),
+    'sweepid': (VRTCUSTOM, CTX_SWEEPID, _encode_fixed(">I", 0)),
+    'streamid': (VRTCUSTOM, CTX_STREAMID, _encode_fixed(">I", 0)),
+    'iqswap': (VRTCUSTOM, CTX_IQSWAP, _encode_fixed(">I", 0)),
+    }
+
+def generate_context_packet(field, value, count=0, tsi=0, tsf=0):
+    """
+    Encode a single context field the way an RTSA sends it, the
+    reverse of :class:`ContextPacket` parsing.
+
+    :param str field: a :attr:`ContextPacket.fields` name, such as
+                      'rffreq', 'reflevel', 'bandwidth' or 'sweepid'
+    :param value: the value of the field
+    :param int count: count for the header of this packet
+    :param int tsi: integer seconds timestamp
+    :param int tsf: fractional seconds timestamp, in picoseconds
+
+    :returns: (vrt packet bytes, next count int)
+    """
+    stream_id, indicator, encode = _CONTEXT_FIELDS[field]
+    payload = encode(value)
+    if stream_id == VRTCUSTOM:
+        packet_type = VRTCUSTOMCONTEXT
+    else:
+        packet_type = VRTCONTEXT
+    size = 6 + len(payload) // 4
+    header = struct.pack('>IIIQI',
+        (packet_type << 28) | _TIMESTAMP_HEADER | ((count & 0x0f) << 16) | size,
+        stream_id, tsi, tsf, indicator)
+    return b''.join((header, payload)), (count + 1) & 0x0f
+
+def generate_data_packet(stream_id, payload, count=0, tsi=0, tsf=0,
+        spec_inv=False, over_range=False, sample_loss=False):
+    """
+    Encode a data packet the way an RTSA sends it, the reverse of
+    :class:`DataPacket` parsing.
+
+    :param int stream_id: VRT_IFDATA_I14Q14, VRT_IFDATA_I14, VRT_IFDATA_I24
+                          or VRT_IFDATA_PSD8
+    :param payload: big-endian sample bytes
+    :param int count: count for the header of this packet
+    :param int tsi: integer seconds timestamp
+    :param int tsf: fractional seconds timestamp, in picoseconds
+    :param bool spec_inv: set the spectral inversion trailer bit
+    :param bool over_range: set the over range trailer bit
+    :param bool sample_loss: set the sample loss trailer bit
+
+    :returns: (vrt packet bytes, next count int)
+    """
+    padding = b'\0' * ((-len(payload)) % 4)
+    size = 6 + (len(payload) + len(padding)) // 4
+    assert size < 2 ** 16, 'data packet payload is too large'
+
+    # each trailer indicator is paired with an enable bit 12 bits above it
+    indicators = (1 << 18) | (1 << 17)
+    if spec_inv:
+        indicators |= 1 << 14
+    if over_range:
+        indicators |= 1 << 13
+    if sample_loss:
+        indicators |= 1 << 12
+    trailer = (indicators << 12) | indicators
+
+    header = struct.pack('>IIIQ',
+        (VRTDATA << 28) | _TIMESTAMP_HEADER | ((count & 0x0f) << 16) | size,
+        stream_id, tsi, tsf)
+    return (b''.join((header, payload, padding, struct.pack('>I', trailer))),
+        (count + 1) & 0x0f)